@@ -1,8 +1,9 @@
 from flask import Flask
 import os
+import click
 from .config import Config
 
-def create_app(persistent_data=False):
+def create_app():
     # Load environment variables from .env file if it exists
     env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
     if os.path.exists(env_path):
@@ -22,9 +23,19 @@ def create_app(persistent_data=False):
     app.register_blueprint(views.bp)
     app.register_blueprint(runpod.runpod_bp)
 
-    # Initialize database on startup with persistence setting
-    from .database import initialize_database
+    # Initialize database on startup, data is always preserved
+    # (fast path when the schema version is current)
+    from .database import initialize_database, get_database
     with app.app_context():
-        initialize_database(clear_data=not persistent_data)
+        initialize_database()
+
+    @app.cli.command('clear-db')
+    @click.option('--yes', is_flag=True, help='Skip the confirmation prompt.')
+    def clear_db(yes):
+        """Drop and recreate all detection tables, deleting every stored geometry."""
+        if not yes:
+            click.confirm('This deletes all stored geometries. Continue?', abort=True)
+        get_database().initialize_database(clear_data=True)
+        click.echo('Database cleared')
 
     return app
\ No newline at end of file
@@ -1,14 +1,330 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import PoolError
 import os
+import re
+import json
+import struct
+import time
+import uuid
+import base64
+import binascii
 import logging
+import threading
+from collections import OrderedDict
 from contextlib import contextmanager
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union, Iterator
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Version of the layerdb layout created by create_all_tables, bump on every schema change
+# so existing databases run the (idempotent) DDL and migrations once on their next start
+SCHEMA_VERSION = 3
+
+# Generalized geometry variants stored per detection as (column, simplification tolerance
+# in EPSG:3857 meters), kept current by PostgreSQL as stored generated columns. Only vector
+# tiles read them: 2 m serves zoom 12 and below, 10 m zoom 9 and below, where it is already
+# finer than one tile pixel and ST_AsMVTGeom quantization does the rest
+GEOMETRY_LOD_LEVELS = [
+    ('geom_lod1', 2.0),
+    ('geom_lod2', 10.0),
+]
+
+# Variants of earlier schema versions, dropped on migration
+RETIRED_GEOMETRY_LOD_COLUMNS = ['geom_lod3', 'geom_lod4']
+
+def geometry_column_for_resolution(resolution: float) -> str:
+    """Coarsest stored geometry variant whose tolerance does not exceed resolution (meters)"""
+    column = 'geom'
+    for name, tolerance in GEOMETRY_LOD_LEVELS:
+        if tolerance <= resolution:
+            column = name
+    return column
+
+# Connection pool configuration (overridable via environment variables)
+POOL_CONFIG = {
+    # Connections opened eagerly per worker process
+    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+    
+    # Upper bound of concurrently checked out connections per worker process
+    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 8)),
+    
+    # Seconds to wait for a free connection before giving up
+    'checkout_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    
+    # Idle connections older than this are pinged with SELECT 1 on checkout (seconds)
+    'health_check_idle_seconds': float(os.environ.get('DB_POOL_HEALTH_CHECK_IDLE', 30)),
+}
+
+# Layer statistics cache configuration (overridable via environment variables)
+STATS_CACHE_CONFIG = {
+    # Cached counts are reused for this long; inserts in this worker invalidate immediately,
+    # the TTL bounds staleness caused by inserts in other workers (seconds)
+    'ttl_seconds': float(os.environ.get('DB_STATS_CACHE_TTL', 5)),
+    
+    # With estimates enabled, tables whose pg_class.reltuples reach this size skip COUNT(*)
+    'estimate_threshold': int(os.environ.get('DB_STATS_ESTIMATE_THRESHOLD', 100000)),
+}
+
+# Layer union cache configuration
+UNION_CACHE_CONFIG = {
+    # Maximum vertices per stored piece of a dissolved layer geometry (ST_Subdivide)
+    'subdivide_max_vertices': int(os.environ.get('DB_UNION_SUBDIVIDE_VERTICES', 256)),
+}
+
+# Layer export configuration (overridable via environment variables)
+EXPORT_CONFIG = {
+    # Rows fetched per round trip from the server-side export cursor
+    'fetch_size': int(os.environ.get('DB_EXPORT_FETCH_SIZE', 1000)),
+}
+
+# Export formats: newline-delimited GeoJSON features (RFC 7946, EPSG:4326) and FlatGeobuf (EPSG:3857)
+EXPORT_FORMATS = ('geojson', 'fgb')
+
+# FlatGeobuf files start with 8 magic bytes and the uint32 size of the header that follows
+FLATGEOBUF_PREFIX_SIZE = 12
+
+# Accepted geometry payload fields, exactly one of them is expected per geometry
+GEOMETRY_INPUT_FIELDS = ('geometry_wkt', 'geometry_wkb', 'geometry_geojson')
+
+# Parses whichever input parameter is non-NULL (the parsers are STRICT, the casts keep
+# NULL arguments unambiguous for overloaded parsers), repairs invalid
+# geometries and coerces the result to the MULTIPOLYGON column type in the same statement
+GEOMETRY_INPUT_SQL = """ST_Multi(ST_CollectionExtract(ST_MakeValid(COALESCE(
+    ST_GeomFromText(%s::text, 3857),
+    ST_GeomFromWKB(%s::bytea, 3857),
+    ST_SetSRID(ST_GeomFromGeoJSON(%s::text), 3857)
+)), 3))"""
+
+# Insert modes: keep overlapping detections, merge new geometries with the existing
+# detections they overlap, or replace the overlapped detections
+INSERT_MODES = ('append', 'merge', 'replace')
+
+HEX_PATTERN = re.compile(r'^(?:[0-9a-fA-F]{2})+$')
+
+# Only polygonal input is stored, ST_CollectionExtract would turn anything else into an
+# EMPTY MultiPolygon. WKT is matched by its leading keyword (optionally after an SRID prefix),
+# WKB by its base type code (ISO Z/M offsets and EWKB flags stripped)
+POLYGONAL_GEOJSON_TYPES = ('Polygon', 'MultiPolygon')
+POLYGONAL_WKT_PATTERN = re.compile(r'^\s*(?:SRID=\d+\s*;\s*)?(?:MULTI)?POLYGON(?:ZM|Z|M)?\b', re.IGNORECASE)
+POLYGONAL_WKB_TYPES = (3, 6)
+
+def wkb_geometry_type(wkb: bytes) -> int:
+    """Base geometry type code of a WKB/EWKB geometry (3 polygon, 6 multipolygon, ...)"""
+    if len(wkb) < 5 or wkb[0] not in (0, 1):
+        raise ValueError("geometry_wkb is not a valid WKB geometry")
+    type_code = struct.unpack('<I' if wkb[0] == 1 else '>I', wkb[1:5])[0]
+    return (type_code & 0x0FFFFFFF) % 1000
+
+def geometry_input_params(geometry: Union[str, Dict[str, Any]]) -> tuple:
+    """
+    Convert a geometry payload into the (wkt, wkb, geojson) parameters of GEOMETRY_INPUT_SQL.
+    
+    Args:
+        geometry: WKT string, or dict with geometry_wkt, geometry_wkb (hex or base64)
+                  or geometry_geojson (geometry/feature object or JSON string)
+    
+    Returns:
+        tuple: (wkt, wkb, geojson) with exactly one non-None entry
+    
+    Raises:
+        ValueError: If the payload is malformed or not a Polygon/MultiPolygon
+    """
+    if isinstance(geometry, str):
+        geometry = {'geometry_wkt': geometry}
+    if not isinstance(geometry, dict):
+        raise ValueError("Geometry must be a WKT string or an object")
+    
+    provided = [field for field in GEOMETRY_INPUT_FIELDS if geometry.get(field)]
+    if len(provided) != 1:
+        raise ValueError(f"Exactly one of {', '.join(GEOMETRY_INPUT_FIELDS)} is required")
+    field = provided[0]
+    value = geometry[field]
+    
+    if field == 'geometry_wkt':
+        if not isinstance(value, str) or not POLYGONAL_WKT_PATTERN.match(value):
+            raise ValueError("geometry_wkt must be a POLYGON or MULTIPOLYGON")
+        return value, None, None
+    
+    if field == 'geometry_wkb':
+        if not isinstance(value, str):
+            raise ValueError("geometry_wkb must be a hex or base64 string")
+        try:
+            if HEX_PATTERN.match(value):
+                wkb = bytes.fromhex(value)
+            else:
+                wkb = base64.b64decode(value, validate=True)
+        except (ValueError, binascii.Error):
+            raise ValueError("geometry_wkb is neither valid hex nor base64")
+        if wkb_geometry_type(wkb) not in POLYGONAL_WKB_TYPES:
+            raise ValueError("geometry_wkb must be a Polygon or MultiPolygon")
+        return None, psycopg2.Binary(wkb), None
+    
+    # GeoJSON: accept geometry objects, features or their serialized form
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError("geometry_geojson is not valid JSON")
+    if isinstance(value, dict) and value.get('type') == 'Feature':
+        value = value.get('geometry')
+    if not isinstance(value, dict) or 'type' not in value:
+        raise ValueError("geometry_geojson must be a GeoJSON geometry or feature")
+    if value['type'] not in POLYGONAL_GEOJSON_TYPES:
+        raise ValueError(f"geometry_geojson must be a Polygon or MultiPolygon, got {value['type']}")
+    return None, None, json.dumps(value)
+
+class ConnectionPool:
+    """Thread-safe psycopg2 connection pool bound to the process that created it"""
+    
+    def __init__(self, connection_string, min_size, max_size, checkout_timeout, health_check_idle_seconds):
+        self.connection_string = connection_string
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.checkout_timeout = checkout_timeout
+        self.health_check_idle_seconds = health_check_idle_seconds
+        self.pid = os.getpid()
+        self._idle = []  # (connection, last used timestamp), most recently used last
+        self._in_use = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._metrics = {
+            'connections_created': 0,
+            'connections_discarded': 0,
+            'checkouts': 0,
+            'health_checks': 0,
+            'failed_health_checks': 0,
+            'checkout_timeouts': 0,
+            'total_wait_seconds': 0.0
+        }
+        
+        # Prefill is best effort, missing connections are opened on demand
+        try:
+            for _ in range(min(self.min_size, self.max_size)):
+                self._idle.append((self._connect(), time.time()))
+        except psycopg2.Error as e:
+            logger.warning(f"Connection pool prefill failed: {e}")
+    
+    def _connect(self):
+        conn = psycopg2.connect(self.connection_string)
+        with self._condition:
+            self._metrics['connections_created'] += 1
+        return conn
+    
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except psycopg2.Error:
+            pass
+        with self._condition:
+            self._metrics['connections_discarded'] += 1
+    
+    def _is_healthy(self, conn, last_used):
+        """Cheap state check for every checkout, round trip only for long idle connections"""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.time() - last_used < self.health_check_idle_seconds:
+            return True
+        
+        with self._condition:
+            self._metrics['health_checks'] += 1
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._condition:
+                self._metrics['failed_health_checks'] += 1
+            return False
+    
+    def getconn(self):
+        """Check out a healthy connection, blocking up to checkout_timeout if the pool is exhausted"""
+        start = time.time()
+        deadline = start + self.checkout_timeout
+        
+        with self._condition:
+            if self._closed:
+                raise PoolError("Connection pool is closed")
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._in_use < self.max_size:
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._metrics['checkout_timeouts'] += 1
+                    raise PoolError(f"No database connection available within {self.checkout_timeout}s")
+                self._condition.wait(remaining)
+            
+            self._in_use += 1
+            self._metrics['checkouts'] += 1
+            self._metrics['total_wait_seconds'] += time.time() - start
+        
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+            return conn
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+    
+    def putconn(self, conn, discard=False):
+        """Return a connection, rolling back any transaction left open by the caller"""
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        
+        with self._condition:
+            self._in_use -= 1
+            keep = not (discard or conn.closed or self._closed or len(self._idle) >= self.max_size)
+            if keep:
+                self._idle.append((conn, time.time()))
+            self._condition.notify()
+        
+        if not keep:
+            self._discard(conn)
+    
+    def close(self):
+        """Close all idle connections, checked out connections are closed when returned"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Snapshot of pool usage counters"""
+        with self._condition:
+            metrics = dict(self._metrics)
+            metrics.update({
+                'pid': self.pid,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'closed': self._closed
+            })
+        metrics['avg_wait_ms'] = (metrics['total_wait_seconds'] / metrics['checkouts'] * 1000) if metrics['checkouts'] else 0
+        return metrics
+
 class PostGISDatabase:
     """PostGIS database connection and management class"""
     
@@ -19,22 +335,95 @@ class PostGISDatabase:
         self.password = password
         self.database = database
         self.connection_string = f"host={host} port={port} user={user} password={password} dbname={database}"
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # Pools inherited from a parent process, kept referenced so their sockets are never
+        # finalized in the child (that would terminate the parent's server sessions)
+        self._inherited_pools = []
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+        
+        # Layer count cache: {estimate flag: (timestamp, counts)}, the generation is bumped on
+        # every invalidation so queries racing an insert never store stale counts
+        self._stats_cache = {}
+        self._stats_generation = 0
+        self._stats_lock = threading.Lock()
         
+        # Overlap matrix cache: {layer tuple: (layer versions, matrix)}, validated against
+        # layer_union_state.updated_at so changes made by any worker are picked up
+        self._matrix_cache = OrderedDict()
+        self._matrix_cache_entries = 16
+        self._matrix_lock = threading.Lock()
+    
+    def _reset_after_fork(self):
+        """Drop the parent's pool in a forked worker (gunicorn preload_app forks after init)"""
+        if self._pool is not None:
+            self._inherited_pools.append(self._pool)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._matrix_lock = threading.Lock()
+    
+    def _get_pool(self) -> ConnectionPool:
+        """Get the connection pool of the current process, creating it on first use"""
+        pool = self._pool
+        if pool is None or pool.pid != os.getpid():
+            with self._pool_lock:
+                if self._pool is not None and self._pool.pid != os.getpid():
+                    self._inherited_pools.append(self._pool)
+                    self._pool = None
+                if self._pool is None:
+                    self._pool = ConnectionPool(
+                        self.connection_string,
+                        min_size=POOL_CONFIG['min_size'],
+                        max_size=POOL_CONFIG['max_size'],
+                        checkout_timeout=POOL_CONFIG['checkout_timeout'],
+                        health_check_idle_seconds=POOL_CONFIG['health_check_idle_seconds']
+                    )
+                    logger.info(f"Database connection pool created for pid {os.getpid()} "
+                                f"(min={POOL_CONFIG['min_size']}, max={POOL_CONFIG['max_size']})")
+                pool = self._pool
+        return pool
+    
+    def close_pool(self):
+        """Close the connection pool of the current process"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None and pool.pid == os.getpid():
+            pool.close()
+            logger.info("Database connection pool closed")
+    
+    def get_pool_metrics(self) -> Dict[str, Any]:
+        """Get usage metrics of the current process' connection pool"""
+        pool = self._pool
+        if pool is None or pool.pid != os.getpid():
+            return {'pid': os.getpid(), 'initialized': False}
+        metrics = pool.get_metrics()
+        metrics['initialized'] = True
+        return metrics
+    
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
+        """Context manager for pooled database connections"""
+        pool = self._get_pool()
         conn = None
+        discard = False
         try:
-            conn = psycopg2.connect(self.connection_string)
+            conn = pool.getconn()
             yield conn
         except Exception as e:
             if conn:
-                conn.rollback()
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+                if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                    discard = True
             logger.error(f"Database connection error: {e}")
             raise
         finally:
             if conn:
-                conn.close()
+                pool.putconn(conn, discard=discard)
     
     def test_connection(self) -> bool:
         """Test if database connection is working"""
@@ -108,60 +497,165 @@ class PostGISDatabase:
         
         return table_names
     
+    def _get_legacy_tables(self, cursor) -> List[str]:
+        """Find per-class tables from the pre-partitioning layout still present in layerdb"""
+        cursor.execute("""
+            SELECT c.relname
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'layerdb' AND c.relkind = 'r' AND c.relname = ANY(%s)
+        """, (self.get_all_object_tables(),))
+        return [row[0] for row in cursor.fetchall()]
+    
     def drop_all_tables(self):
-        """Drop all object tables if they exist"""
+        """Drop the detections table with its partitions and compatibility views"""
         try:
             with self.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    table_names = self.get_all_object_tables()
+                    # Partitions and the per-class views depend on the parent table
+                    cursor.execute("DROP TABLE IF EXISTS layerdb.detections CASCADE")
+                    logger.info("Dropped detections table with partitions and views")
                     
-                    for table_name in table_names:
+                    # Per-class tables of the old layout
+                    for table_name in self._get_legacy_tables(cursor):
                         cursor.execute(f"DROP TABLE IF EXISTS layerdb.{table_name}")
-                        logger.info(f"Dropped table: {table_name}")
+                        logger.info(f"Dropped legacy table: {table_name}")
+                    
+                    # Drop layer union cache
+                    cursor.execute("DROP TABLE IF EXISTS layerdb.layer_union_pieces")
+                    cursor.execute("DROP TABLE IF EXISTS layerdb.layer_union_state")
                     
                     conn.commit()
-                    logger.info(f"Successfully dropped {len(table_names)} tables")
+                    self.invalidate_layer_stats()
+                    self.invalidate_layer_tiles(None)
+                    logger.info("Successfully dropped all object tables")
         except Exception as e:
             logger.error(f"Error dropping tables: {e}")
             raise
     
     def create_all_tables(self):
-        """Create all object tables with geometry column"""
+        """Create the detections table, one LIST partition and compatibility view per object class"""
         try:
             with self.get_connection() as conn:
                 with conn.cursor() as cursor:
                     table_names = self.get_all_object_tables()
                     
+                    # All detections live in one table partitioned by class
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS layerdb.detections (
+                            id BIGSERIAL,
+                            class TEXT NOT NULL,
+                            geom GEOMETRY(MULTIPOLYGON, 3857),
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            attributes JSONB DEFAULT '{}'::jsonb,
+                            PRIMARY KEY (class, id)
+                        ) PARTITION BY LIST (class)
+                    """)
+                    
+                    # Spatial index, propagated to every partition
+                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_detections_geom ON layerdb.detections USING GIST (geom)")
+                    
+                    # Multi-resolution variants, computed on insert and update
+                    for column, tolerance in GEOMETRY_LOD_LEVELS:
+                        cursor.execute(f"""
+                            ALTER TABLE layerdb.detections ADD COLUMN IF NOT EXISTS {column} GEOMETRY
+                            GENERATED ALWAYS AS (ST_SimplifyPreserveTopology(geom, {float(tolerance)})) STORED
+                        """)
+                    for column in RETIRED_GEOMETRY_LOD_COLUMNS:
+                        cursor.execute(f"ALTER TABLE layerdb.detections DROP COLUMN IF EXISTS {column}")
+                    
+                    legacy_tables = set(self._get_legacy_tables(cursor))
+                    
                     for table_name in table_names:
-                        # Create table with geometry column
-                        create_table_sql = f"""
-                            CREATE TABLE IF NOT EXISTS layerdb.{table_name} (
-                                id SERIAL PRIMARY KEY,
-                                geom GEOMETRY(MULTIPOLYGON, 3857),
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                attributes JSONB DEFAULT '{{}}'::jsonb
-                            )
-                        """
-                        cursor.execute(create_table_sql)
+                        cursor.execute(f"""
+                            CREATE TABLE IF NOT EXISTS layerdb.detections_{table_name}
+                            PARTITION OF layerdb.detections FOR VALUES IN ('{table_name}')
+                        """)
                         
-                        # Create spatial index
-                        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_geom ON layerdb.{table_name} USING GIST (geom)")
+                        # Move rows of an old per-class table into its partition
+                        if table_name in legacy_tables:
+                            cursor.execute(f"""
+                                INSERT INTO layerdb.detections (class, geom, created_at, attributes)
+                                SELECT %s, geom, created_at, attributes FROM layerdb.{table_name} ORDER BY id
+                            """, (table_name,))
+                            migrated_rows = cursor.rowcount
+                            cursor.execute(f"DROP TABLE layerdb.{table_name}")
+                            logger.info(f"Migrated {migrated_rows} rows of legacy table {table_name}")
                         
-                        logger.info(f"Created table: {table_name}")
+                        # Read-only compatibility view under the old table name
+                        cursor.execute(f"""
+                            CREATE OR REPLACE VIEW layerdb.{table_name} AS
+                            SELECT id, geom, created_at, attributes
+                            FROM layerdb.detections WHERE class = '{table_name}'
+                        """)
+                    
+                    # Layer union cache: dissolved geometry of each layer, stored as
+                    # subdivided pieces so intersections can use the GiST index
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS layerdb.layer_union_pieces (
+                            id BIGSERIAL PRIMARY KEY,
+                            layer TEXT NOT NULL,
+                            geom GEOMETRY(GEOMETRY, 3857) NOT NULL
+                        )
+                    """)
+                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_layer_union_pieces_geom ON layerdb.layer_union_pieces USING GIST (geom)")
+                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_layer_union_pieces_layer ON layerdb.layer_union_pieces (layer)")
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS layerdb.layer_union_state (
+                            layer TEXT PRIMARY KEY,
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    """)
                     
                     conn.commit()
-                    logger.info(f"Successfully created {len(table_names)} tables")
+                    logger.info(f"Successfully created detections table with {len(table_names)} partitions")
         except Exception as e:
             logger.error(f"Error creating tables: {e}")
             raise
     
-    def initialize_database(self, clear_data=True):
-        """Initialize database: ensure PostGIS, optionally drop tables, create tables"""
+    def get_schema_version(self) -> Optional[int]:
+        """Get the recorded layerdb schema version, None if the database was never versioned"""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT to_regclass('layerdb.schema_version') IS NOT NULL")
+                if not cursor.fetchone()[0]:
+                    return None
+                cursor.execute("SELECT MAX(version) FROM layerdb.schema_version")
+                return cursor.fetchone()[0]
+    
+    def record_schema_version(self):
+        """Store SCHEMA_VERSION as the current layerdb schema version"""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS layerdb.schema_version (
+                        version INTEGER PRIMARY KEY,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                cursor.execute("""
+                    INSERT INTO layerdb.schema_version (version) VALUES (%s)
+                    ON CONFLICT (version) DO UPDATE SET applied_at = CURRENT_TIMESTAMP
+                """, (SCHEMA_VERSION,))
+                conn.commit()
+                logger.info(f"Recorded schema version {SCHEMA_VERSION}")
+    
+    def initialize_database(self, clear_data=False):
+        """
+        Initialize database: ensure PostGIS, optionally drop tables, create tables.
+        
+        If the recorded schema version matches SCHEMA_VERSION and no clearing is requested,
+        all DDL is skipped and startup costs a single round trip.
+        """
         try:
-            if clear_data:
-                logger.info("Initializing database with data clearing...")
+            if not clear_data:
+                version = self.get_schema_version()
+                if version == SCHEMA_VERSION:
+                    logger.info(f"Database schema version {version} is current, skipping initialization")
+                    return
+                logger.info(f"Database schema version {version} differs from {SCHEMA_VERSION}, initializing with data persistence...")
             else:
-                logger.info("Initializing database with data persistence...")
+                logger.info("Initializing database with data clearing...")
             
             # Test connection
             if not self.test_connection():
@@ -181,13 +675,12 @@ class PostGISDatabase:
             if clear_data:
                 logger.info("Clearing existing data...")
                 self.drop_all_tables()
-                # Force a commit to ensure tables are actually dropped
-                self.force_commit()
             else:
                 logger.info("Preserving existing data...")
             
             # Create all tables (will only create tables that don't exist)
             self.create_all_tables()
+            self.record_schema_version()
             
             if clear_data:
                 logger.info("Database initialization completed successfully - data cleared")
@@ -214,14 +707,11 @@ class PostGISDatabase:
         try:
             with self.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    table_names = self.get_all_object_tables()
+                    cursor.execute("SELECT class, COUNT(*) FROM layerdb.detections GROUP BY class")
                     total_rows = 0
-                    for table_name in table_names:
-                        cursor.execute(f"SELECT COUNT(*) FROM layerdb.{table_name}")
-                        count = cursor.fetchone()[0]
+                    for table_name, count in cursor.fetchall():
                         total_rows += count
-                        if count > 0:
-                            logger.warning(f"Table {table_name} still has {count} rows after clearing")
+                        logger.warning(f"Table {table_name} still has {count} rows after clearing")
                     
                     logger.info(f"Database verification: {total_rows} total rows across all tables")
         except Exception as e:
@@ -234,10 +724,12 @@ class PostGISDatabase:
             return 'building'  # Default to building table
         return object_name.lower().replace(' ', '_')
     
-    def insert_geometry(self, object_name: str, geometry_wkt: str, attributes: Optional[Dict[str, Any]] = None):
-        """Insert geometry into the corresponding table"""
+    def insert_geometry(self, object_name: str, geometry: Union[str, Dict[str, Any]], attributes: Optional[Dict[str, Any]] = None,
+                        mode: str = 'append', min_overlap: float = 0.0):
+        """Insert geometry (WKT string or WKT/WKB/GeoJSON payload) into the corresponding table"""
         try:
             table_name = self.object_name_to_table_name(object_name)
+            geometry_params = geometry_input_params(geometry)
             
             with self.get_connection() as conn:
                 with conn.cursor() as cursor:
@@ -245,16 +737,20 @@ class PostGISDatabase:
                     attrs = attributes or {}
                     attrs_json = psycopg2.extras.Json(attrs)
                     
-                    # Insert geometry
+                    # Insert geometry into the partition of its class
                     insert_sql = f"""
-                        INSERT INTO layerdb.{table_name} (geom, attributes)
-                        VALUES (ST_GeomFromText(%s, 3857), %s)
+                        INSERT INTO layerdb.detections (class, geom, attributes)
+                        VALUES (%s, {GEOMETRY_INPUT_SQL}, %s)
                         RETURNING id
                     """
-                    cursor.execute(insert_sql, (geometry_wkt, attrs_json))
+                    cursor.execute(insert_sql, (table_name, *geometry_params, attrs_json))
                     geometry_id = cursor.fetchone()[0]
                     
+                    changed_extent, _ = self._apply_insert(cursor, table_name, [geometry_id], mode, min_overlap)
+                    
                     conn.commit()
+                    self.invalidate_layer_stats()
+                    self.invalidate_layer_tiles(table_name, changed_extent)
                     logger.info(f"Inserted geometry {geometry_id} into table {table_name}")
                     return geometry_id
                     
@@ -262,6 +758,148 @@ class PostGISDatabase:
             logger.error(f"Error inserting geometry into {table_name}: {e}")
             raise
     
+    def insert_geometries(self, object_name: str, geometries: List[Dict[str, Any]], page_size: int = 500,
+                          mode: str = 'append', min_overlap: float = 0.0) -> Dict[str, Any]:
+        """Insert many geometries into the corresponding table in a single transaction"""
+        try:
+            table_name = self.object_name_to_table_name(object_name)
+            
+            rows = [
+                (table_name, *geometry_input_params(geometry), psycopg2.extras.Json(geometry.get('attributes') or {}))
+                for geometry in geometries
+            ]
+            
+            with self.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    # One multi-row INSERT per page, all pages share the transaction
+                    insert_sql = """
+                        INSERT INTO layerdb.detections (class, geom, attributes)
+                        VALUES %s
+                        RETURNING id
+                    """
+                    result = execute_values(
+                        cursor, insert_sql, rows,
+                        template=f"(%s, {GEOMETRY_INPUT_SQL}, %s)",
+                        page_size=page_size,
+                        fetch=True
+                    )
+                    geometry_ids = [row[0] for row in result]
+                    
+                    changed_extent, removed_ids = self._apply_insert(cursor, table_name, geometry_ids, mode, min_overlap)
+                    
+                    cursor.execute("SELECT COUNT(*) FROM layerdb.detections WHERE class = %s", (table_name,))
+                    updated_count = cursor.fetchone()[0]
+                    
+                    conn.commit()
+                    self.invalidate_layer_stats()
+                    self.invalidate_layer_tiles(table_name, changed_extent)
+                    logger.info(f"Inserted {len(geometry_ids)} geometries into table {table_name}")
+                    return {
+                        'geometry_ids': geometry_ids,
+                        'removed_ids': removed_ids,
+                        'table_name': table_name,
+                        'updated_count': updated_count
+                    }
+                    
+        except Exception as e:
+            logger.error(f"Error bulk inserting geometries into {table_name}: {e}")
+            raise
+    
+    def _apply_insert(self, cursor, table_name: str, geometry_ids: List[int], mode: str, min_overlap: float) -> tuple:
+        """
+        Post-insert steps shared by the insert methods, run in the insert transaction:
+        de-duplication according to mode, union cache maintenance and changed extent.
+        
+        Returns:
+            tuple: (changed bbox or None, ids of removed existing detections)
+        """
+        if mode not in INSERT_MODES:
+            raise ValueError(f"Unknown insert mode {mode}, expected one of {', '.join(INSERT_MODES)}")
+        
+        removed_ids, removed_extent = [], None
+        if mode != 'append':
+            # Serializes with concurrent inserts of the layer, so their committed rows are visible
+            self._lock_layer_union(cursor, table_name)
+            removed_ids, removed_extent = self.deduplicate_geometries(cursor, table_name, geometry_ids, mode, min_overlap)
+        
+        if removed_ids and mode == 'replace':
+            # Removed area cannot be subtracted incrementally, rebuild the union on next use
+            self.reset_layer_union(cursor, table_name)
+        else:
+            # Merge into the layer union cache within the same transaction
+            self.update_layer_union(cursor, table_name, geometry_ids)
+        
+        changed_extent = self._get_geometries_extent(cursor, table_name, geometry_ids)
+        if removed_extent:
+            if changed_extent:
+                changed_extent = (min(changed_extent[0], removed_extent[0]), min(changed_extent[1], removed_extent[1]),
+                                  max(changed_extent[2], removed_extent[2]), max(changed_extent[3], removed_extent[3]))
+            else:
+                changed_extent = removed_extent
+        return changed_extent, removed_ids
+    
+    def deduplicate_geometries(self, cursor, table_name: str, geometry_ids: List[int], mode: str, min_overlap: float = 0.0) -> tuple:
+        """
+        Merge new geometries with, or let them replace, existing detections they overlap.
+        
+        Existing detections count as overlapping if their interiors intersect and the shared
+        area is at least min_overlap times the smaller of both areas. Each existing detection
+        is assigned to one new geometry; candidates are found through the GiST index.
+        
+        Returns:
+            tuple: (ids of removed existing detections, bbox of the removed geometries or None)
+        """
+        merge_sql = """
+            , merged_geoms AS (
+                SELECT new_id, ST_Union(existing_geom) AS geom FROM assigned GROUP BY new_id
+            ),
+            merged AS (
+                UPDATE layerdb.detections d
+                SET geom = ST_Multi(ST_CollectionExtract(ST_MakeValid(ST_Union(d.geom, m.geom)), 3))
+                FROM merged_geoms m
+                WHERE d.class = %(layer)s AND d.id = m.new_id
+                RETURNING d.id
+            )
+        """ if mode == 'merge' else ""
+        
+        cursor.execute(f"""
+            WITH new_rows AS (
+                SELECT id, geom FROM layerdb.detections WHERE class = %(layer)s AND id = ANY(%(ids)s)
+            ),
+            matches AS (
+                SELECT n.id AS new_id, e.id AS existing_id, e.geom AS existing_geom
+                FROM new_rows n
+                JOIN layerdb.detections e
+                  ON e.class = %(layer)s
+                 AND e.geom && n.geom
+                 AND e.id <> ALL(%(ids)s)
+                 AND ST_Relate(e.geom, n.geom, '2********')
+                WHERE %(min_overlap)s <= 0
+                   OR ST_Area(ST_Intersection(e.geom, n.geom)) >= %(min_overlap)s * LEAST(ST_Area(e.geom), ST_Area(n.geom))
+            ),
+            assigned AS (
+                SELECT DISTINCT ON (existing_id) new_id, existing_id, existing_geom
+                FROM matches
+                ORDER BY existing_id, new_id
+            ),
+            removed AS (
+                DELETE FROM layerdb.detections d
+                USING assigned a
+                WHERE d.class = %(layer)s AND d.id = a.existing_id
+                RETURNING d.id, d.geom
+            )
+            {merge_sql}
+            SELECT COALESCE(array_agg(id), '{{}}'), ST_XMin(ST_Extent(geom)), ST_YMin(ST_Extent(geom)),
+                   ST_XMax(ST_Extent(geom)), ST_YMax(ST_Extent(geom))
+            FROM removed
+        """, {'layer': table_name, 'ids': geometry_ids, 'min_overlap': min_overlap})
+        removed_ids, *extent = cursor.fetchone()
+        
+        if removed_ids:
+            action = 'Merged' if mode == 'merge' else 'Replaced'
+            logger.info(f"{action} {len(removed_ids)} overlapping geometries in table {table_name}")
+        return list(removed_ids), (tuple(extent) if extent[0] is not None else None)
+    
     def get_geometries_count(self, object_name: str) -> int:
         """Get count of geometries in a table"""
         try:
@@ -269,7 +907,7 @@ class PostGISDatabase:
             
             with self.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute(f"SELECT COUNT(*) FROM layerdb.{table_name}")
+                    cursor.execute("SELECT COUNT(*) FROM layerdb.detections WHERE class = %s", (table_name,))
                     count = cursor.fetchone()[0]
                     return count
                     
@@ -277,70 +915,471 @@ class PostGISDatabase:
             logger.error(f"Error getting count from {table_name}: {e}")
             return 0
     
-    def calculate_area_intersection(self, object_name1: str, object_name2: str) -> Dict[str, Any]:
-        """Calculate area intersection between two object tables"""
+    def _get_geometries_extent(self, cursor, table_name: str, geometry_ids: List[int]) -> Optional[tuple]:
+        """Bounding box (minx, miny, maxx, maxy) of the given geometries, None if empty"""
+        cursor.execute("""
+            SELECT ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e)
+            FROM (SELECT ST_Extent(geom) AS e FROM layerdb.detections WHERE class = %s AND id = ANY(%s)) extent
+        """, (table_name, geometry_ids))
+        row = cursor.fetchone()
+        return tuple(row) if row and row[0] is not None else None
+    
+    def invalidate_layer_tiles(self, table_name: Optional[str], bbox: Optional[tuple] = None):
+        """Drop cached vector tiles covered by bbox (whole layer without bbox, all layers without name)"""
+        try:
+            from .vector_tiles import get_tile_cache
+            if table_name is None:
+                get_tile_cache().clear()
+            else:
+                get_tile_cache().invalidate(table_name, bbox)
+        except Exception as e:
+            logger.error(f"Error invalidating vector tiles of {table_name}: {e}")
+    
+    def get_layer_mvt(self, object_name: str, z: int, x: int, y: int,
+                      extent: int = 4096, buffer: int = 64, tolerance: float = 0.0) -> bytes:
+        """Render one Mapbox Vector Tile of a layer with ST_AsMVT"""
+        table_name = self.object_name_to_table_name(object_name)
+        
+        # Prefer a precomputed variant, simplify at query time only when none is coarse enough
+        geometry_column = geometry_column_for_resolution(tolerance) if tolerance > 0 else 'geom'
+        if geometry_column != 'geom':
+            tolerance = 0.0
+        
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Rows are found through the GiST index on the buffered tile envelope and
+                # simplified by the zoom-dependent tolerance before clipping and quantization
+                cursor.execute(f"""
+                    WITH bounds AS (
+                        SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom,
+                               ST_TileEnvelope(%(z)s, %(x)s, %(y)s, margin => %(margin)s) AS query_geom
+                    )
+                    SELECT ST_AsMVT(tile, %(layer)s, %(extent)s, 'geom', 'id')
+                    FROM (
+                        SELECT d.id,
+                               d.created_at::text AS created_at,
+                               ST_AsMVTGeom(
+                                   CASE WHEN %(tolerance)s > 0
+                                        THEN ST_SimplifyPreserveTopology(d.geom, %(tolerance)s)
+                                        ELSE d.{geometry_column} END,
+                                   b.geom, %(extent)s, %(buffer)s, true
+                               ) AS geom
+                        FROM layerdb.detections d, bounds b
+                        WHERE d.class = %(layer)s AND d.geom && b.query_geom
+                    ) tile
+                    WHERE tile.geom IS NOT NULL
+                """, {
+                    'z': z, 'x': x, 'y': y,
+                    'margin': buffer / extent,
+                    'layer': table_name,
+                    'extent': extent,
+                    'buffer': buffer,
+                    'tolerance': tolerance
+                })
+                row = cursor.fetchone()
+                return bytes(row[0]) if row and row[0] is not None else b''
+    
+    def iter_layer_export(self, object_name: str, export_format: str = 'geojson',
+                          bbox: Optional[List[float]] = None, since=None, until=None) -> Iterator[bytes]:
+        """
+        Stream the detections of a layer from a named server-side cursor in constant memory.
+        
+        Args:
+            object_name: Layer to export
+            export_format: 'geojson' (one feature per line) or 'fgb' (FlatGeobuf without spatial index)
+            bbox: Optional [minx, miny, maxx, maxy] filter in EPSG:3857
+            since, until: Optional created_at range (start inclusive, end exclusive)
+        
+        Yields:
+            bytes: Encoded features in id order
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {export_format}")
+        
+        table_name = self.object_name_to_table_name(object_name)
+        conditions = ["class = %(layer)s"]
+        params = {'layer': table_name}
+        if bbox is not None:
+            conditions.append("geom && ST_MakeEnvelope(%(minx)s, %(miny)s, %(maxx)s, %(maxy)s, 3857)")
+            params.update(zip(('minx', 'miny', 'maxx', 'maxy'), bbox))
+        if since is not None:
+            conditions.append("created_at >= %(since)s")
+            params['since'] = since
+        if until is not None:
+            conditions.append("created_at < %(until)s")
+            params['until'] = until
+        where = ' AND '.join(conditions)
+        
+        if export_format == 'geojson':
+            query = f"""
+                SELECT ST_AsGeoJSON(f, 'geom', 7)
+                FROM (
+                    SELECT id, class, created_at, attributes, ST_Transform(geom, 4326) AS geom
+                    FROM layerdb.detections WHERE {where} ORDER BY id
+                ) f
+            """
+        else:
+            # One single-feature FlatGeobuf per row; the header is kept from the first row only,
+            # which is valid because unindexed output leaves the header feature count at 0
+            query = f"""
+                SELECT (SELECT ST_AsFlatGeobuf(f, false, 'geom')
+                        FROM (SELECT d.id, d.class, d.created_at, d.attributes, d.geom) f)
+                FROM layerdb.detections d WHERE {where} ORDER BY d.id
+            """
+        
+        with self.get_connection() as conn:
+            try:
+                header_sent = False
+                exported = 0
+                with conn.cursor(name=f"layer_export_{uuid.uuid4().hex}") as cursor:
+                    cursor.itersize = EXPORT_CONFIG['fetch_size']
+                    cursor.execute(query, params)
+                    for (value,) in cursor:
+                        exported += 1
+                        if export_format == 'geojson':
+                            yield value.encode('utf-8') + b'\n'
+                            continue
+                        
+                        data = bytes(value)
+                        header_end = FLATGEOBUF_PREFIX_SIZE + int.from_bytes(data[8:FLATGEOBUF_PREFIX_SIZE], 'little')
+                        if not header_sent:
+                            header_sent = True
+                            yield data[:header_end]
+                        yield data[header_end:]
+                
+                # Nothing matched, a FlatGeobuf file still needs its header
+                if export_format == 'fgb' and not header_sent:
+                    with conn.cursor() as cursor:
+                        cursor.execute("""
+                            SELECT ST_AsFlatGeobuf(f, false, 'geom')
+                            FROM (SELECT id, class, created_at, attributes, geom FROM layerdb.detections WHERE false) f
+                        """)
+                        row = cursor.fetchone()
+                        if row and row[0] is not None:
+                            yield bytes(row[0])
+                
+                logger.info(f"Exported {exported} detections of layer {table_name} as {export_format}")
+            finally:
+                # Also ends the transaction when the client disconnects mid-stream, get_connection
+                # does not roll back on GeneratorExit
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+    
+    def invalidate_layer_stats(self):
+        """Drop cached layer counts after data changes"""
+        with self._stats_lock:
+            self._stats_generation += 1
+            self._stats_cache.clear()
+    
+    def get_layer_counts(self, estimate: bool = False) -> Dict[str, int]:
+        """
+        Get row counts of all object classes with a single query, cached briefly.
+        
+        Args:
+            estimate: Use pg_class.reltuples instead of COUNT(*) for partitions at or above
+                      STATS_CACHE_CONFIG['estimate_threshold'] rows
+        
+        Returns:
+            dict: table name -> row count
+        """
+        with self._stats_lock:
+            cached = self._stats_cache.get(estimate)
+            if cached and time.time() - cached[0] < STATS_CACHE_CONFIG['ttl_seconds']:
+                return dict(cached[1])
+            generation = self._stats_generation
+        
+        table_names = self.get_all_object_tables()
+        counts = {}
+        
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                exact_tables = table_names
+                
+                if estimate:
+                    # Estimates come from the class partitions; reltuples is -1 (PG14+)
+                    # or 0 for partitions that were never analyzed
+                    cursor.execute("""
+                        SELECT substr(c.relname, length('detections_') + 1), c.reltuples::bigint
+                        FROM pg_class c
+                        JOIN pg_namespace n ON n.oid = c.relnamespace
+                        WHERE n.nspname = 'layerdb' AND c.relkind = 'r' AND c.relname = ANY(%s)
+                    """, ([f"detections_{table_name}" for table_name in table_names],))
+                    for table_name, reltuples in cursor.fetchall():
+                        if reltuples >= STATS_CACHE_CONFIG['estimate_threshold']:
+                            counts[table_name] = reltuples
+                    exact_tables = [name for name in table_names if name not in counts]
+                
+                if exact_tables:
+                    cursor.execute("""
+                        SELECT class, COUNT(*) FROM layerdb.detections
+                        WHERE class = ANY(%s)
+                        GROUP BY class
+                    """, (exact_tables,))
+                    for table_name, count in cursor.fetchall():
+                        counts[table_name] = count
+        
+        with self._stats_lock:
+            if generation == self._stats_generation:
+                self._stats_cache[estimate] = (time.time(), counts)
+        return dict(counts)
+    
+    def _lock_layer_union(self, cursor, table_name: str):
+        """Serialize union cache maintenance per layer until the transaction ends"""
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"layer_union:{table_name}",))
+    
+    def ensure_layer_union(self, cursor, table_name: str):
+        """Build the union cache of a layer from scratch if it does not exist yet"""
+        cursor.execute("SELECT 1 FROM layerdb.layer_union_state WHERE layer = %s", (table_name,))
+        if cursor.fetchone():
+            return
+        
+        self._lock_layer_union(cursor, table_name)
+        cursor.execute("SELECT 1 FROM layerdb.layer_union_state WHERE layer = %s", (table_name,))
+        if cursor.fetchone():
+            return
+        
+        cursor.execute("DELETE FROM layerdb.layer_union_pieces WHERE layer = %s", (table_name,))
+        cursor.execute("""
+            INSERT INTO layerdb.layer_union_pieces (layer, geom)
+            SELECT %(layer)s, ST_Subdivide(u.geom, %(max_vertices)s)
+            FROM (SELECT ST_Union(ST_MakeValid(geom)) AS geom FROM layerdb.detections WHERE class = %(layer)s) u
+            WHERE u.geom IS NOT NULL
+        """, {'layer': table_name, 'max_vertices': UNION_CACHE_CONFIG['subdivide_max_vertices']})
+        piece_count = cursor.rowcount
+        cursor.execute("INSERT INTO layerdb.layer_union_state (layer) VALUES (%s)", (table_name,))
+        logger.info(f"Built union cache for layer {table_name} ({piece_count} pieces)")
+    
+    def reset_layer_union(self, cursor, table_name: str):
+        """Discard the union cache of a layer, it is rebuilt on next use"""
+        self._lock_layer_union(cursor, table_name)
+        cursor.execute("DELETE FROM layerdb.layer_union_pieces WHERE layer = %s", (table_name,))
+        cursor.execute("DELETE FROM layerdb.layer_union_state WHERE layer = %s", (table_name,))
+    
+    def update_layer_union(self, cursor, table_name: str, geometry_ids: List[int]):
+        """
+        Merge newly inserted geometries into the union cache of their layer.
+        
+        Only the stored pieces touching the new geometries are dissolved with them and
+        re-subdivided, so the cost depends on the insert, not on the layer size. Layers
+        without a cache are skipped, it is built on first use.
+        """
+        if not geometry_ids:
+            return
+        
+        self._lock_layer_union(cursor, table_name)
+        cursor.execute("SELECT 1 FROM layerdb.layer_union_state WHERE layer = %s", (table_name,))
+        if not cursor.fetchone():
+            return
+        
+        cursor.execute("""
+            WITH new_geom AS (
+                SELECT ST_Union(geom) AS geom FROM layerdb.detections WHERE class = %s AND id = ANY(%s)
+            ),
+            touched AS (
+                DELETE FROM layerdb.layer_union_pieces p
+                USING new_geom n
+                WHERE p.layer = %s AND ST_Intersects(p.geom, n.geom)
+                RETURNING p.geom
+            ),
+            merged AS (
+                SELECT ST_Union(geom) AS geom
+                FROM (SELECT geom FROM new_geom UNION ALL SELECT geom FROM touched) parts
+            )
+            INSERT INTO layerdb.layer_union_pieces (layer, geom)
+            SELECT %s, ST_Subdivide(m.geom, %s)
+            FROM merged m
+            WHERE m.geom IS NOT NULL
+        """, (table_name, geometry_ids, table_name, table_name, UNION_CACHE_CONFIG['subdivide_max_vertices']))
+        cursor.execute("UPDATE layerdb.layer_union_state SET updated_at = CURRENT_TIMESTAMP WHERE layer = %s", (table_name,))
+    
+    def calculate_area_intersection(self, object_name1: str, object_name2: str,
+                                    bbox: Optional[List[float]] = None,
+                                    polygon: Optional[Union[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Calculate area intersection between two object tables using the layer union cache.
+        
+        Args:
+            object_name1, object_name2: Layers to intersect
+            bbox: Optional [minx, miny, maxx, maxy] in EPSG:3857 restricting the computation
+            polygon: Optional WKT/WKB/GeoJSON payload (see geometry_input_params) restricting
+                     the computation, used instead of bbox
+        """
         try:
             table_name1 = self.object_name_to_table_name(object_name1)
             table_name2 = self.object_name_to_table_name(object_name2)
             
             with self.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    # Calculate intersection
-                    intersection_sql = f"""
-                        WITH layer1_union AS (
-                            SELECT ST_Union(geom) as geom FROM layerdb.{table_name1}
-                        ),
-                        layer2_union AS (
-                            SELECT ST_Union(geom) as geom FROM layerdb.{table_name2}
-                        ),
-                        intersection AS (
-                            SELECT ST_Intersection(l1.geom, l2.geom) as geom
-                            FROM layer1_union l1, layer2_union l2
-                            WHERE ST_Intersects(l1.geom, l2.geom)
-                        )
-                        SELECT
-                            ST_Area(l1.geom) as area1,
-                            ST_Area(l2.geom) as area2,
-                            COALESCE(ST_Area(i.geom), 0) as intersection_area,
-                            (SELECT COUNT(*) FROM layerdb.{table_name1}) as count1,
-                            (SELECT COUNT(*) FROM layerdb.{table_name2}) as count2
-                        FROM layer1_union l1, layer2_union l2
-                        LEFT JOIN intersection i ON true
-                    """
+                    # Build missing union caches once, later inserts keep them current
+                    self.ensure_layer_union(cursor, table_name1)
+                    self.ensure_layer_union(cursor, table_name2)
+                    conn.commit()
                     
-                    cursor.execute(intersection_sql)
-                    result = cursor.fetchone()
+                    if polygon is not None:
+                        filter_sql, filter_params = GEOMETRY_INPUT_SQL, geometry_input_params(polygon)
+                    elif bbox is not None:
+                        filter_sql, filter_params = "ST_MakeEnvelope(%s, %s, %s, %s, 3857)", tuple(bbox)
+                    else:
+                        filter_sql, filter_params = None, None
                     
-                    if result:
-                        area1, area2, intersection_area, count1, count2 = result
-                        
-                        # Calculate percentages
-                        layer1_overlap_percentage = (intersection_area / area1 * 100) if area1 > 0 else 0
-                        layer2_overlap_percentage = (intersection_area / area2 * 100) if area2 > 0 else 0
+                    if filter_sql:
+                        # Only pieces and polygons hitting the filter are read (GiST), and pieces
+                        # are clipped to it before their areas and intersections are summed
+                        filtered_sql = f"""
+                            WITH area_filter AS (SELECT {filter_sql} AS geom)
+                            SELECT
+                                (SELECT COALESCE(SUM(ST_Area(ST_Intersection(p.geom, f.geom))), 0)
+                                 FROM layerdb.layer_union_pieces p, area_filter f
+                                 WHERE p.layer = %s AND ST_Intersects(p.geom, f.geom)) AS area1,
+                                (SELECT COALESCE(SUM(ST_Area(ST_Intersection(p.geom, f.geom))), 0)
+                                 FROM layerdb.layer_union_pieces p, area_filter f
+                                 WHERE p.layer = %s AND ST_Intersects(p.geom, f.geom)) AS area2,
+                                (SELECT COALESCE(SUM(ST_Area(ST_Intersection(ST_Intersection(p1.geom, p2.geom), f.geom))), 0)
+                                 FROM area_filter f
+                                 JOIN layerdb.layer_union_pieces p1 ON p1.layer = %s AND ST_Intersects(p1.geom, f.geom)
+                                 JOIN layerdb.layer_union_pieces p2 ON p2.layer = %s AND ST_Intersects(p1.geom, p2.geom)
+                                ) AS intersection_area,
+                                (SELECT COUNT(*) FROM layerdb.detections t, area_filter f
+                                 WHERE t.class = %s AND ST_Intersects(t.geom, f.geom)) AS count1,
+                                (SELECT COUNT(*) FROM layerdb.detections t, area_filter f
+                                 WHERE t.class = %s AND ST_Intersects(t.geom, f.geom)) AS count2
+                        """
+                        cursor.execute(filtered_sql, (*filter_params, table_name1, table_name2, table_name1, table_name2,
+                                                      table_name1, table_name2))
+                        area1, area2, intersection_area, count1, count2 = cursor.fetchone()
                         
-                        return {
-                            'layer1Area': area1,
-                            'layer2Area': area2,
-                            'intersectionArea': intersection_area,
-                            'layer1PolygonCount': count1,
-                            'layer2PolygonCount': count2,
-                            'layer1OverlapPercentage': layer1_overlap_percentage,
-                            'layer2OverlapPercentage': layer2_overlap_percentage
-                        }
-                    else:
-                        return {
-                            'layer1Area': 0,
-                            'layer2Area': 0,
-                            'intersectionArea': 0,
-                            'layer1PolygonCount': 0,
-                            'layer2PolygonCount': 0,
-                            'layer1OverlapPercentage': 0,
-                            'layer2OverlapPercentage': 0
-                        }
+                        return self._format_intersection_result(area1, area2, intersection_area, count1, count2)
+                    
+                    # Pieces of one layer never overlap, so summing piece areas and
+                    # pairwise piece intersections (GiST join) gives the dissolved areas
+                    intersection_sql = """
+                        SELECT
+                            (SELECT COALESCE(SUM(ST_Area(geom)), 0)
+                             FROM layerdb.layer_union_pieces WHERE layer = %(layer1)s) AS area1,
+                            (SELECT COALESCE(SUM(ST_Area(geom)), 0)
+                             FROM layerdb.layer_union_pieces WHERE layer = %(layer2)s) AS area2,
+                            (SELECT COALESCE(SUM(ST_Area(ST_Intersection(p1.geom, p2.geom))), 0)
+                             FROM layerdb.layer_union_pieces p1
+                             JOIN layerdb.layer_union_pieces p2 ON ST_Intersects(p1.geom, p2.geom)
+                             WHERE p1.layer = %(layer1)s AND p2.layer = %(layer2)s) AS intersection_area
+                    """
+                    
+                    cursor.execute(intersection_sql, {'layer1': table_name1, 'layer2': table_name2})
+                    area1, area2, intersection_area = cursor.fetchone()
+            
+            # Polygon counts come from the cached layer statistics
+            layer_counts = self.get_layer_counts()
+            count1 = layer_counts.get(table_name1, 0)
+            count2 = layer_counts.get(table_name2, 0)
+            
+            return self._format_intersection_result(area1, area2, intersection_area, count1, count2)
                         
         except Exception as e:
             logger.error(f"Error calculating intersection between {table_name1} and {table_name2}: {e}")
             raise
+    
+    def calculate_overlap_matrix(self, object_names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Calculate pairwise overlap areas of several layers in one pass over the union cache.
+        
+        Args:
+            object_names: Layers to compare, defaults to all non-empty layers
+        
+        Returns:
+            dict: layers, areas, polygon counts and matrix[row][column] with the intersection
+                  area and the percentage of the row layer covered by the column layer
+        """
+        if object_names:
+            table_names = sorted({self.object_name_to_table_name(name) for name in object_names})
+        else:
+            table_names = sorted(name for name, count in self.get_layer_counts().items() if count > 0)
+        
+        if not table_names:
+            return {'layers': [], 'areas': {}, 'polygonCounts': {}, 'matrix': {}}
+        
+        key = tuple(table_names)
+        
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                for table_name in table_names:
+                    self.ensure_layer_union(cursor, table_name)
+                conn.commit()
+                
+                # Every insert or rebuild moves updated_at, so equal versions mean an unchanged result
+                cursor.execute("""
+                    SELECT layer, updated_at FROM layerdb.layer_union_state WHERE layer = ANY(%s)
+                """, (table_names,))
+                versions = {layer: updated_at.isoformat() for layer, updated_at in cursor.fetchall()}
+                
+                with self._matrix_lock:
+                    cached = self._matrix_cache.get(key)
+                    if cached and cached[0] == versions:
+                        self._matrix_cache.move_to_end(key)
+                        return cached[1]
+                
+                cursor.execute("""
+                    SELECT layer, COALESCE(SUM(ST_Area(geom)), 0)
+                    FROM layerdb.layer_union_pieces
+                    WHERE layer = ANY(%s)
+                    GROUP BY layer
+                """, (table_names,))
+                areas = dict(cursor.fetchall())
+                
+                # Each unordered layer pair is computed once through the GiST index
+                cursor.execute("""
+                    SELECT p1.layer, p2.layer, SUM(ST_Area(ST_Intersection(p1.geom, p2.geom)))
+                    FROM layerdb.layer_union_pieces p1
+                    JOIN layerdb.layer_union_pieces p2
+                      ON p2.layer = ANY(%(layers)s) AND p1.layer < p2.layer AND ST_Intersects(p1.geom, p2.geom)
+                    WHERE p1.layer = ANY(%(layers)s)
+                    GROUP BY p1.layer, p2.layer
+                """, {'layers': table_names})
+                pair_areas = {}
+                for layer1, layer2, intersection_area in cursor.fetchall():
+                    pair_areas[(layer1, layer2)] = pair_areas[(layer2, layer1)] = intersection_area
+        
+        layer_counts = self.get_layer_counts()
+        matrix = {}
+        for row in table_names:
+            row_area = areas.get(row, 0)
+            matrix[row] = {}
+            for column in table_names:
+                intersection_area = row_area if row == column else pair_areas.get((row, column), 0)
+                matrix[row][column] = {
+                    'intersectionArea': intersection_area,
+                    'overlapPercentage': (intersection_area / row_area * 100) if row_area > 0 else 0
+                }
+        
+        result = {
+            'layers': table_names,
+            'areas': {name: areas.get(name, 0) for name in table_names},
+            'polygonCounts': {name: layer_counts.get(name, 0) for name in table_names},
+            'matrix': matrix
+        }
+        
+        with self._matrix_lock:
+            self._matrix_cache[key] = (versions, result)
+            self._matrix_cache.move_to_end(key)
+            while len(self._matrix_cache) > self._matrix_cache_entries:
+                self._matrix_cache.popitem(last=False)
+        return result
+    
+    def _format_intersection_result(self, area1, area2, intersection_area, count1, count2) -> Dict[str, Any]:
+        """Build the intersection response including overlap percentages"""
+        layer1_overlap_percentage = (intersection_area / area1 * 100) if area1 > 0 else 0
+        layer2_overlap_percentage = (intersection_area / area2 * 100) if area2 > 0 else 0
+        
+        return {
+            'layer1Area': area1,
+            'layer2Area': area2,
+            'intersectionArea': intersection_area,
+            'layer1PolygonCount': count1,
+            'layer2PolygonCount': count2,
+            'layer1OverlapPercentage': layer1_overlap_percentage,
+            'layer2OverlapPercentage': layer2_overlap_percentage
+        }
 
 # Global database instance - will be initialized later
 db = None
@@ -366,12 +1405,15 @@ def get_database() -> PostGISDatabase:
         )
     return db
 
-def initialize_database(clear_data=True):
-    """Initialize the database on startup"""
+def initialize_database(clear_data=False):
+    """Initialize the database on startup (clear_data is only used by the clear-db admin command)"""
     try:
         database = get_database()
         database.initialize_database(clear_data=clear_data)
         logger.info("Database initialized successfully on startup")
+        # Startup runs in the gunicorn master with preload_app, release its connections
+        # so every forked worker opens its own pool on first use
+        database.close_pool()
     except Exception as e:
         logger.error(f"Failed to initialize database on startup: {e}")
         # Don't raise here - let the application start even if database fails
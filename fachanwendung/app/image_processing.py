@@ -6,12 +6,186 @@ This module handles all image processing and geographic coordinate transformatio
 - Image overlay creation with contours and masks
 - Geographic accuracy for map projections
 - Simple fallback methods for pixel-based overlays
+- Lazy, on-demand overlay rendering with an in-process LRU cache
+- Compact mask encodings for JSON responses
+- Single-pass decoding of uploaded images
+- Cheap pre-screening of empty or uniform tiles before GPU inference
 """
 
 import os
+import re
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 import cv2
 import numpy as np
 
+# Supported encodings for raw mask data in responses ('list' is the legacy JSON list form)
+MASK_ENCODINGS = ('list', 'rle', 'bitpacked')
+
+# Upload formats whose original bytes can be forwarded to GeoPixel unchanged
+FORWARDABLE_UPLOAD_FORMATS = {'jpeg': '.jpg', 'webp': '.webp'}
+
+
+def detect_image_format(data):
+    """
+    Detect the image format of encoded bytes from their magic number.
+    
+    Args:
+        data: Encoded image bytes
+        
+    Returns:
+        str: 'jpeg', 'png', 'webp', 'webp_extended' (lossless/alpha) or None if unknown
+    """
+    if data[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        # Only simple lossy WebP ('VP8 ' chunk) is guaranteed to carry no alpha channel
+        return 'webp' if data[12:16] == b'VP8 ' else 'webp_extended'
+    return None
+
+def decode_image_upload(stream):
+    """
+    Decode an uploaded image straight from the request stream into a BGR array.
+    
+    PNG (including RGBA canvas captures), JPEG and WebP uploads are decoded with a
+    single decoder call; alpha channels are dropped by the decoder. JPEG and WebP
+    uploads keep their original bytes so they can be forwarded without re-encoding.
+    
+    Args:
+        stream: File-like upload stream
+        
+    Returns:
+        tuple: (BGR image array, encoded bytes to store, file extension)
+    """
+    data = stream.read()
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode uploaded image")
+    
+    image_format = detect_image_format(data)
+    if image_format in FORWARDABLE_UPLOAD_FORMATS:
+        return img, data, FORWARDABLE_UPLOAD_FORMATS[image_format]
+    
+    # Other formats (e.g. PNG, WebP with alpha) are re-encoded once as JPEG for storage and forwarding
+    ok, encoded = cv2.imencode('.jpg', img)
+    if not ok:
+        raise ValueError("Could not encode uploaded image")
+    return img, encoded.tobytes(), '.jpg'
+
+
+class AffineGeoTransform:
+    """
+    Affine transform between image pixel coordinates and EPSG:3857 map coordinates
+    for one set of map bounds and image dimensions.
+    
+    Image (0,0) is the top-left corner, so the Y axis is flipped.
+    """
+    
+    def __init__(self, map_bounds, image_dims):
+        # Parse map bounds
+        NW = [float(map_bounds[0][0]), float(map_bounds[0][1])]
+        SE = [float(map_bounds[1][0]), float(map_bounds[1][1])]
+        width = float(image_dims[1])
+        height = float(image_dims[0])
+        
+        # Calculate map bounds
+        self.map_min_x = NW[0]
+        self.map_max_y = NW[1]
+        
+        # Calculate scaling factors
+        self.pixel_coord_x = (SE[0] - NW[0]) / width
+        self.pixel_coord_y = (NW[1] - SE[1]) / height
+    
+    def pixel_to_map(self, coords):
+        """
+        Transform an (N, 2) array of pixel coordinates to map coordinates.
+        
+        Returns:
+            numpy.ndarray: (N, 2) float64 array of [x, y] map coordinates
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        result = np.empty_like(coords)
+        result[:, 0] = self.map_min_x + coords[:, 0] * self.pixel_coord_x   # X: left to right
+        result[:, 1] = self.map_max_y - coords[:, 1] * self.pixel_coord_y   # Y: top to bottom (flip Y axis)
+        return result
+    
+    def map_to_pixel(self, coords):
+        """
+        Transform an (N, 2) array of map coordinates back to pixel coordinates.
+        
+        Returns:
+            numpy.ndarray: (N, 2) int64 array of [x, y] pixel coordinates (truncated)
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        result = np.empty_like(coords)
+        result[:, 0] = (coords[:, 0] - self.map_min_x) / self.pixel_coord_x
+        result[:, 1] = (self.map_max_y - coords[:, 1]) / self.pixel_coord_y  # Flip Y axis back
+        return result.astype(np.int64)
+    
+    def contours_to_map(self, contours):
+        """
+        Transform all contours of a tile with a single NumPy operation.
+        
+        Args:
+            contours: List of OpenCV contours ((N, 1, 2) arrays) or lists of [x, y] points
+            
+        Returns:
+            list: One list of [x, y] map coordinates per contour, ready for JSON serialization
+        """
+        if not contours:
+            return []
+        
+        # Pack all contours into one ragged int32 buffer and remember where each one ends
+        parts = [np.asarray(contour, dtype=np.int32).reshape(-1, 2) for contour in contours]
+        offsets = np.cumsum([len(part) for part in parts])
+        buffer = np.concatenate(parts)
+        
+        map_coords = self.pixel_to_map(buffer).tolist()
+        
+        result = []
+        start = 0
+        for end in offsets.tolist():
+            result.append(map_coords[start:end])
+            start = end
+        return result
+
+@lru_cache(maxsize=256)
+def _get_cached_geo_transform(map_bounds, image_dims):
+    return AffineGeoTransform(map_bounds, image_dims)
+
+def get_geo_transform(map_bounds, image_dims):
+    """
+    Get the (cached) affine transform for the given map bounds and image dimensions.
+    
+    Args:
+        map_bounds: [[NW_x, NW_y], [SE_x, SE_y]] in EPSG:3857
+        image_dims: [height, width] of image
+        
+    Returns:
+        AffineGeoTransform: Transform shared by all requests with the same tile bounds
+    """
+    bounds_key = tuple(tuple(float(value) for value in corner[:2]) for corner in map_bounds[:2])
+    dims_key = (int(image_dims[0]), int(image_dims[1]))
+    return _get_cached_geo_transform(bounds_key, dims_key)
+
+def contours_to_map_coords(map_bounds, contours, image_dims):
+    """
+    Transform a batch of pixel contours to geographic coordinates.
+    
+    Args:
+        map_bounds: [[NW_x, NW_y], [SE_x, SE_y]] in EPSG:3857
+        contours: List of OpenCV contours in pixel coordinates
+        image_dims: [height, width] of image
+        
+    Returns:
+        list: One list of [x, y] geographic coordinates in EPSG:3857 per contour
+    """
+    return get_geo_transform(map_bounds, image_dims).contours_to_map(contours)
 
 def image_coords_to_map_coords(map_bounds, image_coords, image_dims):
     """
@@ -27,38 +201,12 @@ def image_coords_to_map_coords(map_bounds, image_coords, image_dims):
     """
     if not map_bounds or not image_dims:
         return image_coords
-        
-    # Parse map bounds
-    NW = [float(map_bounds[0][0]), float(map_bounds[0][1])]
-    SE = [float(map_bounds[1][0]), float(map_bounds[1][1])]
-    width = float(image_dims[1])
-    height = float(image_dims[0])
-    
-    # Calculate map bounds
-    map_min_x = NW[0]
-    map_max_x = SE[0]
-    map_min_y = SE[1]
-    map_max_y = NW[1]
-    
-    # Calculate scaling factors
-    pixel_coord_x = (map_max_x - map_min_x) / width
-    pixel_coord_y = (map_max_y - map_min_y) / height
-    
-    # Transform coordinates
-    result = []
-    for coord in image_coords:
-        if len(coord) >= 2:
-            x = float(coord[0])
-            y = float(coord[1])
-            
-            # Transform: image (0,0) = top-left, map coordinates = geographic
-            map_coord = [
-                map_min_x + x * pixel_coord_x,        # X: left to right
-                map_max_y - y * pixel_coord_y         # Y: top to bottom (flip Y axis)
-            ]
-            result.append(map_coord)
     
-    return result
+    coords = [coord[:2] for coord in image_coords if len(coord) >= 2]
+    if not coords:
+        return []
+    
+    return get_geo_transform(map_bounds, image_dims).pixel_to_map(coords).tolist()
 
 def map_coords_to_image_coords(map_bounds, map_coords, image_dims):
     """
@@ -74,42 +222,81 @@ def map_coords_to_image_coords(map_bounds, map_coords, image_dims):
     """
     if not map_bounds or not image_dims:
         return map_coords
+    
+    coords = [coord[:2] for coord in map_coords if len(coord) >= 2]
+    if not coords:
+        return []
+    
+    return get_geo_transform(map_bounds, image_dims).map_to_pixel(coords).tolist()
+
+# Colors used to distinguish contours in overlay images (BGR)
+GEO_CONTOUR_COLORS = [(0, 255, 0), (255, 0, 0), (0, 0, 255), (255, 255, 0),
+                      (255, 0, 255), (0, 255, 255), (128, 0, 128), (255, 165, 0)]
+SIMPLE_CONTOUR_COLORS = [(0, 255, 0), (255, 0, 0), (0, 0, 255), (255, 255, 0)]
+
+# Lazy overlay rendering configuration
+OVERLAY_CACHE_CONFIG = {
+    'max_entries': 32,        # Rendered overlays kept in memory per worker
+    'max_age': 3600,          # Cache-Control max-age for served overlays (seconds)
+    'jpeg_quality': 90,       # JPEG quality of rendered overlays
+}
+
+# Lazily rendered overlay filenames: satellite_image_<kind>_overlay[_geo].jpg
+LAZY_OVERLAY_PATTERN = re.compile(r'^satellite_image_(contours|masks)_overlay(_geo)?\.jpg$')
+LAZY_OVERLAY_SPEC = 'overlay_spec.npz'
+
+# In-process LRU of rendered overlays: overlay path -> (jpeg bytes, etag)
+_overlay_cache = OrderedDict()
+_overlay_cache_lock = threading.Lock()
+
+def render_contours_overlay(original_img, contours, colors, thickness=3):
+    """
+    Draw contours (in pixel coordinates) onto a copy of the original image.
+    
+    Args:
+        original_img: Original OpenCV image (BGR format)
+        contours: List of OpenCV contours
+        colors: Colors cycled per contour
+        thickness: Line thickness
         
-    # Parse map bounds
-    NW = [float(map_bounds[0][0]), float(map_bounds[0][1])]
-    SE = [float(map_bounds[1][0]), float(map_bounds[1][1])]
-    width = float(image_dims[1])
-    height = float(image_dims[0])
-    
-    # Calculate map bounds
-    map_min_x = NW[0]
-    map_max_x = SE[0]
-    map_min_y = SE[1]
-    map_max_y = NW[1]
-    
-    # Calculate scaling factors
-    pixel_coord_x = (map_max_x - map_min_x) / width
-    pixel_coord_y = (map_max_y - map_min_y) / height
-    
-    # Transform coordinates back to pixels
-    result = []
-    for coord in map_coords:
-        if len(coord) >= 2:
-            map_x = float(coord[0])
-            map_y = float(coord[1])
-            
-            # Inverse transform
-            pixel_x = (map_x - map_min_x) / pixel_coord_x
-            pixel_y = (map_max_y - map_y) / pixel_coord_y  # Flip Y axis back
-            
-            result.append([int(pixel_x), int(pixel_y)])
+    Returns:
+        numpy.ndarray: Image with contours drawn
+    """
+    contours_overlay = original_img.copy()
+    for i, contour in enumerate(contours):
+        color = colors[i % len(colors)]
+        cv2.drawContours(contours_overlay, [contour], -1, color, thickness)
+    return contours_overlay
+
+def render_masks_overlay(original_img, masks, alpha=0.6):
+    """
+    Blend a binary mask onto the original image in bright green.
     
-    return result
+    Args:
+        original_img: Original OpenCV image (BGR format)
+        masks: Binary mask as numpy array (resized to the image if needed)
+        alpha: Blend factor of the mask color
+        
+    Returns:
+        numpy.ndarray: Image with mask overlay
+    """
+    image_height, image_width = original_img.shape[:2]
+    
+    # Ensure masks are in the correct coordinate system
+    if masks.shape[:2] != (image_height, image_width):
+        print(f"Resizing mask from {masks.shape} to {(image_height, image_width)}")
+        masks = cv2.resize(masks.astype(np.uint8), (image_width, image_height), interpolation=cv2.INTER_NEAREST)
+    
+    # Create colored mask overlay
+    colored_mask = np.zeros_like(original_img)
+    colored_mask[masks > 0] = (0, 255, 0)  # Bright green
+    
+    return cv2.addWeighted(original_img, 1-alpha, colored_mask, alpha, 0)
 
 def create_geographically_accurate_overlays(original_img, contours, masks, save_folder, map_bounds, image_dims):
     """
-    Create geographically accurate overlay images by transforming contours
-    to match the geographic projection used in the map display.
+    Create geographically accurate overlay images. Contours and masks share the
+    pixel grid of the captured map image, so they are drawn directly.
     
     Args:
         original_img: Original OpenCV image (BGR format)
@@ -130,43 +317,8 @@ def create_geographically_accurate_overlays(original_img, contours, masks, save_
         
         # Create contours overlay with geographic accuracy
         if contours is not None and len(contours) > 0:
-            contours_overlay = original_img.copy()
-            
-            colors = [(0, 255, 0), (255, 0, 0), (0, 0, 255), (255, 255, 0),
-                     (255, 0, 255), (0, 255, 255), (128, 0, 128), (255, 165, 0)]
-            
-            print(f"Processing {len(contours)} contours with geographic transformation")
-            
-            for i, contour in enumerate(contours):
-                color = colors[i % len(colors)]
-                
-                # Extract contour points and transform them
-                contour_points = [[point[0][0], point[0][1]] for point in contour]
-                
-                # Transform to geographic coordinates using the same logic as frontend
-                geo_coords = image_coords_to_map_coords(map_bounds, contour_points, image_dims)
-                
-                # Transform back to pixel coordinates for overlay rendering
-                pixel_coords = map_coords_to_image_coords(map_bounds, geo_coords, image_dims)
-                
-                # Validate and filter coordinates
-                valid_coords = []
-                for coord in pixel_coords:
-                    if (0 <= coord[0] < image_dims[1] and 0 <= coord[1] < image_dims[0]):
-                        valid_coords.append(coord)
-                
-                if len(valid_coords) > 2:  # Need at least 3 points for a contour
-                    # Convert to OpenCV contour format
-                    transformed_contour = np.array([[[coord[0], coord[1]]] for coord in valid_coords], dtype=np.int32)
-                    
-                    # Draw the transformed contour
-                    cv2.drawContours(contours_overlay, [transformed_contour], -1, color, 3)
-                    
-                    # Draw points for debugging
-                    for coord in valid_coords:
-                        cv2.circle(contours_overlay, (coord[0], coord[1]), 2, color, -1)
-                else:
-                    print(f"Skipping contour {i} - insufficient valid coordinates after transformation")
+            print(f"Processing {len(contours)} contours")
+            contours_overlay = render_contours_overlay(original_img, contours, GEO_CONTOUR_COLORS)
             
             # Save contours overlay
             contours_filename = 'satellite_image_contours_overlay_geo.jpg'
@@ -177,23 +329,8 @@ def create_geographically_accurate_overlays(original_img, contours, masks, save_
     
         # Create masks overlay (masks are already in correct pixel space)
         if masks is not None:
-            masks_overlay = original_img.copy()
-            
             print(f"Creating masks overlay with mask shape: {masks.shape}")
-            
-            # Ensure masks are in the correct coordinate system
-            if masks.shape[:2] != (image_dims[0], image_dims[1]):
-                print(f"Resizing mask from {masks.shape} to {image_dims}")
-                masks = cv2.resize(masks.astype(np.uint8), (image_dims[1], image_dims[0]), interpolation=cv2.INTER_NEAREST)
-            
-            # Create colored mask overlay
-            colored_mask = np.zeros_like(original_img)
-            mask_color = (0, 255, 0)  # Bright green
-            colored_mask[masks > 0] = mask_color
-            
-            # Blend with higher alpha for visibility
-            alpha = 0.6
-            masks_overlay = cv2.addWeighted(original_img, 1-alpha, colored_mask, alpha, 0)
+            masks_overlay = render_masks_overlay(original_img, masks)
             
             # Save masks overlay
             masks_filename = 'satellite_image_masks_overlay_geo.jpg'
@@ -228,14 +365,8 @@ def create_simple_overlay_images(original_img, contours, masks, save_folder):
         
         # Create contours overlay
         if contours is not None and len(contours) > 0:
-            contours_overlay = original_img.copy()
-            colors = [(0, 255, 0), (255, 0, 0), (0, 0, 255), (255, 255, 0)]
-            
             print(f"Drawing {len(contours)} contours on simple overlay")
-            for i, contour in enumerate(contours):
-                color = colors[i % len(colors)]
-                print(f"Contour {i}: shape {contour.shape}, first few points: {contour[:3]}")
-                cv2.drawContours(contours_overlay, [contour], -1, color, 3)
+            contours_overlay = render_contours_overlay(original_img, contours, SIMPLE_CONTOUR_COLORS)
             
             contours_filename = 'satellite_image_contours_overlay.jpg'
             contours_filepath = os.path.join(save_folder, contours_filename)
@@ -245,12 +376,7 @@ def create_simple_overlay_images(original_img, contours, masks, save_folder):
     
         # Create masks overlay
         if masks is not None:
-            masks_overlay = original_img.copy()
-            colored_mask = np.zeros_like(original_img)
-            colored_mask[masks > 0] = (0, 255, 0)
-            
-            alpha = 0.6
-            masks_overlay = cv2.addWeighted(original_img, 1-alpha, colored_mask, alpha, 0)
+            masks_overlay = render_masks_overlay(original_img, masks)
             
             masks_filename = 'satellite_image_masks_overlay.jpg'
             masks_filepath = os.path.join(save_folder, masks_filename)
@@ -285,4 +411,310 @@ def create_overlay_images(original_img, contours, masks, save_folder, map_bounds
         return create_geographically_accurate_overlays(original_img, contours, masks, save_folder, map_bounds, image_dims)
     else:
         # Fallback to simple pixel-based overlay
-        return create_simple_overlay_images(original_img, contours, masks, save_folder)
\ No newline at end of file
+        return create_simple_overlay_images(original_img, contours, masks, save_folder)
+
+def register_lazy_overlays(encoded_image, contours, masks, save_folder, map_bounds=None, image_dims=None):
+    """
+    Store the small inputs needed to render overlay images later, instead of rendering them now.
+    
+    The spec file holds the encoded source image, the bit-packed mask and the contour
+    points, so any worker process can render the overlays on first request.
+    
+    Args:
+        encoded_image: Encoded source image bytes (e.g. the captured JPEG)
+        contours: List of contours from OpenCV (in pixel coordinates)
+        masks: Binary mask as numpy array
+        save_folder: Request scratch directory to store the overlay spec in
+        map_bounds: Geographic bounds [[NW_x, NW_y], [SE_x, SE_y]] in EPSG:3857 (optional)
+        image_dims: Image dimensions [height, width] (optional)
+        
+    Returns:
+        dict: Dictionary containing the (not yet rendered) overlay image paths
+    """
+    overlay_paths = {}
+    
+    try:
+        suffix = '_geo' if map_bounds and image_dims else ''
+        
+        has_contours = contours is not None and len(contours) > 0
+        has_masks = masks is not None
+        if not has_contours and not has_masks:
+            return overlay_paths
+        
+        # Pack contours into one ragged buffer
+        if has_contours:
+            parts = [np.asarray(contour, dtype=np.int32).reshape(-1, 2) for contour in contours]
+            contour_points = np.concatenate(parts)
+            contour_offsets = np.cumsum([len(part) for part in parts])
+        else:
+            contour_points = np.zeros((0, 2), dtype=np.int32)
+            contour_offsets = np.zeros(0, dtype=np.int64)
+        
+        mask_shape = np.array(masks.shape[:2] if has_masks else (0, 0), dtype=np.int64)
+        mask_bits = np.packbits(np.asarray(masks).ravel() > 0) if has_masks else np.zeros(0, dtype=np.uint8)
+        
+        spec_path = os.path.join(save_folder, LAZY_OVERLAY_SPEC)
+        np.savez_compressed(
+            spec_path,
+            source=np.frombuffer(bytes(encoded_image), dtype=np.uint8),
+            contour_points=contour_points,
+            contour_offsets=contour_offsets,
+            mask_bits=mask_bits,
+            mask_shape=mask_shape
+        )
+        
+        if has_contours:
+            overlay_paths['contours'] = os.path.join(save_folder, f'satellite_image_contours_overlay{suffix}.jpg')
+        if has_masks:
+            overlay_paths['masks'] = os.path.join(save_folder, f'satellite_image_masks_overlay{suffix}.jpg')
+        print(f"Registered lazy overlays {list(overlay_paths.keys())} in {spec_path}")
+        
+    except Exception as e:
+        print(f"Error registering lazy overlays: {str(e)}")
+        overlay_paths['error'] = str(e)
+    
+    return overlay_paths
+
+def render_lazy_overlay(save_folder, filename):
+    """
+    Render a lazily registered overlay image from its spec file.
+    
+    Args:
+        save_folder: Request scratch directory containing the overlay spec
+        filename: Overlay filename as returned by register_lazy_overlays
+        
+    Returns:
+        bytes: Encoded JPEG, or None if the overlay is unknown
+    """
+    match = LAZY_OVERLAY_PATTERN.match(filename)
+    if not match:
+        return None
+    kind, geo_suffix = match.groups()
+    
+    spec_path = os.path.join(save_folder, LAZY_OVERLAY_SPEC)
+    if not os.path.exists(spec_path):
+        return None
+    
+    with np.load(spec_path) as spec:
+        original_img = cv2.imdecode(spec['source'], cv2.IMREAD_COLOR)
+        
+        if kind == 'contours':
+            offsets = spec['contour_offsets']
+            if len(offsets) == 0:
+                return None
+            contours = [part.reshape(-1, 1, 2) for part in np.split(spec['contour_points'], offsets[:-1])]
+            colors = GEO_CONTOUR_COLORS if geo_suffix else SIMPLE_CONTOUR_COLORS
+            overlay = render_contours_overlay(original_img, contours, colors)
+        else:
+            mask_height, mask_width = spec['mask_shape'].tolist()
+            if mask_height == 0 or mask_width == 0:
+                return None
+            masks = np.unpackbits(spec['mask_bits'], count=mask_height * mask_width).reshape(mask_height, mask_width)
+            overlay = render_masks_overlay(original_img, masks)
+    
+    ok, encoded = cv2.imencode('.jpg', overlay, [cv2.IMWRITE_JPEG_QUALITY, OVERLAY_CACHE_CONFIG['jpeg_quality']])
+    if not ok:
+        return None
+    return encoded.tobytes()
+
+def get_lazy_overlay(save_folder, filename):
+    """
+    Get a lazily rendered overlay from the LRU cache, rendering it on first access.
+    
+    Args:
+        save_folder: Request scratch directory containing the overlay spec
+        filename: Overlay filename as returned by register_lazy_overlays
+        
+    Returns:
+        tuple: (jpeg bytes, etag) or None if the overlay is unknown
+    """
+    cache_key = os.path.join(save_folder, filename)
+    with _overlay_cache_lock:
+        if cache_key in _overlay_cache:
+            _overlay_cache.move_to_end(cache_key)
+            return _overlay_cache[cache_key]
+    
+    image_bytes = render_lazy_overlay(save_folder, filename)
+    if image_bytes is None:
+        return None
+    
+    entry = (image_bytes, hashlib.sha1(image_bytes).hexdigest())
+    with _overlay_cache_lock:
+        _overlay_cache[cache_key] = entry
+        _overlay_cache.move_to_end(cache_key)
+        while len(_overlay_cache) > OVERLAY_CACHE_CONFIG['max_entries']:
+            _overlay_cache.popitem(last=False)
+    
+    print(f"Rendered lazy overlay {filename} ({len(image_bytes)} bytes)")
+    return entry
+
+def encode_mask_rle(mask):
+    """
+    Run-length encode a mask as alternating background/foreground run lengths.
+    
+    Args:
+        mask: Mask as numpy array (any shape, values > 0 are foreground)
+        
+    Returns:
+        dict: {'encoding': 'rle', 'length': n, 'counts': [...]} where counts start
+              with a (possibly zero-length) background run
+    """
+    flat = (np.asarray(mask).ravel() > 0).astype(np.int8)
+    if flat.size == 0:
+        return {'encoding': 'rle', 'length': 0, 'counts': []}
+    
+    # Positions where the value changes mark run boundaries
+    boundaries = np.concatenate(([0], np.flatnonzero(np.diff(flat)) + 1, [flat.size]))
+    counts = np.diff(boundaries)
+    if flat[0] == 1:
+        counts = np.concatenate(([0], counts))
+    
+    return {'encoding': 'rle', 'length': int(flat.size), 'counts': counts.tolist()}
+
+def encode_mask_bitpacked(mask):
+    """
+    Bit-pack a mask into a base64 string (8 pixels per byte, most significant bit first).
+    
+    Args:
+        mask: Mask as numpy array (any shape, values > 0 are foreground)
+        
+    Returns:
+        dict: {'encoding': 'bitpacked', 'length': n, 'data': base64 string}
+    """
+    flat = np.asarray(mask).ravel() > 0
+    packed = np.packbits(flat)
+    return {
+        'encoding': 'bitpacked',
+        'length': int(flat.size),
+        'data': base64.b64encode(packed.tobytes()).decode('ascii')
+    }
+
+def encode_mask(mask, encoding='list'):
+    """
+    Serialize a mask for a JSON response using the requested encoding.
+    
+    Args:
+        mask: Mask as numpy array
+        encoding: One of MASK_ENCODINGS
+        
+    Returns:
+        list or dict: Plain list for 'list', encoded dict otherwise
+    """
+    if encoding == 'rle':
+        return encode_mask_rle(mask)
+    if encoding == 'bitpacked':
+        return encode_mask_bitpacked(mask)
+    if encoding == 'list':
+        return mask.tolist()
+    raise ValueError(f"Unsupported mask encoding: {encoding}")
+
+# Tile pre-filter configuration: tiles failing these checks get an empty result without GPU inference
+TILE_PREFILTER_CONFIG = {
+    'enabled': True,
+    
+    # Decisions remembered per tile content and class, so further MSFF scales of a tile reuse them
+    'cache_entries': 256,
+    
+    # Pixels with all channels <= this value (or >= 255 - this value) count as nodata
+    'nodata_tolerance': 2,
+    
+    # Default thresholds of known object classes: skip when the grayscale standard deviation
+    # or histogram entropy (bits) is below the minimum, or the nodata fraction reaches the
+    # maximum; nodata_white also counts near-white pixels as nodata
+    'default': {'min_std': 3.0, 'min_entropy': 1.5, 'max_nodata_fraction': 0.98, 'nodata_white': True},
+    
+    # Classes that could not be resolved (None or 'misc') may be anything, only black nodata applies
+    'unknown': {'min_std': 0.0, 'min_entropy': 0.0, 'max_nodata_fraction': 0.98, 'nodata_white': False},
+    
+    # Per-class overrides - uniform surface classes may legitimately fill a whole tile,
+    # so only the nodata check applies to them
+    'classes': {
+        name: {'min_std': 0.0, 'min_entropy': 0.0, 'max_nodata_fraction': 0.98, 'nodata_white': True}
+        for name in ['ocean', 'lake', 'river', 'wetland', 'flood', 'shadow', 'farmland',
+                     'grass', 'pasture', 'forest']
+    },
+}
+
+# Bright surfaces can be near-white over a whole tile, only black counts as nodata for them
+TILE_PREFILTER_CONFIG['classes'].update({
+    name: {'min_std': 0.0, 'min_entropy': 0.0, 'max_nodata_fraction': 0.98, 'nodata_white': False}
+    for name in ['beach', 'sand', 'desert', 'snow', 'ice', 'glacier', 'cloud']
+})
+
+def prescreen_tile(img, object_class):
+    """
+    Decide on the CPU whether a tile can trivially not contain the target class.
+    
+    Args:
+        img: Tile as OpenCV image (BGR format)
+        object_class: Resolved layer name (e.g. 'Building', 'Lake'), None or 'misc' if unknown
+        
+    Returns:
+        tuple: (skip flag, dict of computed statistics)
+    """
+    if not TILE_PREFILTER_CONFIG['enabled'] or img is None or img.size == 0:
+        return False, {}
+    
+    class_key = str(object_class or 'misc').strip().lower().replace(' ', '_')
+    if class_key == 'misc':
+        thresholds = TILE_PREFILTER_CONFIG['unknown']
+    else:
+        thresholds = TILE_PREFILTER_CONFIG['classes'].get(class_key, TILE_PREFILTER_CONFIG['default'])
+    
+    # Fraction of nodata pixels (unloaded map tiles render black or white)
+    tolerance = TILE_PREFILTER_CONFIG['nodata_tolerance']
+    nodata = img.max(axis=2) <= tolerance
+    if thresholds['nodata_white']:
+        nodata |= img.min(axis=2) >= 255 - tolerance
+    nodata_fraction = np.count_nonzero(nodata) / nodata.size
+    
+    # Grayscale standard deviation and histogram entropy
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    _, std_dev = cv2.meanStdDev(gray)
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    probabilities = hist[hist > 0] / gray.size
+    entropy = float(-np.sum(probabilities * np.log2(probabilities))) + 0.0
+    
+    stats = {
+        'std': round(float(std_dev[0][0]), 3),
+        'entropy': round(entropy, 3),
+        'nodata_fraction': round(float(nodata_fraction), 4)
+    }
+    
+    skip = bool(nodata_fraction >= thresholds['max_nodata_fraction'] or
+            stats['std'] < thresholds['min_std'] or
+            stats['entropy'] < thresholds['min_entropy'])
+    return skip, stats
+
+_prescreen_cache = OrderedDict()
+_prescreen_cache_lock = threading.Lock()
+
+def prescreen_tile_once(img, object_class, tile_bytes=None):
+    """
+    Pre-screen a tile like prescreen_tile, reusing the decision when the same tile content
+    is requested again for the same class (e.g. at another MSFF scale).
+    
+    Args:
+        img: Tile as OpenCV image (BGR format)
+        object_class: Resolved layer name, see prescreen_tile
+        tile_bytes: Encoded tile as uploaded, hashed instead of the decoded pixels (optional)
+        
+    Returns:
+        tuple: (skip flag, dict of computed statistics)
+    """
+    if not TILE_PREFILTER_CONFIG['enabled'] or img is None or img.size == 0:
+        return False, {}
+    
+    digest = hashlib.sha1(tile_bytes if tile_bytes is not None else img.tobytes()).hexdigest()
+    key = (digest, str(object_class).strip().lower())
+    with _prescreen_cache_lock:
+        if key in _prescreen_cache:
+            _prescreen_cache.move_to_end(key)
+            return _prescreen_cache[key]
+    
+    result = prescreen_tile(img, object_class)
+    with _prescreen_cache_lock:
+        _prescreen_cache[key] = result
+        while len(_prescreen_cache) > TILE_PREFILTER_CONFIG['cache_entries']:
+            _prescreen_cache.popitem(last=False)
+    return result
@@ -0,0 +1,308 @@
+"""
+Write-behind insert queue module for GeoPixel Flask application.
+
+This module handles asynchronous geometry inserts including:
+- Immediate acknowledgement of insert requests with a receipt id
+- Batched flushing to PostGIS when the batch size or flush interval is reached
+- Durable spill to disk while the database is unavailable, retried in the background
+- Receipt status records on disk, readable from every worker
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import atexit
+import logging
+import threading
+import psycopg2
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger(__name__)
+
+# Insert queue configuration (overridable via environment variables)
+INSERT_QUEUE_CONFIG = {
+    # Root directory for spilled batches and receipts, must be shared by all workers
+    'root': os.environ.get('GEOPIXEL_INSERT_QUEUE_DIR', 'fachanwendung/app/insert_queue'),
+
+    # Flush as soon as this many geometries are queued
+    'batch_size': int(os.environ.get('GEOPIXEL_INSERT_BATCH_SIZE', 200)),
+
+    # Flush queued geometries at least this often (seconds)
+    'flush_interval': float(os.environ.get('GEOPIXEL_INSERT_FLUSH_INTERVAL', 1.0)),
+
+    # Interval between retries of spilled batches (seconds)
+    'retry_interval': float(os.environ.get('GEOPIXEL_INSERT_RETRY_INTERVAL', 10)),
+
+    # Receipts are kept this long after their last status change (seconds)
+    'receipt_ttl': int(os.environ.get('GEOPIXEL_INSERT_RECEIPT_TTL', 24 * 60 * 60)),
+}
+
+RECEIPT_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Errors that mean the database is unreachable rather than the data being invalid
+UNAVAILABLE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class InsertQueue:
+    """
+    In-process write-behind queue for geometry inserts.
+
+    Delivery is at least once: a worker dying between commit and receipt update leaves its
+    claimed spill file behind, which is retried by another worker.
+    """
+
+    def __init__(self, root, batch_size, flush_interval, retry_interval, receipt_ttl):
+        self.root = root
+        self.pending_dir = os.path.join(root, 'pending')
+        self.receipt_dir = os.path.join(root, 'receipts')
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.receipt_ttl = receipt_ttl
+        self._items = []
+        self._queued_rows = 0
+        self._condition = threading.Condition()
+        self._worker_pid = None
+        self._worker_lock = threading.Lock()
+        self._last_retry = 0
+        os.makedirs(self.pending_dir, exist_ok=True)
+        os.makedirs(self.receipt_dir, exist_ok=True)
+
+    def _write_json(self, path, data, durable=False):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _write_receipt(self, receipt_id, status, **details):
+        receipt = {'receipt_id': receipt_id, 'status': status, 'updated_at': time.time()}
+        receipt.update(details)
+        try:
+            self._write_json(os.path.join(self.receipt_dir, f"{receipt_id}.json"), receipt)
+        except OSError as e:
+            logger.error(f"Failed to write insert receipt {receipt_id}: {e}")
+
+    def get_receipt(self, receipt_id):
+        """
+        Look up the status of a queued insert.
+
+        Returns:
+            dict: Receipt with status queued, spilled, committed or failed, or None if unknown
+        """
+        if not receipt_id or not RECEIPT_ID_PATTERN.match(receipt_id):
+            return None
+        try:
+            with open(os.path.join(self.receipt_dir, f"{receipt_id}.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def submit(self, object_name, rows, mode='append', min_overlap=0.0):
+        """
+        Queue geometries for insertion into one layer.
+
+        Args:
+            object_name: Layer to insert into
+            rows: Geometry payloads as accepted by PostGISDatabase.insert_geometries
+            mode, min_overlap: De-duplication options as accepted by insert_geometries
+
+        Returns:
+            str: Receipt id
+        """
+        self.ensure_worker()
+        receipt_id = uuid.uuid4().hex
+        item = {
+            'receipt_id': receipt_id,
+            'object': object_name,
+            'rows': rows,
+            'mode': mode,
+            'min_overlap': min_overlap,
+            'submitted_at': time.time()
+        }
+        self._write_receipt(receipt_id, 'queued', object_name=object_name, geometry_count=len(rows))
+
+        with self._condition:
+            self._items.append(item)
+            self._queued_rows += len(rows)
+            if self._queued_rows >= self.batch_size:
+                self._condition.notify()
+        return receipt_id
+
+    def _take_batch(self):
+        with self._condition:
+            batch, self._items = self._items, []
+            self._queued_rows = 0
+        return batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._queued_rows < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+            try:
+                batch = self._take_batch()
+                if batch:
+                    self.flush(batch)
+                if time.time() - self._last_retry >= self.retry_interval:
+                    self._last_retry = time.time()
+                    self._retry_spilled()
+                    self._prune_receipts()
+            except Exception as e:
+                logger.error(f"Insert queue flush failed: {e}")
+
+    def _insert_group(self, db, items):
+        """Insert the rows of several queued requests for one layer in a single transaction"""
+        rows = [row for item in items for row in item['rows']]
+        result = db.insert_geometries(items[0]['object'], rows, mode=items[0]['mode'],
+                                      min_overlap=items[0]['min_overlap'])
+
+        # Geometry ids come back in row order, split them per receipt
+        offset = 0
+        for item in items:
+            count = len(item['rows'])
+            self._write_receipt(
+                item['receipt_id'], 'committed',
+                object_name=item['object'],
+                geometry_ids=result['geometry_ids'][offset:offset + count],
+                table_name=result['table_name'],
+                updated_count=result['updated_count']
+            )
+            offset += count
+
+    def flush(self, items):
+        """Write queued requests to PostGIS, one transaction per layer and insert mode"""
+        from .database import get_database
+        db = get_database()
+
+        groups = {}
+        for item in items:
+            groups.setdefault((item['object'], item['mode'], item['min_overlap']), []).append(item)
+
+        for (object_name, _, _), group in groups.items():
+            try:
+                self._insert_group(db, group)
+                logger.info(f"Flushed {len(group)} queued inserts into layer {object_name}")
+            except UNAVAILABLE_ERRORS as e:
+                logger.warning(f"Database unavailable, spilling {len(group)} queued inserts to disk: {e}")
+                self._spill(group, str(e))
+            except Exception:
+                # Invalid data somewhere in the batch, retry requests one by one to isolate it
+                for item in group:
+                    try:
+                        self._insert_group(db, [item])
+                    except UNAVAILABLE_ERRORS as e:
+                        self._spill([item], str(e))
+                    except Exception as e:
+                        logger.error(f"Queued insert {item['receipt_id']} failed: {e}")
+                        self._write_receipt(item['receipt_id'], 'failed', object_name=item['object'], error=str(e))
+
+    def _spill(self, items, error):
+        for item in items:
+            try:
+                self._write_json(os.path.join(self.pending_dir, f"{item['receipt_id']}.json"), item, durable=True)
+                self._write_receipt(item['receipt_id'], 'spilled', object_name=item['object'], error=error)
+            except OSError as e:
+                logger.error(f"Failed to spill queued insert {item['receipt_id']}: {e}")
+                self._write_receipt(item['receipt_id'], 'failed', object_name=item['object'], error=str(e))
+
+    def _retry_spilled(self):
+        """Claim spilled requests (atomic rename) and flush them again"""
+        claimed = []
+        for name in os.listdir(self.pending_dir):
+            path = os.path.join(self.pending_dir, name)
+
+            # Release claims of workers that died before finishing them
+            if '.claimed-' in name:
+                base, pid = name.rsplit('.claimed-', 1)
+                if pid.isdigit() and not _pid_alive(int(pid)):
+                    try:
+                        os.rename(path, os.path.join(self.pending_dir, base))
+                    except FileNotFoundError:
+                        pass
+                continue
+
+            if not name.endswith('.json'):
+                continue
+            claim_path = f"{path}.claimed-{os.getpid()}"
+            try:
+                os.rename(path, claim_path)
+                with open(claim_path) as f:
+                    claimed.append((claim_path, json.load(f)))
+            except FileNotFoundError:
+                continue
+            except ValueError as e:
+                logger.error(f"Discarding unreadable spilled insert {name}: {e}")
+                os.remove(claim_path)
+
+        if not claimed:
+            return
+
+        logger.info(f"Retrying {len(claimed)} spilled inserts")
+        self.flush([item for _, item in claimed])
+        for claim_path, _ in claimed:
+            try:
+                os.remove(claim_path)
+            except FileNotFoundError:
+                pass
+
+    def _prune_receipts(self):
+        cutoff = time.time() - self.receipt_ttl
+        for name in os.listdir(self.receipt_dir):
+            path = os.path.join(self.receipt_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def spill_pending(self):
+        """Persist requests still in memory, used when the worker exits"""
+        batch = self._take_batch()
+        if batch:
+            logger.info(f"Spilling {len(batch)} queued inserts on shutdown")
+            self._spill(batch, 'worker shutdown before flush')
+
+    def ensure_worker(self):
+        """Start the flusher thread once per process (threads do not survive a fork)"""
+        with self._worker_lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+            self._items = []
+            self._queued_rows = 0
+            self._condition = threading.Condition()
+            atexit.register(self.spill_pending)
+            thread = threading.Thread(target=self._run, name='insert-queue-flusher', daemon=True)
+            thread.start()
+
+# Global insert queue instance - will be initialized later
+insert_queue = None
+
+def get_insert_queue() -> InsertQueue:
+    """Get the global insert queue instance"""
+    global insert_queue
+    if insert_queue is None:
+        insert_queue = InsertQueue(
+            root=INSERT_QUEUE_CONFIG['root'],
+            batch_size=INSERT_QUEUE_CONFIG['batch_size'],
+            flush_interval=INSERT_QUEUE_CONFIG['flush_interval'],
+            retry_interval=INSERT_QUEUE_CONFIG['retry_interval'],
+            receipt_ttl=INSERT_QUEUE_CONFIG['receipt_ttl']
+        )
+        logger.info(f"Insert queue initialized at {insert_queue.root}")
+    return insert_queue
@@ -0,0 +1,280 @@
+"""
+Pod inventory module for GeoPixel Flask application.
+
+This module handles the shared RunPod pod inventory including:
+- A background poller per worker for the API keys used there, kept in memory only
+- Racing both RunPod control-plane endpoints and keeping the first successful answer
+- Inventory snapshots (status, ports, template, GPU type) in scratch space, read by every worker
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import concurrent.futures
+import requests
+
+from .scratch import SCRATCH_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Pod inventory configuration (overridable via environment variables)
+POD_INVENTORY_CONFIG = {
+    # Directory for snapshots, shared by all workers of a host and kept outside the source tree
+    # (the scratch root is a tmpfs in docker-compose)
+    'root': os.environ.get('GEOPIXEL_POD_INVENTORY_DIR', os.path.join(SCRATCH_CONFIG['root'], 'pod_inventory')),
+
+    # Interval between background inventory refreshes of one API key (seconds)
+    'poll_interval': float(os.environ.get('GEOPIXEL_POD_INVENTORY_INTERVAL', 10)),
+
+    # Older snapshots are refreshed synchronously on read, e.g. before the poller ran once (seconds)
+    'max_age': float(os.environ.get('GEOPIXEL_POD_INVENTORY_MAX_AGE', 30)),
+
+    # API keys that were not used for this long are no longer polled (seconds)
+    'key_ttl': int(os.environ.get('GEOPIXEL_POD_INVENTORY_KEY_TTL', 60 * 60)),
+
+    # Timeout of one control-plane request (seconds)
+    'timeout': float(os.environ.get('GEOPIXEL_POD_INVENTORY_TIMEOUT', 15)),
+}
+
+RUNPOD_GRAPHQL_ENDPOINTS = ['https://api.runpod.io/graphql', 'https://api.runpod.ai/graphql']
+
+POD_INVENTORY_QUERY = """
+query {
+    myself {
+        pods {
+            id
+            name
+            desiredStatus
+            templateId
+            gpuCount
+            lastStatusChange
+            machine {
+                gpuDisplayName
+            }
+            runtime {
+                ports {
+                    ip
+                    isIpPublic
+                    privatePort
+                    publicPort
+                    type
+                }
+            }
+        }
+    }
+}
+"""
+
+
+class RunPodQueryError(RuntimeError):
+    """No RunPod endpoint answered successfully, responses maps endpoints to responses or exceptions"""
+
+    def __init__(self, message, responses):
+        super().__init__(message)
+        self.responses = responses
+
+
+def query_runpod_graphql(api_key, payload, timeout):
+    """
+    Send a GraphQL request to all RunPod endpoints at once.
+
+    A HTTP 200 whose body only carries GraphQL errors counts as a failure, the other
+    endpoints are still waited for.
+
+    Returns:
+        tuple: (endpoint, response JSON) of the first endpoint answering with HTTP 200 and data
+
+    Raises:
+        RunPodQueryError: If no endpoint answered successfully
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'Authorization': f'Bearer {api_key.strip()}'
+    }
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(RUNPOD_GRAPHQL_ENDPOINTS))
+    futures = {
+        executor.submit(requests.post, endpoint, json=payload, headers=headers, timeout=timeout): endpoint
+        for endpoint in RUNPOD_GRAPHQL_ENDPOINTS
+    }
+    errors = []
+    responses = {}
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            endpoint = futures[future]
+            try:
+                response = future.result()
+                responses[endpoint] = response
+                if response.status_code == 200:
+                    data = response.json()
+                    if isinstance(data, dict) and (data.get('data') is not None or not data.get('errors')):
+                        return endpoint, data
+                    errors.append(f"{endpoint}: GraphQL errors {data.get('errors') if isinstance(data, dict) else data}")
+                    continue
+                errors.append(f"{endpoint}: HTTP {response.status_code}")
+            except (requests.exceptions.RequestException, ValueError) as e:
+                responses[endpoint] = e
+                errors.append(f"{endpoint}: {e}")
+    finally:
+        # Do not wait for the slower endpoint
+        executor.shutdown(wait=False)
+    raise RunPodQueryError('; '.join(errors), responses)
+
+
+class PodInventory:
+    """
+    Pod listings per API key, shared between workers through snapshot files.
+
+    API keys never leave process memory: each worker polls the keys used in it and skips
+    keys whose snapshot another worker refreshed within the poll interval.
+    """
+
+    def __init__(self, root, poll_interval, max_age, key_ttl, timeout):
+        self.root = root
+        self.snapshot_dir = os.path.join(root, 'snapshots')
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+        self.key_ttl = key_ttl
+        self.timeout = timeout
+        self._keys = {}  # key id -> (API key, last use in this process)
+        self._keys_lock = threading.Lock()
+        self._poller_pid = None
+        self._poller_lock = threading.Lock()
+        os.makedirs(self.snapshot_dir, mode=0o700, exist_ok=True)
+
+    def _key_id(self, api_key):
+        return hashlib.sha256(api_key.strip().encode('utf-8')).hexdigest()[:32]
+
+    def _write_json(self, path, data, mode=0o600):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _read_json(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def register_key(self, api_key):
+        """Add an API key to the keys polled in the background by this worker"""
+        with self._keys_lock:
+            self._keys[self._key_id(api_key)] = (api_key.strip(), time.time())
+
+    def refresh(self, api_key):
+        """
+        List the pods of an API key from the control plane and publish the snapshot.
+
+        Returns:
+            dict: Snapshot with fetched_at, endpoint and pods
+
+        Raises:
+            RuntimeError: If the control plane could not be queried
+        """
+        started = time.time()
+        endpoint, data = query_runpod_graphql(api_key, {'query': POD_INVENTORY_QUERY}, self.timeout)
+        try:
+            pods = data['data']['myself']['pods']
+        except (KeyError, TypeError):
+            raise RuntimeError(f"Unexpected API response structure from {endpoint}")
+
+        snapshot = {
+            'fetched_at': time.time(),
+            'latency_ms': round((time.time() - started) * 1000),
+            'endpoint': endpoint,
+            'pods': pods
+        }
+        try:
+            self._write_json(os.path.join(self.snapshot_dir, f"{self._key_id(api_key)}.json"), snapshot)
+        except OSError as e:
+            logger.warning(f"Failed to publish pod inventory snapshot: {e}")
+        return snapshot
+
+    def get(self, api_key, max_age=None):
+        """
+        Get the pod inventory of an API key, from the shared snapshot when it is recent enough.
+
+        Returns:
+            dict: Snapshot with fetched_at, endpoint and pods, or with pods None and an error
+        """
+        self.ensure_poller()
+        self.register_key(api_key)
+        max_age = self.max_age if max_age is None else max_age
+
+        snapshot = self._read_json(os.path.join(self.snapshot_dir, f"{self._key_id(api_key)}.json"))
+        if snapshot and time.time() - snapshot.get('fetched_at', 0) <= max_age:
+            return snapshot
+
+        try:
+            return self.refresh(api_key)
+        except RuntimeError as e:
+            logger.error(f"Failed to query RunPod pod inventory: {e}")
+            return {'fetched_at': None, 'endpoint': None, 'pods': None, 'error': str(e)}
+
+    def poll_once(self):
+        """Refresh the snapshots of the recently used API keys of this worker"""
+        now = time.time()
+        with self._keys_lock:
+            for key_id in [key_id for key_id, (_, last_used) in self._keys.items() if now - last_used > self.key_ttl]:
+                del self._keys[key_id]
+            keys = list(self._keys.items())
+
+        for key_id, (api_key, _) in keys:
+            # Another worker using the same key refreshed it already
+            snapshot = self._read_json(os.path.join(self.snapshot_dir, f"{key_id}.json"))
+            if snapshot and now - snapshot.get('fetched_at', 0) < self.poll_interval:
+                continue
+            try:
+                self.refresh(api_key)
+            except RuntimeError as e:
+                logger.warning(f"Pod inventory refresh failed: {e}")
+
+        # Snapshots of keys no worker used recently
+        for name in os.listdir(self.snapshot_dir):
+            path = os.path.join(self.snapshot_dir, name)
+            try:
+                if now - os.stat(path).st_mtime > self.key_ttl:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def _run_poller(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"Pod inventory poll failed: {e}")
+
+    def ensure_poller(self):
+        """Start the poller thread once per process (threads do not survive a fork)"""
+        with self._poller_lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+            self._keys = {}
+            self._keys_lock = threading.Lock()
+            thread = threading.Thread(target=self._run_poller, name='pod-inventory-poller', daemon=True)
+            thread.start()
+
+# Global pod inventory instance - will be initialized later
+pod_inventory = None
+
+def get_pod_inventory() -> PodInventory:
+    """Get the global pod inventory instance"""
+    global pod_inventory
+    if pod_inventory is None:
+        pod_inventory = PodInventory(
+            root=POD_INVENTORY_CONFIG['root'],
+            poll_interval=POD_INVENTORY_CONFIG['poll_interval'],
+            max_age=POD_INVENTORY_CONFIG['max_age'],
+            key_ttl=POD_INVENTORY_CONFIG['key_ttl'],
+            timeout=POD_INVENTORY_CONFIG['timeout']
+        )
+        logger.info(f"Pod inventory initialized at {pod_inventory.root}")
+    return pod_inventory
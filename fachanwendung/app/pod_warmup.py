@@ -0,0 +1,278 @@
+"""
+Pod warm-up module for GeoPixel Flask application.
+
+This module handles keeping GeoPixel pods responsive including:
+- A warm-up inference on a small synthetic tile once a pod reports healthy
+- A low duty cycle keep-alive inference for warm pods that have been idle
+- Warm-up and keep-alive latencies in per-pod state files shared by all workers
+"""
+
+import os
+import re
+import json
+import time
+import fcntl
+import logging
+import threading
+from io import BytesIO
+
+import numpy as np
+import requests
+from PIL import Image
+
+from .scratch import SCRATCH_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Pod warm-up configuration (overridable via environment variables)
+POD_WARMUP_CONFIG = {
+    # Warm up pods as soon as /check-health reports them ready
+    'enabled': os.environ.get('GEOPIXEL_WARMUP_ENABLED', 'true').lower() == 'true',
+
+    # Directory for per-pod warm-up state, shared by all workers of a host and kept outside
+    # the source tree (the scratch root is a tmpfs in docker-compose)
+    'root': os.environ.get('GEOPIXEL_WARMUP_DIR', os.path.join(SCRATCH_CONFIG['root'], 'pod_warmup')),
+
+    # Side length of the synthetic warm-up tile (pixels) and the class queried for it
+    'tile_size': int(os.environ.get('GEOPIXEL_WARMUP_TILE_SIZE', 256)),
+    'object_class': os.environ.get('GEOPIXEL_WARMUP_CLASS', 'building'),
+
+    # Warm pods without any inference for this long get a keep-alive tile (seconds)
+    'keepalive_interval': float(os.environ.get('GEOPIXEL_KEEPALIVE_INTERVAL', 300)),
+
+    # Timeout of a warm-up or keep-alive inference, the first one includes CUDA initialization (seconds)
+    'timeout': float(os.environ.get('GEOPIXEL_WARMUP_TIMEOUT', 180)),
+
+    # Pods failing this many keep-alives in a row are forgotten until they are healthy again
+    'max_failures': int(os.environ.get('GEOPIXEL_KEEPALIVE_MAX_FAILURES', 3)),
+}
+
+POD_ID_PATTERN = re.compile(r'^[a-z0-9]+$')
+POD_URL_PATTERN = re.compile(r'^https://([a-z0-9]+)-5000\.proxy\.runpod\.net')
+
+
+def pod_base_url(pod_id):
+    """GeoPixel API base URL of a pod behind the RunPod proxy"""
+    return f'https://{pod_id}-5000.proxy.runpod.net'
+
+
+def create_synthetic_tile(size):
+    """
+    Create a JPEG tile with some texture, so the warm-up runs the full inference path
+    instead of an early exit on a blank image.
+
+    Returns:
+        bytes: Encoded JPEG image
+    """
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:size, 0:size]
+    pattern = (np.sin(x / 9.0) + np.cos(y / 13.0)) * 40 + 128
+    channels = [pattern + rng.normal(0, 20, (size, size)) for _ in range(3)]
+    img = np.clip(np.stack(channels, axis=-1), 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(img).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class PodWarmup:
+    """Warm-up and keep-alive inferences per pod, coordinated between workers through files"""
+
+    def __init__(self, root, tile_size, object_class, keepalive_interval, timeout, max_failures):
+        self.root = root
+        self.tile_size = tile_size
+        self.object_class = object_class
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self._tile = None
+        self._keepalive_pid = None
+        self._keepalive_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _state_path(self, pod_id):
+        return os.path.join(self.root, f"{pod_id}.json")
+
+    def get_state(self, pod_id):
+        """
+        Get the warm-up state of a pod.
+
+        Returns:
+            dict: State with status warming, warm or failed and recorded latencies, or None
+        """
+        if not pod_id or not POD_ID_PATTERN.match(pod_id):
+            return None
+        try:
+            with open(self._state_path(pod_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_state(self, pod_id, state):
+        path = self._state_path(pod_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to write warm-up state of pod {pod_id}: {e}")
+
+    def record_activity(self, api_url):
+        """Note a real inference on the pod behind api_url, postponing its next keep-alive"""
+        match = POD_URL_PATTERN.match(api_url or '')
+        if not match:
+            return
+        path = os.path.join(self.root, f"{match.group(1)}.active")
+        try:
+            with open(path, 'a'):
+                os.utime(path, None)
+        except OSError:
+            pass
+
+    def _last_activity(self, pod_id, state):
+        last = max(state.get('warmed_at') or 0, state.get('last_keepalive_at') or 0)
+        try:
+            last = max(last, os.stat(os.path.join(self.root, f"{pod_id}.active")).st_mtime)
+        except FileNotFoundError:
+            pass
+        return last
+
+    def _infer(self, pod_id):
+        """Send the synthetic tile through /process, returns the latency in milliseconds"""
+        if self._tile is None:
+            self._tile = create_synthetic_tile(self.tile_size)
+        started = time.time()
+        response = requests.post(
+            f"{pod_base_url(pod_id)}/process",
+            files={'image': ('warmup.jpg', self._tile, 'image/jpeg')},
+            data={'query': f"Please give me segmentation masks for {self.object_class}."},
+            timeout=self.timeout
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        return round((time.time() - started) * 1000)
+
+    def ensure_warm(self, pod_id):
+        """
+        Start a background warm-up of a healthy pod unless it is warm or warming already.
+
+        Returns:
+            dict: Current warm-up state of the pod, or None if the pod id is invalid
+        """
+        if not pod_id or not POD_ID_PATTERN.match(pod_id):
+            return None
+        self.ensure_keepalive()
+
+        state = self.get_state(pod_id)
+        if state and (state['status'] == 'warm' or
+                      (state['status'] == 'warming' and time.time() - state['started_at'] < self.timeout * 2)):
+            return state
+
+        # Only one worker warms a pod, the claim file is replaced when a claim went stale
+        claim_path = os.path.join(self.root, f"{pod_id}.claim")
+        try:
+            fd = os.open(claim_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            os.close(fd)
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(claim_path).st_mtime < self.timeout * 2:
+                    return state or {'status': 'warming'}
+                os.utime(claim_path, None)
+            except FileNotFoundError:
+                return state or {'status': 'warming'}
+
+        state = {'status': 'warming', 'started_at': time.time()}
+        self._write_state(pod_id, state)
+        thread = threading.Thread(target=self._warm_up, args=(pod_id,), name=f'pod-warmup-{pod_id}', daemon=True)
+        thread.start()
+        return state
+
+    def _warm_up(self, pod_id):
+        started_at = time.time()
+        try:
+            latency_ms = self._infer(pod_id)
+            logger.info(f"Pod {pod_id} warmed up in {latency_ms} ms")
+            self._write_state(pod_id, {
+                'status': 'warm',
+                'started_at': started_at,
+                'warmed_at': time.time(),
+                'warmup_latency_ms': latency_ms,
+                'last_keepalive_at': None,
+                'keepalive_latency_ms': None,
+                'failures': 0
+            })
+        except Exception as e:
+            logger.warning(f"Warm-up of pod {pod_id} failed: {e}")
+            self._write_state(pod_id, {'status': 'failed', 'started_at': started_at, 'error': str(e)})
+        finally:
+            try:
+                os.remove(os.path.join(self.root, f"{pod_id}.claim"))
+            except FileNotFoundError:
+                pass
+
+    def keepalive_once(self):
+        """Send a keep-alive tile to every warm pod that has been idle for keepalive_interval"""
+        for name in os.listdir(self.root):
+            if not name.endswith('.json'):
+                continue
+            pod_id = name[:-len('.json')]
+            state = self.get_state(pod_id)
+            if not state or state.get('status') != 'warm':
+                continue
+            if time.time() - self._last_activity(pod_id, state) < self.keepalive_interval:
+                continue
+
+            try:
+                state['keepalive_latency_ms'] = self._infer(pod_id)
+                state['failures'] = 0
+                logger.info(f"Keep-alive of pod {pod_id} took {state['keepalive_latency_ms']} ms")
+            except Exception as e:
+                state['failures'] = state.get('failures', 0) + 1
+                logger.warning(f"Keep-alive of pod {pod_id} failed ({state['failures']}/{self.max_failures}): {e}")
+                if state['failures'] >= self.max_failures:
+                    for suffix in ('.json', '.active'):
+                        try:
+                            os.remove(os.path.join(self.root, f"{pod_id}{suffix}"))
+                        except FileNotFoundError:
+                            pass
+                    continue
+            state['last_keepalive_at'] = time.time()
+            self._write_state(pod_id, state)
+
+    def _run_keepalive(self):
+        # One keep-alive loop per host, the lock passes on when the owning worker exits
+        lock_file = open(os.path.join(self.root, '.keepalive.lock'), 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        while True:
+            time.sleep(min(self.keepalive_interval / 4, 30))
+            try:
+                self.keepalive_once()
+            except Exception as e:
+                logger.error(f"Pod keep-alive failed: {e}")
+
+    def ensure_keepalive(self):
+        """Start the keep-alive candidate thread once per process (threads do not survive a fork)"""
+        with self._keepalive_lock:
+            if self._keepalive_pid == os.getpid():
+                return
+            self._keepalive_pid = os.getpid()
+            thread = threading.Thread(target=self._run_keepalive, name='pod-keepalive', daemon=True)
+            thread.start()
+
+# Global pod warm-up instance - will be initialized later
+pod_warmup = None
+
+def get_pod_warmup() -> PodWarmup:
+    """Get the global pod warm-up instance"""
+    global pod_warmup
+    if pod_warmup is None:
+        pod_warmup = PodWarmup(
+            root=POD_WARMUP_CONFIG['root'],
+            tile_size=POD_WARMUP_CONFIG['tile_size'],
+            object_class=POD_WARMUP_CONFIG['object_class'],
+            keepalive_interval=POD_WARMUP_CONFIG['keepalive_interval'],
+            timeout=POD_WARMUP_CONFIG['timeout'],
+            max_failures=POD_WARMUP_CONFIG['max_failures']
+        )
+        logger.info(f"Pod warm-up initialized at {pod_warmup.root}")
+    return pod_warmup
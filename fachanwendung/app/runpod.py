@@ -9,13 +9,58 @@ This module handles all RunPod-related functionality including:
 """
 
 import os
+import re
 import json
+import time
+import fcntl
+import hashlib
+import threading
+import concurrent.futures
 import requests
+from contextlib import contextmanager
 from flask import Blueprint, request, jsonify, current_app
+from .pod_inventory import get_pod_inventory, query_runpod_graphql, RunPodQueryError, POD_INVENTORY_CONFIG, RUNPOD_GRAPHQL_ENDPOINTS
+from .pod_warmup import get_pod_warmup, POD_WARMUP_CONFIG, POD_ID_PATTERN
+from .scratch import SCRATCH_CONFIG
 
 # Create RunPod Blueprint
 runpod_bp = Blueprint('runpod', __name__)
 
+# Pod health check configuration (overridable via environment variables)
+HEALTH_CHECK_CONFIG = {
+    # Health results per pod are shared by all polls for this long (seconds)
+    'cache_ttl': float(os.environ.get('GEOPIXEL_HEALTH_CACHE_TTL', 3)),
+    
+    # Shared result cache, next to the pod inventory snapshots
+    'cache_dir': os.path.join(POD_INVENTORY_CONFIG['root'], 'health'),
+    
+    # Timeouts of the /health request and of the readiness probes (seconds)
+    'health_timeout': 5,
+    'probe_timeout': 3,
+}
+
+# RunPod proxy response cache configuration (overridable via environment variables)
+PROXY_CACHE_CONFIG = {
+    # Answers to read-only queries are reused for this long, 0 disables the cache (seconds)
+    'ttl': float(os.environ.get('GEOPIXEL_PROXY_CACHE_TTL', 5)),
+    
+    # Answer cache shared by all workers of a host, in scratch space outside the source tree
+    # (the scratch root is a tmpfs in docker-compose, so answers never reach the disk)
+    'cache_dir': os.environ.get('GEOPIXEL_PROXY_CACHE_DIR', os.path.join(SCRATCH_CONFIG['root'], 'runpod_proxy')),
+    
+    # Longest wait for an identical query in flight in another request (seconds)
+    'lock_timeout': float(os.environ.get('GEOPIXEL_PROXY_LOCK_TIMEOUT', 5)),
+    
+    # Timeout of the RunPod request, both endpoints are queried concurrently (seconds)
+    'upstream_timeout': float(os.environ.get('GEOPIXEL_PROXY_UPSTREAM_TIMEOUT', 30)),
+}
+
+# Strings and comments are removed before looking for operation keywords
+GRAPHQL_IGNORED_PATTERN = re.compile(r'"""[\s\S]*?"""|"(?:[^"\\]|\\.)*"|#[^\n]*')
+GRAPHQL_WRITE_PATTERN = re.compile(r'\b(?:mutation|subscription)\b')
+
+_proxy_cache_pruned_at = 0
+
 # Global variable to store the RunPod API key temporarily
 _runpod_api_key = None
 
@@ -45,111 +90,49 @@ def get_active_runpod_url():
             print("No RunPod API key found")
             return None
         
-        print(f"Using API key (length: {len(api_key)})")
-        
-        # Query RunPod API for running pods
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {api_key.strip()}'
-        }
-        
-        query = """
-        query {
-            myself {
-                pods {
-                    id
-                    name
-                    desiredStatus
-                    runtime {
-                        ports {
-                            ip
-                            isIpPublic
-                            privatePort
-                            publicPort
-                            type
-                        }
-                    }
-                }
-            }
-        }
-        """
-        
-        payload = {'query': query}
+        # Pod listing from the shared inventory snapshot, refreshed in the background
+        inventory = get_pod_inventory().get(api_key)
+        if inventory['pods'] is None:
+            print(f"Failed to query RunPod API: {inventory['error']}")
+            return None
         
-        # Try RunPod endpoints
-        endpoints = ['https://api.runpod.io/graphql', 'https://api.runpod.ai/graphql']
+        pods = inventory['pods']
+        print(f"Found {len(pods)} pods (inventory from {inventory['endpoint']})")
         
-        for endpoint in endpoints:
-            try:
-                print(f"Querying {endpoint}...")
-                response = requests.post(endpoint, json=payload, headers=headers, timeout=15)
-                print(f"Response status: {response.status_code}")
+        # Look for running pods with port 5000 specifically
+        for i, pod in enumerate(pods):
+            pod_id = pod.get('id', 'unknown')
+            pod_name = pod.get('name', 'unknown')
+            pod_status = pod.get('desiredStatus', 'unknown')
+            
+            print(f"Pod {i+1}: {pod_name} ({pod_id}) - Status: {pod_status}")
+            
+            if pod_status == 'RUNNING' and pod.get('runtime'):
+                runtime = pod['runtime']
                 
-                if response.status_code == 200:
-                    data = response.json()
+                if 'ports' in runtime and runtime['ports']:
+                    ports = runtime['ports']
                     
-                    if 'data' in data and 'myself' in data['data'] and 'pods' in data['data']['myself']:
-                        pods = data['data']['myself']['pods']
-                        print(f"Found {len(pods)} pods")
-                        
-                        # Look for running pods with port 5000 specifically
-                        for i, pod in enumerate(pods):
-                            pod_id = pod.get('id', 'unknown')
-                            pod_name = pod.get('name', 'unknown')
-                            pod_status = pod.get('desiredStatus', 'unknown')
-                            
-                            print(f"Pod {i+1}: {pod_name} ({pod_id}) - Status: {pod_status}")
-                            
-                            if pod_status == 'RUNNING' and pod.get('runtime'):
-                                runtime = pod['runtime']
-                                
-                                if 'ports' in runtime and runtime['ports']:
-                                    ports = runtime['ports']
-                                    print(f"  Found {len(ports)} ports")
-                                    
-                                    # Check if any port is 5000 (GeoPixel API)
-                                    has_port_5000 = False
-                                    for j, port in enumerate(ports):
-                                        private_port = port.get('privatePort')
-                                        public_port = port.get('publicPort')
-                                        ip = port.get('ip')
-                                        is_public = port.get('isIpPublic')
-                                        port_type = port.get('type')
-                                        
-                                        print(f"    Port {j+1}: private={private_port}, public={public_port}, ip={ip}, public={is_public}, type={port_type}")
-                                        
-                                        # Look specifically for port 5000 (GeoPixel API)
-                                        if private_port == 5000 or public_port == 5000:
-                                            print(f"    🎯 Found port 5000!")
-                                            has_port_5000 = True
-                                            break
-                                    
-                                    # If this pod has port 5000, construct URL using pod ID
-                                    if has_port_5000 and pod_id != 'unknown':
-                                        # Construct the standard RunPod proxy URL format
-                                        endpoint_url = f"https://{pod_id}-5000.proxy.runpod.net/"
-                                        print(f"    ✅ Constructed RunPod endpoint using pod ID: {endpoint_url}")
-                                        return endpoint_url
-                                    elif has_port_5000:
-                                        print(f"    ⚠️  Port 5000 found but pod ID is unknown")
-                                else:
-                                    print("  No ports found in runtime")
-                            else:
-                                print(f"  Pod not running or no runtime")
-                        
-                        print("No running pods with port 5000 found")
-                        return None
-                    else:
-                        print(f"Unexpected API response structure")
-                        return None
+                    # Check if any port is 5000 (GeoPixel API)
+                    has_port_5000 = any(port.get('privatePort') == 5000 or port.get('publicPort') == 5000
+                                        for port in ports)
                     
-            except Exception as e:
-                print(f"Error querying RunPod endpoint {endpoint}: {e}")
-                continue
+                    # If this pod has port 5000, construct URL using pod ID
+                    if has_port_5000 and pod_id != 'unknown':
+                        # Construct the standard RunPod proxy URL format
+                        endpoint_url = f"https://{pod_id}-5000.proxy.runpod.net/"
+                        print(f"    ✅ Constructed RunPod endpoint using pod ID: {endpoint_url}")
+                        return endpoint_url
+                    elif has_port_5000:
+                        print(f"    ⚠️  Port 5000 found but pod ID is unknown")
+                else:
+                    print("  No ports found in runtime")
+            else:
+                print(f"  Pod not running or no runtime")
         
-        print("Failed to query RunPod API from all endpoints")
+        print("No running pods with port 5000 found")
         return None
-        
+    
     except Exception as e:
         print(f"Error getting active RunPod URL: {e}")
         return None
@@ -178,176 +161,124 @@ def check_pod_running_with_template(template_id):
         
         print(f"Checking for running pods with template: {template_id}")
         
-        # Query RunPod API for running pods
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {api_key.strip()}'
-        }
-        
-        query = """
-        query {
-            myself {
-                pods {
-                    id
-                    name
-                    desiredStatus
-                    templateId
-                    runtime {
-                        ports {
-                            ip
-                            isIpPublic
-                            privatePort
-                            publicPort
-                            type
-                        }
-                    }
-                }
+        # Pod listing from the shared inventory snapshot, refreshed in the background
+        inventory = get_pod_inventory().get(api_key)
+        if inventory['pods'] is None:
+            print(f"Failed to query RunPod API for template check: {inventory['error']}")
+            return {
+                'running': False,
+                'pod_id': None,
+                'endpoint_url': None,
+                'error': 'Failed to query RunPod API'
             }
-        }
-        """
         
-        payload = {'query': query}
+        pods = inventory['pods']
+        print(f"Found {len(pods)} total pods")
         
-        # Try RunPod endpoints
-        endpoints = ['https://api.runpod.io/graphql', 'https://api.runpod.ai/graphql']
+        # Look for running pods with the specified template
+        running_pods_with_port_5000 = []  # Fallback list
         
-        for endpoint in endpoints:
-            try:
-                print(f"Querying {endpoint} for template check...")
-                response = requests.post(endpoint, json=payload, headers=headers, timeout=15)
-                print(f"Template check response status: {response.status_code}")
+        for pod in pods:
+            pod_id = pod.get('id', 'unknown')
+            pod_name = pod.get('name', 'unknown')
+            pod_status = pod.get('desiredStatus', 'unknown')
+            pod_template_id = pod.get('templateId', '')
+            
+            print(f"Pod: {pod_name} ({pod_id}) - Status: {pod_status}, Template: '{pod_template_id}' (looking for: '{template_id}')")
+            
+            # Enhanced template matching with fallback logic
+            template_match = False
+            
+            # Primary check: exact match (case-insensitive and trimmed)
+            if pod_template_id and template_id:
+                template_match = pod_template_id.strip().lower() == template_id.strip().lower()
+                if template_match:
+                    print(f"✅ Template match found (case-insensitive): {pod_id}")
+            
+            # If running, check for port 5000 regardless of template (fallback)
+            if pod_status == 'RUNNING':
+                has_port_5000 = False
+                if pod.get('runtime') and 'ports' in pod['runtime'] and pod['runtime']['ports']:
+                    for port in pod['runtime']['ports']:
+                        if port.get('privatePort') == 5000 or port.get('publicPort') == 5000:
+                            has_port_5000 = True
+                            break
                 
-                if response.status_code == 200:
-                    data = response.json()
+                if has_port_5000:
+                    running_pods_with_port_5000.append({
+                        'pod': pod,
+                        'template_match': template_match
+                    })
+                    print(f"Found running pod with port 5000: {pod_id} (template_match: {template_match})")
+            
+            # Check if this pod matches our template and is running
+            if pod_status == 'RUNNING' and template_match:
+                print(f"Found running pod with exact template match: {pod_id}")
+                
+                # Get endpoint URL if available
+                endpoint_url = None
+                if pod.get('runtime') and 'ports' in pod['runtime'] and pod['runtime']['ports']:
+                    ports = pod['runtime']['ports']
                     
-                    if 'data' in data and 'myself' in data['data'] and 'pods' in data['data']['myself']:
-                        pods = data['data']['myself']['pods']
-                        print(f"Found {len(pods)} total pods")
-                        
-                        # Look for running pods with the specified template
-                        running_pods_with_port_5000 = []  # Fallback list
-                        
-                        for pod in pods:
-                            pod_id = pod.get('id', 'unknown')
-                            pod_name = pod.get('name', 'unknown')
-                            pod_status = pod.get('desiredStatus', 'unknown')
-                            pod_template_id = pod.get('templateId', '')
-                            
-                            print(f"Pod: {pod_name} ({pod_id}) - Status: {pod_status}, Template: '{pod_template_id}' (looking for: '{template_id}')")
-                            
-                            # Enhanced template matching with fallback logic
-                            template_match = False
-                            
-                            # Primary check: exact match (case-insensitive and trimmed)
-                            if pod_template_id and template_id:
-                                template_match = pod_template_id.strip().lower() == template_id.strip().lower()
-                                if template_match:
-                                    print(f"✅ Template match found (case-insensitive): {pod_id}")
-                            
-                            # If running, check for port 5000 regardless of template (fallback)
-                            if pod_status == 'RUNNING':
-                                has_port_5000 = False
-                                if pod.get('runtime') and 'ports' in pod['runtime'] and pod['runtime']['ports']:
-                                    for port in pod['runtime']['ports']:
-                                        if port.get('privatePort') == 5000 or port.get('publicPort') == 5000:
-                                            has_port_5000 = True
-                                            break
-                                
-                                if has_port_5000:
-                                    running_pods_with_port_5000.append({
-                                        'pod': pod,
-                                        'template_match': template_match
-                                    })
-                                    print(f"Found running pod with port 5000: {pod_id} (template_match: {template_match})")
-                            
-                            # Check if this pod matches our template and is running
-                            if pod_status == 'RUNNING' and template_match:
-                                print(f"Found running pod with exact template match: {pod_id}")
-                                
-                                # Get endpoint URL if available
-                                endpoint_url = None
-                                if pod.get('runtime') and 'ports' in pod['runtime'] and pod['runtime']['ports']:
-                                    ports = pod['runtime']['ports']
-                                    
-                                    # Look for port 5000 (GeoPixel API)
-                                    for port in ports:
-                                        private_port = port.get('privatePort')
-                                        public_port = port.get('publicPort')
-                                        
-                                        if private_port == 5000 or public_port == 5000:
-                                            # Construct the standard RunPod proxy URL format
-                                            endpoint_url = f"https://{pod_id}-5000.proxy.runpod.net/"
-                                            print(f"Found endpoint URL: {endpoint_url}")
-                                            break
-                                
-                                return {
-                                    'running': True,
-                                    'pod_id': pod_id,
-                                    'pod_name': pod_name,
-                                    'endpoint_url': endpoint_url,
-                                    'error': None
-                                }
+                    # Look for port 5000 (GeoPixel API)
+                    for port in ports:
+                        private_port = port.get('privatePort')
+                        public_port = port.get('publicPort')
                         
-                        # FALLBACK: If no exact template match, but we have running pods with port 5000
-                        if running_pods_with_port_5000:
-                            print(f"No exact template match, but found {len(running_pods_with_port_5000)} running pods with port 5000")
-                            
-                            # Prefer any pod that partially matches template (even if not exact)
-                            for pod_info in running_pods_with_port_5000:
-                                pod = pod_info['pod']
-                                pod_id = pod.get('id')
-                                pod_name = pod.get('name', 'unknown')
-                                pod_template_id = pod.get('templateId', '')
-                                
-                                # Check for partial template match or use the first available
-                                is_likely_match = (
-                                    not pod_template_id or  # No template ID stored
-                                    template_id in pod_template_id or  # Partial match
-                                    pod_template_id in template_id or  # Reverse partial match
-                                    len(running_pods_with_port_5000) == 1  # Only one option
-                                )
-                                
-                                if is_likely_match:
-                                    # Get endpoint URL
-                                    endpoint_url = f"https://{pod_id}-5000.proxy.runpod.net/"
-                                    
-                                    print(f"🎯 FALLBACK SUCCESS: Using running pod {pod_id} (template: '{pod_template_id}')")
-                                    return {
-                                        'running': True,
-                                        'pod_id': pod_id,
-                                        'pod_name': pod_name,
-                                        'endpoint_url': endpoint_url,
-                                        'error': None
-                                    }
-                        
-                        print(f"No running pods found with template: {template_id}")
-                        return {
-                            'running': False,
-                            'pod_id': None,
-                            'endpoint_url': None,
-                            'error': None
-                        }
-                    else:
-                        print(f"Unexpected API response structure for template check")
-                        return {
-                            'running': False,
-                            'pod_id': None,
-                            'endpoint_url': None,
-                            'error': 'Unexpected API response'
-                        }
+                        if private_port == 5000 or public_port == 5000:
+                            # Construct the standard RunPod proxy URL format
+                            endpoint_url = f"https://{pod_id}-5000.proxy.runpod.net/"
+                            print(f"Found endpoint URL: {endpoint_url}")
+                            break
+                
+                return {
+                    'running': True,
+                    'pod_id': pod_id,
+                    'pod_name': pod_name,
+                    'endpoint_url': endpoint_url,
+                    'error': None
+                }
+        
+        # FALLBACK: If no exact template match, but we have running pods with port 5000
+        if running_pods_with_port_5000:
+            print(f"No exact template match, but found {len(running_pods_with_port_5000)} running pods with port 5000")
+            
+            # Prefer any pod that partially matches template (even if not exact)
+            for pod_info in running_pods_with_port_5000:
+                pod = pod_info['pod']
+                pod_id = pod.get('id')
+                pod_name = pod.get('name', 'unknown')
+                pod_template_id = pod.get('templateId', '')
+                
+                # Check for partial template match or use the first available
+                is_likely_match = (
+                    not pod_template_id or  # No template ID stored
+                    template_id in pod_template_id or  # Partial match
+                    pod_template_id in template_id or  # Reverse partial match
+                    len(running_pods_with_port_5000) == 1  # Only one option
+                )
+                
+                if is_likely_match:
+                    # Get endpoint URL
+                    endpoint_url = f"https://{pod_id}-5000.proxy.runpod.net/"
                     
-            except Exception as e:
-                print(f"Error querying RunPod endpoint {endpoint} for template check: {e}")
-                continue
+                    print(f"🎯 FALLBACK SUCCESS: Using running pod {pod_id} (template: '{pod_template_id}')")
+                    return {
+                        'running': True,
+                        'pod_id': pod_id,
+                        'pod_name': pod_name,
+                        'endpoint_url': endpoint_url,
+                        'error': None
+                    }
         
-        print("Failed to query RunPod API from all endpoints for template check")
+        print(f"No running pods found with template: {template_id}")
         return {
             'running': False,
             'pod_id': None,
             'endpoint_url': None,
-            'error': 'Failed to query RunPod API'
+            'error': None
         }
-        
+    
     except Exception as e:
         print(f"Error checking pod status with template: {e}")
         return {
@@ -357,13 +288,146 @@ def check_pod_running_with_template(template_id):
             'error': str(e)
         }
 
+def probe_pod_health(pod_id):
+    """
+    Probe the health and readiness endpoints of a pod concurrently.
+    
+    The /health answer decides unless it reports ok without readiness flags; then the first
+    readiness endpoint answering 200 confirms the pod, and it is assumed ready if none does.
+    
+    Args:
+        pod_id (str): RunPod pod ID
+        
+    Returns:
+        dict: Health check result as returned by /check-health
+    """
+    # Construct base URL for the service
+    base_url = f'https://{pod_id}-5000.proxy.runpod.net'
+    health_url = f'{base_url}/health'
+    test_endpoints = [
+        f'{base_url}/api/status',
+        f'{base_url}/status',
+        f'{base_url}/ready'
+    ]
+    print(f"Health Check Proxy: Checking {health_url} (+{len(test_endpoints)} readiness probes)")
+    
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1 + len(test_endpoints))
+    health_future = executor.submit(requests.get, health_url, timeout=HEALTH_CHECK_CONFIG['health_timeout'])
+    test_futures = {
+        executor.submit(requests.get, test_url, timeout=HEALTH_CHECK_CONFIG['probe_timeout']): test_url
+        for test_url in test_endpoints
+    }
+    
+    try:
+        try:
+            response = health_future.result()
+        except requests.exceptions.Timeout:
+            print("Health Check Proxy: ❌ Request timeout")
+            return {'available': False, 'error': 'Health check timeout'}
+        except requests.exceptions.RequestException as e:
+            print(f"Health Check Proxy: ❌ Request exception: {str(e)}")
+            return {'available': False, 'error': f'Network error: {str(e)}'}
+        
+        print(f"Health Check Proxy: Response status {response.status_code}")
+        if response.status_code != 200:
+            print(f"Health Check Proxy: ❌ HTTP {response.status_code} - endpoint not ready")
+            return {'available': False, 'error': f'HTTP {response.status_code}: {response.reason}'}
+        
+        try:
+            health_data = response.json()
+        except json.JSONDecodeError:
+            print("Health Check Proxy: ❌ Invalid JSON response")
+            return {'available': False, 'error': 'Invalid JSON response from health endpoint'}
+        
+        print(f"Health Check Proxy: Response data: {health_data}")
+        
+        # Check if status is "ok"
+        if health_data.get('status') != 'ok':
+            print(f"Health Check Proxy: ❌ Status is '{health_data.get('status')}' - not ready")
+            return {
+                'available': False,
+                'status': health_data.get('status', 'unknown'),
+                'ready': False,
+                'health_data': health_data
+            }
+        
+        # Model loading status and ready flag are decisive when the health endpoint reports them
+        service_ready = True
+        if 'model_loaded' in health_data and not health_data.get('model_loaded'):
+            service_ready = False
+            print("Health Check Proxy: ❌ Model not loaded yet")
+        if 'ready' in health_data and not health_data.get('ready'):
+            service_ready = False
+            print("Health Check Proxy: ❌ Service not ready yet")
+        
+        # Otherwise take the first readiness probe answering 200, they ran alongside /health
+        if service_ready and 'model_loaded' not in health_data and 'ready' not in health_data:
+            test_passed = False
+            for future in concurrent.futures.as_completed(test_futures):
+                try:
+                    if future.result().status_code == 200:
+                        print(f"Health Check Proxy: ✅ Test endpoint {test_futures[future]} responded")
+                        test_passed = True
+                        break
+                except requests.exceptions.RequestException:
+                    continue
+            
+            # If no test endpoints work, assume service is ready if basic health passes
+            if not test_passed:
+                print("Health Check Proxy: ⚠️ No test endpoints available, assuming ready based on health check")
+        
+        if service_ready:
+            print("Health Check Proxy: ✅ Service is fully ready")
+            return {
+                'available': True,
+                'status': 'ok',
+                'ready': True,
+                'health_data': health_data
+            }
+        
+        print("Health Check Proxy: ❌ Service not fully ready yet")
+        return {
+            'available': False,
+            'status': 'loading',
+            'ready': False,
+            'health_data': health_data
+        }
+        
+    finally:
+        # Do not wait for probes that are no longer needed
+        executor.shutdown(wait=False)
+
+def _health_cache_path(pod_id):
+    return os.path.join(HEALTH_CHECK_CONFIG['cache_dir'], f"{pod_id}.json")
+
+def get_cached_pod_health(pod_id):
+    """Get a health check result of a pod from the cache shared by all workers, None if expired"""
+    try:
+        with open(_health_cache_path(pod_id)) as f:
+            entry = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if time.time() - entry.get('checked_at', 0) > HEALTH_CHECK_CONFIG['cache_ttl']:
+        return None
+    return entry['result']
+
+def cache_pod_health(pod_id, result):
+    """Store a health check result of a pod for HEALTH_CHECK_CONFIG['cache_ttl'] seconds"""
+    path = _health_cache_path(pod_id)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(HEALTH_CHECK_CONFIG['cache_dir'], exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump({'checked_at': time.time(), 'result': result}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Health Check Proxy: ⚠️ Failed to cache health result: {e}")
+
 # RunPod Blueprint Routes
 
 @runpod_bp.route('/check-health', methods=['POST'])
 def check_health():
     """Enhanced health check that verifies service is fully ready, not just started"""
-    import requests
-    
     try:
         # Get request data
         data = request.get_json()
@@ -376,132 +440,19 @@ def check_health():
         if not pod_id:
             return jsonify({'error': 'Pod ID is required', 'available': False}), 400
         
-        # Construct base URL for the service
-        base_url = f'https://{pod_id}-5000.proxy.runpod.net'
+        # Polls from many tabs and workers share one probe per pod within the cache TTL
+        cacheable = bool(POD_ID_PATTERN.match(pod_id))
+        result = get_cached_pod_health(pod_id) if cacheable else None
+        if result is None:
+            result = probe_pod_health(pod_id)
+            if cacheable:
+                cache_pod_health(pod_id, result)
         
-        # First, check basic health endpoint
-        health_url = f'{base_url}/health'
-        print(f"Health Check Proxy: Checking {health_url}")
+        if result.get('ready'):
+            # Run a warm-up inference in the background the first time the pod is ready
+            result['warmup'] = get_pod_warmup().ensure_warm(pod_id) if POD_WARMUP_CONFIG['enabled'] else None
         
-        try:
-            # Make request to health endpoint with short timeout
-            response = requests.get(health_url, timeout=5)
-            print(f"Health Check Proxy: Response status {response.status_code}")
-            
-            if response.status_code == 200:
-                try:
-                    health_data = response.json()
-                    print(f"Health Check Proxy: Response data: {health_data}")
-                    
-                    # Check if status is "ok"
-                    if health_data.get('status') == 'ok':
-                        print("Health Check Proxy: ✅ Basic health check passed")
-                        
-                        # Enhanced readiness check - verify service can handle actual requests
-                        print("Health Check Proxy: 🔍 Performing enhanced readiness check...")
-                        
-                        # Check if service has additional readiness indicators
-                        service_ready = True
-                        
-                        # Check for model loading status if available
-                        if 'model_loaded' in health_data:
-                            model_loaded = health_data.get('model_loaded')
-                            print(f"Health Check Proxy: Model loaded status: {model_loaded}")
-                            if not model_loaded:
-                                service_ready = False
-                                print("Health Check Proxy: ❌ Model not loaded yet")
-                        
-                        # Check for ready flag if available
-                        if 'ready' in health_data:
-                            ready_flag = health_data.get('ready')
-                            print(f"Health Check Proxy: Ready flag: {ready_flag}")
-                            if not ready_flag:
-                                service_ready = False
-                                print("Health Check Proxy: ❌ Service not ready yet")
-                        
-                        # If health endpoint doesn't provide readiness info, try a test request
-                        if service_ready and 'model_loaded' not in health_data and 'ready' not in health_data:
-                            print("Health Check Proxy: 🧪 Testing service with lightweight request...")
-                            
-                            # Try to make a simple test request to verify service is actually ready
-                            try:
-                                # Try a lightweight endpoint if available, otherwise skip this test
-                                test_endpoints = [
-                                    f'{base_url}/api/status',
-                                    f'{base_url}/status',
-                                    f'{base_url}/ready'
-                                ]
-                                
-                                test_passed = False
-                                for test_url in test_endpoints:
-                                    try:
-                                        test_response = requests.get(test_url, timeout=3)
-                                        if test_response.status_code == 200:
-                                            print(f"Health Check Proxy: ✅ Test endpoint {test_url} responded")
-                                            test_passed = True
-                                            break
-                                    except:
-                                        continue
-                                
-                                # If no test endpoints work, assume service is ready if basic health passes
-                                if not test_passed:
-                                    print("Health Check Proxy: ⚠️ No test endpoints available, assuming ready based on health check")
-                                    
-                            except Exception as e:
-                                print(f"Health Check Proxy: ⚠️ Test request failed: {e}")
-                                # Don't fail the health check for test request failures
-                        
-                        if service_ready:
-                            print("Health Check Proxy: ✅ Service is fully ready")
-                            return jsonify({
-                                'available': True,
-                                'status': 'ok',
-                                'ready': True,
-                                'health_data': health_data
-                            })
-                        else:
-                            print("Health Check Proxy: ❌ Service not fully ready yet")
-                            return jsonify({
-                                'available': False,
-                                'status': 'loading',
-                                'ready': False,
-                                'health_data': health_data
-                            })
-                        
-                    else:
-                        print(f"Health Check Proxy: ❌ Status is '{health_data.get('status')}' - not ready")
-                        return jsonify({
-                            'available': False,
-                            'status': health_data.get('status', 'unknown'),
-                            'ready': False,
-                            'health_data': health_data
-                        })
-                        
-                except json.JSONDecodeError:
-                    print("Health Check Proxy: ❌ Invalid JSON response")
-                    return jsonify({
-                        'available': False,
-                        'error': 'Invalid JSON response from health endpoint'
-                    })
-            else:
-                print(f"Health Check Proxy: ❌ HTTP {response.status_code} - endpoint not ready")
-                return jsonify({
-                    'available': False,
-                    'error': f'HTTP {response.status_code}: {response.reason}'
-                })
-                
-        except requests.exceptions.Timeout:
-            print("Health Check Proxy: ❌ Request timeout")
-            return jsonify({
-                'available': False,
-                'error': 'Health check timeout'
-            })
-        except requests.exceptions.RequestException as e:
-            print(f"Health Check Proxy: ❌ Request exception: {str(e)}")
-            return jsonify({
-                'available': False,
-                'error': f'Network error: {str(e)}'
-            })
+        return jsonify(result)
             
     except Exception as e:
         print(f"Health Check Proxy: ❌ Unexpected error: {str(e)}")
@@ -510,11 +461,200 @@ def check_health():
             'error': f'Server error: {str(e)}'
         }), 500
 
+def is_read_only_graphql(query):
+    """Whether a GraphQL document only contains queries, i.e. no mutation or subscription"""
+    return not GRAPHQL_WRITE_PATTERN.search(GRAPHQL_IGNORED_PATTERN.sub(' ', query))
+
+def proxy_cache_key_dir(api_key):
+    """Cache directory of one API key, so accounts never share answers"""
+    key_id = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:32]
+    return os.path.join(PROXY_CACHE_CONFIG['cache_dir'], key_id)
+
+def proxy_cache_key(api_key, query, variables):
+    """Cache key of a proxied query, a path below the directory of its API key without extension"""
+    material = json.dumps([query, variables], sort_keys=True)
+    return os.path.join(proxy_cache_key_dir(api_key), hashlib.sha256(material.encode('utf-8')).hexdigest())
+
+def invalidate_proxy_cache(api_key):
+    """Drop the cached answers of an API key after a mutation changed its pods"""
+    key_dir = proxy_cache_key_dir(api_key)
+    try:
+        os.makedirs(key_dir, mode=0o700, exist_ok=True)
+        # Queries that started before the mutation must not store their answers afterwards
+        with open(os.path.join(key_dir, '.invalidated'), 'a'):
+            os.utime(os.path.join(key_dir, '.invalidated'), None)
+        for name in os.listdir(key_dir):
+            if name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(key_dir, name))
+                except FileNotFoundError:
+                    continue
+    except OSError as e:
+        print(f"RunPod Proxy: Failed to invalidate cached responses: {e}")
+
+def read_proxy_cache(cache_key):
+    """Get a cached RunPod answer, None if missing or older than PROXY_CACHE_CONFIG['ttl']"""
+    path = f"{cache_key}.json"
+    try:
+        if time.time() - os.stat(path).st_mtime > PROXY_CACHE_CONFIG['ttl']:
+            return None
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def write_proxy_cache(cache_key, data, started_at):
+    """Store a RunPod answer requested at started_at, readable by the application user only"""
+    global _proxy_cache_pruned_at
+    cache_dir = PROXY_CACHE_CONFIG['cache_dir']
+    path = f"{cache_key}.json"
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        # A mutation of this API key completed while the query was in flight
+        if os.stat(os.path.join(os.path.dirname(path), '.invalidated')).st_mtime >= started_at:
+            return
+    except FileNotFoundError:
+        pass
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"RunPod Proxy: Failed to cache response: {e}")
+        return
+    
+    # Drop expired answers, lock files and directories of unused API keys about once a minute
+    now = time.time()
+    if now - _proxy_cache_pruned_at < 60:
+        return
+    _proxy_cache_pruned_at = now
+    for key_id in os.listdir(cache_dir):
+        key_dir = os.path.join(cache_dir, key_id)
+        try:
+            for name in os.listdir(key_dir):
+                try:
+                    if now - os.stat(os.path.join(key_dir, name)).st_mtime > max(PROXY_CACHE_CONFIG['ttl'] * 10, 60):
+                        os.remove(os.path.join(key_dir, name))
+                except OSError:
+                    continue
+            os.rmdir(key_dir)
+        except OSError:
+            continue
+
+@contextmanager
+def proxy_cache_lock(cache_key):
+    """
+    Serialize identical queries across workers, later ones then find the cached answer.
+    
+    Waits at most PROXY_CACHE_CONFIG['lock_timeout'] seconds, then proceeds without the lock
+    so a hanging upstream request cannot stall every worker polling the same query.
+    """
+    os.makedirs(os.path.dirname(cache_key), mode=0o700, exist_ok=True)
+    with open(f"{cache_key}.lock", 'w') as lock_file:
+        deadline = time.time() + PROXY_CACHE_CONFIG['lock_timeout']
+        locked = False
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+                break
+            except BlockingIOError:
+                if time.time() >= deadline:
+                    print("RunPod Proxy: ⚠️ Identical query still in flight, querying without waiting")
+                    break
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if locked:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def forward_runpod_graphql(payload, api_key, race=True):
+    """
+    Send a GraphQL request to RunPod.
+    
+    With race, both endpoints are queried at once, which is only safe for read-only queries.
+    Otherwise the endpoints are tried one after another, falling back to the next one only on
+    a connection error or 404, so a mutation (e.g. deploying a pod) takes effect at most once.
+    
+    Returns:
+        tuple: (response body dict, HTTP status code)
+    """
+    if race:
+        try:
+            endpoint, body = query_runpod_graphql(api_key, payload, PROXY_CACHE_CONFIG['upstream_timeout'])
+            print(f"RunPod Proxy: Answered by {endpoint}")
+            return body, 200
+        except RunPodQueryError as e:
+            responses = e.responses
+    else:
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {api_key}'
+        }
+        responses = {}
+        for endpoint in RUNPOD_GRAPHQL_ENDPOINTS:
+            try:
+                print(f"RunPod Proxy: Trying endpoint {endpoint}")
+                response = requests.post(endpoint, json=payload, headers=headers,
+                                         timeout=PROXY_CACHE_CONFIG['upstream_timeout'])
+            except requests.exceptions.ConnectionError as e:
+                # The request never reached RunPod, the next endpoint can safely get it
+                responses[endpoint] = e
+                continue
+            except requests.exceptions.RequestException as e:
+                # E.g. a read timeout, RunPod may have executed the request already
+                responses[endpoint] = e
+                break
+            print(f"RunPod Proxy: Response status {response.status_code} from {endpoint}")
+            responses[endpoint] = response
+            if response.status_code == 200:
+                return response.json(), 200
+            if response.status_code != 404:
+                break
+    
+    # Report the most specific failure: authentication, GraphQL errors, then any RunPod error other than 404
+    answered = [(endpoint, response) for endpoint, response in responses.items()
+                if not isinstance(response, Exception)]
+    for endpoint, response in answered:
+        if response.status_code == 401:
+            print(f"RunPod Proxy: 401 Unauthorized from {endpoint}")
+            print(f"RunPod Proxy: Response text: {response.text}")
+            return {
+                'error': f'Authentication failed: Invalid API key',
+                'details': f'401 Unauthorized from {endpoint}',
+                'response': response.text
+            }, 401
+    # GraphQL errors come with HTTP 200, the client gets them as before
+    for endpoint, response in answered:
+        if response.status_code == 200:
+            print(f"RunPod Proxy: GraphQL errors from {endpoint}")
+            return response.json(), 200
+    for endpoint, response in answered:
+        if response.status_code not in (200, 404):
+            print(f"RunPod Proxy: Error {response.status_code} from {endpoint}: {response.text}")
+            return {
+                'error': f'RunPod API error: {response.status_code}',
+                'details': response.text,
+                'endpoint': endpoint
+            }, response.status_code
+    
+    # If we get here, all endpoints failed
+    last_error = '; '.join(
+        f"Request failed for {endpoint}: {str(response)}" if isinstance(response, Exception)
+        else f"404 Not Found at {endpoint}"
+        for endpoint, response in responses.items()
+    )
+    print(f"RunPod Proxy: All endpoints failed: {last_error}")
+    return {
+        'error': 'All RunPod API endpoints failed',
+        'details': last_error
+    }, 500
+
 @runpod_bp.route('/runpod-proxy', methods=['POST'])
 def runpod_proxy():
     """Proxy endpoint for RunPod API calls to avoid CORS issues"""
-    import requests
-    
     try:
         # Get the request data from the frontend
         data = request.get_json()
@@ -535,7 +675,6 @@ def runpod_proxy():
             print(f"RunPod Proxy: Last 50 chars: {api_key_cleaned[-50:]}")
             # Try to extract just the API key part if it's concatenated
             # RunPod keys typically start with specific patterns
-            import re
             # Look for patterns that might be RunPod API keys
             potential_keys = re.findall(r'[A-Za-z0-9]{40,80}', api_key_cleaned)
             if potential_keys:
@@ -548,61 +687,38 @@ def runpod_proxy():
         print(f"RunPod Proxy: Using API key length: {len(api_key_cleaned)}")
         print(f"RunPod Proxy: Query: {query[:100]}...")
         
-        # Make the request to RunPod API server-side
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {api_key_cleaned}'
-        }
-        
         payload = {
             'query': query,
             'variables': variables
         }
         
-        # Try both endpoints
-        endpoints = [
-            'https://api.runpod.io/graphql',
-            'https://api.runpod.ai/graphql'
-        ]
-        
-        last_error = None
-        for endpoint in endpoints:
-            try:
-                print(f"RunPod Proxy: Trying endpoint {endpoint}")
-                response = requests.post(endpoint, json=payload, headers=headers, timeout=30)
-                print(f"RunPod Proxy: Response status {response.status_code} from {endpoint}")
-                
-                if response.status_code == 200:
-                    return jsonify(response.json()), 200
-                elif response.status_code == 401:
-                    print(f"RunPod Proxy: 401 Unauthorized from {endpoint}")
-                    print(f"RunPod Proxy: Response text: {response.text}")
-                    return jsonify({
-                        'error': f'Authentication failed: Invalid API key',
-                        'details': f'401 Unauthorized from {endpoint}',
-                        'response': response.text
-                    }), 401
-                elif response.status_code == 404:
-                    last_error = f"404 Not Found at {endpoint}"
-                    continue
-                else:
-                    print(f"RunPod Proxy: Error {response.status_code} from {endpoint}: {response.text}")
-                    return jsonify({
-                        'error': f'RunPod API error: {response.status_code}',
-                        'details': response.text,
-                        'endpoint': endpoint
-                    }), response.status_code
-                    
-            except requests.exceptions.RequestException as e:
-                last_error = f"Request failed for {endpoint}: {str(e)}"
-                print(f"RunPod Proxy: Request exception: {last_error}")
-                continue
-        
-        # If we get here, all endpoints failed
-        return jsonify({
-            'error': 'All RunPod API endpoints failed',
-            'details': last_error
-        }), 500
+        read_only = is_read_only_graphql(query)
+        if PROXY_CACHE_CONFIG['ttl'] <= 0:
+            body, status_code = forward_runpod_graphql(payload, api_key_cleaned, race=read_only)
+            return jsonify(body), status_code
+        
+        # Mutations always go to RunPod, once, and drop the cached answers of their API key
+        if not read_only:
+            body, status_code = forward_runpod_graphql(payload, api_key_cleaned, race=False)
+            if status_code == 200:
+                invalidate_proxy_cache(api_key_cleaned)
+            return jsonify(body), status_code
+        
+        # Read-only queries are answered from the short-lived cache
+        cache_key = proxy_cache_key(api_key_cleaned, query, variables)
+        with proxy_cache_lock(cache_key):
+            body = read_proxy_cache(cache_key)
+            if body is not None:
+                print("RunPod Proxy: Answered from cache")
+                return jsonify(body), 200
+            
+            started_at = time.time()
+            body, status_code = forward_runpod_graphql(payload, api_key_cleaned)
+            
+            # GraphQL reports query errors with HTTP 200, those are not cached
+            if status_code == 200 and not body.get('errors'):
+                write_proxy_cache(cache_key, body, started_at)
+            return jsonify(body), status_code
         
     except Exception as e:
         return jsonify({'error': f'Proxy error: {str(e)}'}), 500
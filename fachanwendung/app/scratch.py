@@ -0,0 +1,158 @@
+"""
+Request-scoped scratch storage module for GeoPixel Flask application.
+
+This module handles all temporary file storage for segmentation requests including:
+- One namespaced directory per request for captured images, tiles and overlay specs
+- Configurable location (e.g. a tmpfs mount) via GEOPIXEL_SCRATCH_DIR
+- Background eviction of expired request directories (TTL) and size quota enforcement
+"""
+
+import os
+import re
+import time
+import uuid
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Scratch storage configuration (overridable via environment variables)
+SCRATCH_CONFIG = {
+    # Root directory for request scratch space, point this at a tmpfs mount for speed
+    'root': os.environ.get('GEOPIXEL_SCRATCH_DIR', 'fachanwendung/app/static/images/scratch'),
+
+    # Request directories older than this are evicted (seconds)
+    'ttl_seconds': int(os.environ.get('GEOPIXEL_SCRATCH_TTL', 30 * 60)),
+
+    # Total size quota, oldest request directories are evicted first when exceeded (bytes)
+    'max_bytes': int(os.environ.get('GEOPIXEL_SCRATCH_MAX_BYTES', 1024 * 1024 * 1024)),
+
+    # Interval between background eviction sweeps (seconds)
+    'sweep_interval': int(os.environ.get('GEOPIXEL_SCRATCH_SWEEP_INTERVAL', 60)),
+}
+
+REQUEST_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ScratchSpace:
+    """Per-request scratch directories with TTL and size-quota eviction"""
+
+    def __init__(self, root, ttl_seconds, max_bytes, sweep_interval):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._evictor_pid = None
+        self._evictor_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def create_request_dir(self):
+        """
+        Create a new scratch directory for one request.
+
+        Returns:
+            tuple: (request_id, directory path)
+        """
+        self.ensure_evictor()
+        request_id = uuid.uuid4().hex
+        path = os.path.join(self.root, request_id)
+        os.makedirs(path, exist_ok=True)
+        return request_id, path
+
+    def get_request_dir(self, request_id):
+        """
+        Look up the scratch directory of an earlier request.
+
+        Returns:
+            str: Directory path, or None if the request id is invalid or already evicted
+        """
+        if not request_id or not REQUEST_ID_PATTERN.match(request_id):
+            return None
+        path = os.path.join(self.root, request_id)
+        return path if os.path.isdir(path) else None
+
+    def _directory_size(self, path):
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+        return total
+
+    def evict(self):
+        """
+        Remove expired request directories, then the oldest ones until the size quota is met.
+
+        Returns:
+            int: Number of evicted request directories
+        """
+        now = time.time()
+        entries = []
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.is_dir() and REQUEST_ID_PATTERN.match(entry.name):
+                        try:
+                            entries.append((entry.stat().st_mtime, entry.path))
+                        except OSError:
+                            continue
+        except FileNotFoundError:
+            os.makedirs(self.root, exist_ok=True)
+            return 0
+
+        evicted = 0
+        remaining = []
+        for mtime, path in entries:
+            if now - mtime > self.ttl_seconds:
+                shutil.rmtree(path, ignore_errors=True)
+                evicted += 1
+            else:
+                remaining.append((mtime, path, self._directory_size(path)))
+
+        total_bytes = sum(size for _, _, size in remaining)
+        for mtime, path, size in sorted(remaining):
+            if total_bytes <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_bytes -= size
+            evicted += 1
+
+        if evicted:
+            logger.info(f"Scratch eviction removed {evicted} request directories ({total_bytes} bytes remaining)")
+        return evicted
+
+    def _run_evictor(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.evict()
+            except Exception as e:
+                logger.error(f"Scratch eviction failed: {e}")
+
+    def ensure_evictor(self):
+        """Start the background evictor thread once per process (threads do not survive a fork)"""
+        with self._evictor_lock:
+            if self._evictor_pid == os.getpid():
+                return
+            self._evictor_pid = os.getpid()
+            thread = threading.Thread(target=self._run_evictor, name='scratch-evictor', daemon=True)
+            thread.start()
+
+# Global scratch space instance - will be initialized later
+scratch_space = None
+
+def get_scratch_space() -> ScratchSpace:
+    """Get the global scratch space instance"""
+    global scratch_space
+    if scratch_space is None:
+        scratch_space = ScratchSpace(
+            root=SCRATCH_CONFIG['root'],
+            ttl_seconds=SCRATCH_CONFIG['ttl_seconds'],
+            max_bytes=SCRATCH_CONFIG['max_bytes'],
+            sweep_interval=SCRATCH_CONFIG['sweep_interval']
+        )
+        logger.info(f"Scratch space initialized at {scratch_space.root}")
+    return scratch_space
@@ -673,6 +673,22 @@ def process_image(image_path, query, api_url):
         log_debug(f"Error sending request: {error_message}")
         raise e
 
+def report_progress(progress_callback, stage, **details):
+    """
+    Forward a processing stage to the optional progress callback
+    
+    Args:
+        progress_callback (callable): Callable receiving (stage, details), or None
+        stage (str): Name of the processing stage that was reached
+        **details: JSON-serializable stage details
+    """
+    if progress_callback is None:
+        return
+    try:
+        progress_callback(stage, details)
+    except Exception as e:
+        log_debug(f"Progress callback failed for stage '{stage}': {str(e)}")
+
 def post_process_mask(pred_masks):
     """
     Post-process prediction masks to clean them up
@@ -707,10 +723,12 @@ def post_process_mask(pred_masks):
     
     return mask
 
-def get_object_outlines(api_base_url, image_path, query, upscaling_config=None):
+def get_object_outlines(api_base_url, image_path, query, upscaling_config=None, progress_callback=None):
     """
     NEW MASK PROCESSING LOGIC:
     Process tiles with multi-scale approach and mask concatenation
+    
+    progress_callback, if given, is called with (stage, details) as processing stages complete
     """
     # Set default upscaling configuration if not provided
     if upscaling_config is None:
@@ -746,13 +764,13 @@ def get_object_outlines(api_base_url, image_path, query, upscaling_config=None):
     if use_msff:
         if not BATCH_PROCESSING_CONFIG.get('disable_verbose_logging', False):
             print(f"\n🔄 MULTI-SCALE FEATURE FUSION PROCESSING (MSFF enabled)")
-        return process_tile_with_multiscale_masks(image_path, query, api_process_url, requested_scale, width, height)
+        return process_tile_with_multiscale_masks(image_path, query, api_process_url, requested_scale, width, height, progress_callback)
     else:
         if not BATCH_PROCESSING_CONFIG.get('disable_verbose_logging', False):
             print(f"\n🔄 SINGLE SCALE PROCESSING (MSFF disabled)")
-        return process_tile_single_scale(image_path, query, api_process_url, requested_scale, width, height)
+        return process_tile_single_scale(image_path, query, api_process_url, requested_scale, width, height, progress_callback)
 
-def process_tile_with_multiscale_masks(image_path, query, api_process_url, scale, width, height):
+def process_tile_with_multiscale_masks(image_path, query, api_process_url, scale, width, height, progress_callback=None):
     """
     NEW LOGIC: Process tile at multiple scales and combine masks via concatenation
     
@@ -785,6 +803,8 @@ def process_tile_with_multiscale_masks(image_path, query, api_process_url, scale
         if not BATCH_PROCESSING_CONFIG.get('disable_verbose_logging', False):
             print(f"✓ Created scaled image for factor {scale_factor}")
     
+    report_progress(progress_callback, 'msff_scales_prepared', scales=scales)
+    
     # Step 2: 🚀 BATCH PROCESS all scaled images through GeoPixel for maximum efficiency
     if not BATCH_PROCESSING_CONFIG.get('disable_verbose_logging', False):
         print(f"🚀 BATCH PROCESSING: Processing {len(tile_array)} scales simultaneously")
@@ -818,6 +838,9 @@ def process_tile_with_multiscale_masks(image_path, query, api_process_url, scale
                     if not BATCH_PROCESSING_CONFIG.get('disable_verbose_logging', False):
                         print(f"⚠️ No prediction masks from scale {scale_factor}")
                     mask_array.append(np.zeros((height, width), dtype=np.uint8))
+                
+                report_progress(progress_callback, 'msff_scale_processed', scale=scale_factor,
+                                completed=i + 1, total=len(scales))
             
         else:
             print(f"⚠️ Batch processing failed or incomplete, falling back to individual processing")
@@ -848,6 +871,9 @@ def process_tile_with_multiscale_masks(image_path, query, api_process_url, scale
                 except Exception as e:
                     print(f"❌ Error processing scale {scale_factor}: {str(e)}")
                     mask_array.append(np.zeros((height, width), dtype=np.uint8))
+                
+                report_progress(progress_callback, 'msff_scale_processed', scale=scale_factor,
+                                completed=i + 1, total=len(scales))
         
     except Exception as e:
         print(f"❌ Error in batch processing multi-scale: {str(e)}")
@@ -873,6 +899,9 @@ def process_tile_with_multiscale_masks(image_path, query, api_process_url, scale
             except Exception as e2:
                 print(f"❌ Error processing scale {scale_factor}: {str(e2)}")
                 mask_array.append(np.zeros((height, width), dtype=np.uint8))
+            
+            report_progress(progress_callback, 'msff_scale_processed', scale=scale_factor,
+                            completed=i + 1, total=len(scales))
     
     # Clean up scaled images after processing
     for scaled_image_path in tile_array:
@@ -906,6 +935,7 @@ def process_tile_with_multiscale_masks(image_path, query, api_process_url, scale
     
     active_pixels = np.count_nonzero(binary_mask)
     print(f"✓ Final mask: {active_pixels} active pixels out of {width*height}")
+    report_progress(progress_callback, 'msff_masks_combined', active_pixels=int(active_pixels))
     
     # Step 4: Extract contours from the final binary mask
     print("🔍 Extracting contours from final mask...")
@@ -988,6 +1018,7 @@ def process_tile_with_multiscale_masks(image_path, query, api_process_url, scale
             continue
     
     print(f"✅ Multi-scale mask processing complete: {len(result_contours)} final contours")
+    report_progress(progress_callback, 'contours_extracted', contours=len(result_contours))
     
     # Return in the expected format
     return {
@@ -997,7 +1028,7 @@ def process_tile_with_multiscale_masks(image_path, query, api_process_url, scale
         'mask_combination': 'concatenation_with_threshold'
     }, result_contours, binary_mask
 
-def process_tile_single_scale(image_path, query, api_process_url, scale, width, height):
+def process_tile_single_scale(image_path, query, api_process_url, scale, width, height, progress_callback=None):
     """
     Process tile at single scale (traditional approach for scale < 2)
     Enhanced with smart processing capability for future batch optimization
@@ -1020,6 +1051,7 @@ def process_tile_single_scale(image_path, query, api_process_url, scale, width,
         
         if response:
             result, pred_masks = response
+            report_progress(progress_callback, 'inference_complete', scale=scale)
             
             if pred_masks is not None:
                 # Post-process mask
@@ -1110,6 +1142,7 @@ def process_tile_single_scale(image_path, query, api_process_url, scale, width,
                             continue
                     
                     print(f"✅ Single scale processing complete: {len(result_contours)} contours")
+                    report_progress(progress_callback, 'contours_extracted', contours=len(result_contours))
                     
                     return result, result_contours, resized_mask
                 else:
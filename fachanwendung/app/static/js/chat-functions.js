@@ -391,7 +391,7 @@ async function handleOpenLayersChatCapture(userQuery) {
                 
                 handleSuccessfulChatCapture(blob, mapBounds, userQuery);
                 
-            }, 'image/png');
+            }, 'image/jpeg', 0.95);
             
             // Restore original layer visibility after capture
             setTimeout(() => {
@@ -556,7 +556,7 @@ async function createTilesFromImage(blob, tileConfig) {
                 } else {
                     reject(new Error('Failed to create tile blob'));
                 }
-            }, 'image/png');
+            }, 'image/jpeg', 0.95);
         };
         
         img.onerror = () => reject(new Error('Failed to load image'));
@@ -343,7 +343,7 @@ async function handleOpenLayersCapture() {
 
             handleSuccessfulCapture(blob, mapBounds, setButtonLoadingState);
             
-        }, 'image/png');
+        }, 'image/jpeg', 0.95);
         
         // Restore original layer visibility after capture
         setTimeout(() => {
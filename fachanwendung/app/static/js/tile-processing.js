@@ -679,7 +679,7 @@ export async function processTiledImage(imageBlob, selection, mapBounds, object,
                                 console.error(`Error processing tile ${tile.tileIndex}:`, error);
                                 resolve(null);
                             });
-                    }, 'image/png');
+                    }, 'image/jpeg', 0.95);
                 });
             });
             
@@ -819,7 +819,7 @@ async function processTileAtScaleIndividual(tileBlob, selection, tileBounds, til
     const formData = new FormData();
     formData.append('selection', selection);
     formData.append('mapExtent', JSON.stringify(tileBounds));
-    formData.append('imageData', tileBlob, `tile-${tileIndex}-scale-${scaleConfig.scale}.png`);
+    formData.append('imageData', tileBlob, `tile-${tileIndex}-scale-${scaleConfig.scale}.jpg`);
     
     // Include MSFF flag in the tile info
     formData.append('tileInfo', JSON.stringify({
@@ -933,6 +933,14 @@ export const generateLayerSelectionHTML = async () => {
 
   const modeIndicator = currentViewMode === 'cadenza' ? ' (Database)' : ' (OpenLayers)';
 
+  // The database analysis can be limited to the visible map area
+  const viewportOptionHTML = currentViewMode === 'cadenza' ? `
+    <div class="layer-selection-row">
+      <label for="overlap-viewport-only">
+        <input type="checkbox" id="overlap-viewport-only"> Only the current map view
+      </label>
+    </div>` : '';
+
   return `<div class="overlap-selection">
     <h3>Layer Overlap Analysis${modeIndicator}</h3>
     <p>Select two layers to analyze their overlapping areas:</p>
@@ -950,7 +958,7 @@ export const generateLayerSelectionHTML = async () => {
         ${optionsHTML}
       </select>
     </div>
-    
+    ${viewportOptionHTML}
     <div class="overlap-controls">
       <button id="calculate-overlap-btn" class="menu-button" disabled>Calculate Overlap</button>
     </div>
@@ -1056,8 +1064,18 @@ export const generateOverlapResultsHTML = (overlapData, layer1Name, layer2Name)
   return html;
 };
 
+// Function to get the current map view as an overlap area filter ({ bbox } in EPSG:3857), null if unknown
+const getCurrentViewAreaFilter = () => {
+  const extent = window.currentExtent?.extent;
+  if (!Array.isArray(extent) || extent.length !== 4 || !extent.every(Number.isFinite)) {
+    return null;
+  }
+  return { bbox: extent };
+};
+
 // Function to perform overlap analysis between two layers
-export const performOverlapAnalysis = async (layer1Name, layer2Name) => {
+// Optional areaFilter ({ bbox: [minx, miny, maxx, maxy] } or { polygon: GeoJSON }) restricts the database analysis
+export const performOverlapAnalysis = async (layer1Name, layer2Name, areaFilter = null) => {
   if (currentViewMode === 'cadenza') {
     // Use database for Cadenza mode
     console.log(`Performing database overlap analysis between ${layer1Name} and ${layer2Name}...`);
@@ -1070,7 +1088,8 @@ export const performOverlapAnalysis = async (layer1Name, layer2Name) => {
         },
         body: JSON.stringify({
           layer1: layer1Name,
-          layer2: layer2Name
+          layer2: layer2Name,
+          ...(areaFilter || {})
         })
       });
 
@@ -1166,7 +1185,14 @@ const setupOverlapAnalysisEventListeners = () => {
         // Perform the analysis
         setTimeout(async () => {
           try {
-            const overlapData = await performOverlapAnalysis(layer1Name, layer2Name);
+            let areaFilter = null;
+            if (document.getElementById('overlap-viewport-only')?.checked) {
+              areaFilter = getCurrentViewAreaFilter();
+              if (!areaFilter) {
+                console.warn('Current map extent unknown, analyzing the whole layers');
+              }
+            }
+            const overlapData = await performOverlapAnalysis(layer1Name, layer2Name, areaFilter);
 
             if (overlapData) {
               // Replace modal content entirely with results
@@ -1370,32 +1396,30 @@ async function addGeometriesToCadenza(validResults, object, tileConfig, setButto
         }
       });
 
-      // Create WKT for MultiPolygon
-      const polygonWKTs = multiPolygonCoordinates.map(polygonCoords => {
-        const ringWKTs = polygonCoords.map(ring => {
-          const coordStrings = ring.map(coord => `${coord[0]} ${coord[1]}`).join(', ');
-          return `(${coordStrings})`;
-        });
-        return `(${ringWKTs.join(', ')})`;
-      });
-      
-      const multiPolygonWKT = `MULTIPOLYGON(${polygonWKTs.join(', ')})`;
+      // Send one GeoJSON polygon per feature, validity repair and conversion to
+      // MultiPolygon happen server-side
+      const geoJSONGeometries = multiPolygonCoordinates.map(polygonCoords => ({
+        geometry_geojson: {
+          type: 'Polygon',
+          coordinates: polygonCoords
+        }
+      }));
       
-      console.log('Generated MultiPolygon WKT for database insertion');
+      console.log('Generated GeoJSON geometries for database insertion');
       console.log('MultiPolygon structure:', {
         polygonCount: multiPolygonCoordinates.length,
         coordinateStructure: multiPolygonCoordinates.map(poly => `${poly.length} rings`)
       });
       
-      // Insert into database
-      const response = await fetch('/insert_geometry', {
+      // Insert all features in one bulk request and transaction
+      const response = await fetch('/insert_geometries', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
           object: object,
-          geometry_wkt: multiPolygonWKT,
+          geometries: geoJSONGeometries,
           attributes: {
             tile_config: tileConfig.label,
             total_geometries: combinedGeometries.length,
@@ -1411,7 +1435,7 @@ async function addGeometriesToCadenza(validResults, object, tileConfig, setButto
       }
 
       const result = await response.json();
-      console.log('✅ Successfully inserted geometry into database:', result);
+      console.log(`✅ Successfully inserted ${result.geometry_ids.length} geometries into database:`, result);
 
       // Immediately update cached layer stats with the new count
       if (result.updated_count !== undefined && result.object_name) {
@@ -1,26 +1,38 @@
-from flask import Blueprint, render_template, request, jsonify, current_app
+from flask import Blueprint, render_template, request, jsonify, current_app, Response, stream_with_context
 import os
 import sys
 import base64
 import re
 import time
 from werkzeug.utils import secure_filename
-from PIL import Image
 import cv2
 import numpy as np
 from flask_cors import CORS
 import json
+import zlib
+import queue
+import concurrent.futures
 from urllib.parse import urljoin
-from .call_geopixel import get_object_outlines
+from datetime import datetime
+from .call_geopixel import get_object_outlines, report_progress, BATCH_PROCESSING_CONFIG
 from io import BytesIO
 import requests
 # Import RunPod functionality from the dedicated module
 from ..runpod import get_active_runpod_url, set_runpod_api_key, check_pod_running_with_template
+# Import request-scoped scratch storage
+from ..scratch import get_scratch_space
+# Import pod warm-up activity tracking
+from ..pod_warmup import get_pod_warmup
 # Import image processing functionality from the dedicated module
 from ..image_processing import (
-    image_coords_to_map_coords,
-    map_coords_to_image_coords,
-    create_overlay_images
+    contours_to_map_coords,
+    decode_image_upload,
+    prescreen_tile_once,
+    register_lazy_overlays,
+    get_lazy_overlay,
+    OVERLAY_CACHE_CONFIG,
+    encode_mask,
+    MASK_ENCODINGS
 )
 
 def determine_target_layer_from_chat_query(query):
@@ -316,114 +328,133 @@ def serve_overlay_image(filename):
     from flask import send_from_directory
     return send_from_directory(IMAGE_FOLDER, filename)
 
-@bp.route('/receive', methods=['POST', 'OPTIONS'])
-def receive_image():
-    print(f"🔍 /receive endpoint called with method: {request.method}")
-    print(f"🔍 Request form keys: {list(request.form.keys())}")
-    print(f"🔍 Request files keys: {list(request.files.keys())}")
+@bp.route('/overlay_images/<request_id>/<filename>')
+def serve_request_overlay_image(request_id, filename):
+    """Serve a request's overlay image from its scratch directory, rendering it on first request"""
+    request_folder = get_scratch_space().get_request_dir(request_id)
+    if request_folder is None:
+        return jsonify({'error': f'Unknown or expired request: {request_id}'}), 404
     
-    # Handle preflight OPTIONS request for CORS
-    if request.method == 'OPTIONS':
-        response = jsonify({})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
-        response.headers.add('Access-Control-Allow-Methods', 'POST')
-        return response
-    if 'mapExtent' not in request.form:
-        print(f"❌ No mapExtent in request form")
-        return jsonify({'error': 'No map bounds'}), 400
+    overlay = get_lazy_overlay(request_folder, secure_filename(filename))
+    if overlay is None:
+        return jsonify({'error': f'Overlay image not found: {filename}'}), 404
     
-    mapBounds = json.loads(request.form['mapExtent'])
-    selection = json.loads(request.form['selection'])
+    image_bytes, etag = overlay
+    response = Response(image_bytes, mimetype='image/jpeg')
+    response.set_etag(etag)
+    # Overlay URLs are unique per request id, so their content never changes
+    response.headers['Cache-Control'] = f"public, max-age={OVERLAY_CACHE_CONFIG['max_age']}, immutable"
+    return response.make_conditional(request)
+
+def resolve_geopixel_api_url():
+    """
+    Resolve the GeoPixel API URL from the running RunPod instance,
+    falling back to configuration, environment variable or hardcoded default.
+    """
+    # Try to get the API URL dynamically from running RunPod instance
+    api_url = get_active_runpod_url()
+    print(api_url)
     
-    # Check if this is a chat query
-    is_chat_query = request.form.get('isChat', 'false').lower() == 'true'
-    original_query = request.form.get('originalQuery', '') if is_chat_query else None
+    # Fallback to configuration, environment variable, or hardcoded default
+    if not api_url:
+        api_url = (current_app.config.get('GEOPIXEL_API_URL') or
+                  os.environ.get('GEOPIXEL_API_URL', "https://0tjxinf025d4jr-5000.proxy.runpod.net/"))
+        print(f"No active RunPod found, using fallback URL: {api_url}")
+    else:
+        print(f"Using dynamic RunPod API URL: {api_url}")
     
-    if is_chat_query:
-        print(f"Processing chat query: {original_query}")
-        print(f"Chat selection: {selection}")
+    return api_url
+
+def process_segmentation_request(img, selection, mapBounds, api_url, url_root, tile_info=None, upscaling_config=None, progress_callback=None, mask_encoding='list', encoded_image=None, image_ext='.jpg'):
+    """
+    Run GeoPixel segmentation for a single captured image or tile and build the response payload.
     
-    # Get RunPod API key from the request if provided (from frontend interface)
-    if 'runpodApiKey' in request.form and request.form['runpodApiKey'].strip():
-        frontend_api_key = request.form['runpodApiKey'].strip()
-        set_runpod_api_key(frontend_api_key)
-        print(f"Using API key from frontend interface (length: {len(frontend_api_key)})")
+    Args:
+        img: Captured image as OpenCV array (BGR format)
+        selection: Object selection string
+        mapBounds: Geographic bounds [[NW_x, NW_y], [SE_x, SE_y]] in EPSG:3857
+        api_url: GeoPixel API base URL
+        url_root: Request URL root used to build overlay image URLs
+        tile_info: Tile information including index (optional)
+        upscaling_config: Upscaling configuration (optional, defaults to x1)
+        progress_callback: Callable receiving (stage, details) for processing progress (optional)
+        mask_encoding: Encoding for raw multi-scale mask data, one of MASK_ENCODINGS (default 'list')
+        encoded_image: Encoded image bytes to store and forward as-is (optional, encoded as JPEG if omitted)
+        image_ext: File extension matching encoded_image (default '.jpg')
     
-    # Check if this is a tile processing request
-    tile_info = None
-    if 'tileInfo' in request.form:
-        tile_info = json.loads(request.form['tileInfo'])
-        print(f"Processing tile {tile_info['index']} with dimensions {tile_info['tileDims']}")
+    Returns:
+        tuple: (response dict, HTTP status code)
+    """
+    if upscaling_config is None:
+        upscaling_config = {'scale': 1, 'label': 'x1'}
     
-    # Get upscaling configuration from request
-    upscaling_config = None
-    if 'upscalingConfig' in request.form:
-        upscaling_config = json.loads(request.form['upscalingConfig'])
-        if 'scaleIndex' in upscaling_config:
-            # Multi-scale processing
-            print(f"Multi-scale processing - Scale: {upscaling_config['label']}, Index: {upscaling_config['scaleIndex']}/{upscaling_config.get('totalScales', 'unknown')}")
-        else:
-            # Traditional single-scale processing
-            print(f"Traditional upscaling configuration: {upscaling_config['label']}")
+    # Cheap CPU pre-screen of grid tiles: empty, uniform or nodata tiles cannot contain the
+    # target; full-view captures always go to inference. The free-text selection is resolved
+    # to its layer first, so e.g. "lakes" gets the thresholds of Lake
+    if tile_info:
+        prefilter_class = determine_target_layer_from_chat_query(selection)
+        skip_tile, prefilter_stats = prescreen_tile_once(img, prefilter_class, encoded_image)
     else:
-        # Default to x1 (no upscaling)
-        upscaling_config = {'scale': 1, 'label': 'x1'}
+        skip_tile, prefilter_stats = False, {}
     
-    # Check if imageData is in the request
-    img = None
-    try:
-        # Get the base64 string from the data URL
-        image_data = request.files['imageData']
-        image = Image.open(image_data.stream)
-        
-        # Convert to OpenCV format
-        img = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    # Namespace all artifacts of this request in its own scratch directory
+    request_id, request_folder = get_scratch_space().create_request_dir()
+    
+    if skip_tile:
+        print(f"Tile {tile_info['index']}: Skipping GeoPixel inference, tile pre-filter matched: {prefilter_stats}")
+        report_progress(progress_callback, 'prefiltered', **prefilter_stats)
         
-        # Save the image for debugging (optional)
-        if tile_info:
-            filename = f'tile_{tile_info["index"]}.jpg'
-        else:
-            filename = 'satellite_image.jpg'
-        filepath = os.path.join(IMAGE_FOLDER, filename)
-        cv2.imwrite(filepath, img)
-        print(f"Saved captured image to {filepath}")
-    except Exception as e:
-        print(f"Error processing image data: {str(e)}")
-        raise
-
+        # Same shape as an empty inference result, multi-scale clients get an empty raw mask
+        response_data = {
+            'message': 'Successfully retrieved outline',
+            'requestId': request_id,
+            'outline': [],
+            'imageDims': list(img.shape[:2]),
+            'overlay_images': {},
+            'coordinates_transformed': bool(mapBounds),
+            'prefiltered': True,
+            'prefilterStats': prefilter_stats
+        }
+        if upscaling_config.get('scaleIndex') is not None:
+            empty_mask = np.zeros(img.shape[0] * img.shape[1], dtype=np.uint8)
+            if mask_encoding == 'list':
+                response_data['rawMask'] = encode_mask(empty_mask, 'list')
+            else:
+                response_data['rawMaskEncoded'] = encode_mask(empty_mask, mask_encoding)
+        response_data['alert'] = 'No valid geometries found.'
+        return response_data, 200
+    
+    # Save the image for processing, reusing the uploaded bytes when available
+    if encoded_image is None:
+        _, encoded_image = cv2.imencode('.jpg', img)
+        encoded_image = encoded_image.tobytes()
+        image_ext = '.jpg'
+    if tile_info:
+        filename = f'tile_{tile_info["index"]}{image_ext}'
+    else:
+        filename = f'satellite_image{image_ext}'
+    image_filepath = os.path.join(request_folder, filename)
+    with open(image_filepath, 'wb') as image_file:
+        image_file.write(encoded_image)
+    print(f"Saved captured image to {image_filepath}")
+    
     query = f"Please give me segmentation masks for {selection}."
     imageDims = img.shape[:2]
-      
+    
     try:
         # masks = get_geopixel_result(["--version=MBZUAI/GeoPixel-7B-RES"], [selection])
         # outline = np.array([[[[[446, 219]], [[445, 220]], [[443, 220]], [[439, 224]], [[439, 227]], [[438, 228]], [[438, 231]], [[437, 232]], [[437, 247]], [[436, 248]], [[437, 249]], [[437, 262]], [[436, 263]], [[436, 273]], [[435, 274]], [[435, 293]], [[434, 294]], [[434, 312]], [[435, 313]], [[435, 315]], [[438, 318]], [[448, 318]], [[449, 319]], [[465, 319]], [[466, 318]], [[467, 318]], [[469, 316]], [[469, 313]], [[468, 312]], [[468, 304]], [[469, 303]], [[469, 299]], [[468, 298]], [[468, 297]], [[469, 296]], [[469, 286]], [[470, 285]], [[470, 268]], [[471, 267]], [[471, 265]], [[470, 264]], [[471, 263]], [[471, 254]], [[472, 253]], [[472, 250]], [[473, 249]], [[473, 233]], [[472, 232]], [[472, 230]], [[471, 229]], [[471, 226]], [[470, 226]], [[469, 225]], [[468, 225]], [[467, 224]], [[465, 224]], [[461, 220]], [[460, 220]], [[459, 219]]]]])
         # outline = cv2.findContours(masks.astype(np.uint8).squeeze(),cv2.RETR_LIST,cv2.CHAIN_APPROX_SIMPLE)
-        # Use the correct filename for tile processing - use absolute path to avoid path resolution issues
-        if tile_info:
-            image_filepath = os.path.join(IMAGE_FOLDER, f'tile_{tile_info["index"]}.jpg')
-        else:
-            image_filepath = os.path.join(IMAGE_FOLDER, 'satellite_image.jpg')
-            
-        # Try to get the API URL dynamically from running RunPod instance
-        api_url = get_active_runpod_url()
-        print(api_url)
-        
-        # Fallback to configuration, environment variable, or hardcoded default
-        if not api_url:
-            api_url = (current_app.config.get('GEOPIXEL_API_URL') or
-                      os.environ.get('GEOPIXEL_API_URL', "https://0tjxinf025d4jr-5000.proxy.runpod.net/"))
-            print(f"No active RunPod found, using fallback URL: {api_url}")
-        else:
-            print(f"Using dynamic RunPod API URL: {api_url}")
-        
         print(f"🔍 About to call get_object_outlines with:")
         print(f"  - API URL: {api_url}")
         print(f"  - Image path: {image_filepath}")
         print(f"  - Query: {query}")
         print(f"  - Upscaling config: {upscaling_config}")
         
-        response = get_object_outlines(api_url, image_filepath, query, upscaling_config)
+        response = get_object_outlines(api_url, image_filepath, query, upscaling_config, progress_callback)
+        
+        # Real inference keeps the pod warm, postpone its keep-alive
+        get_pod_warmup().record_activity(api_url)
         
         print(f"🔍 get_object_outlines returned: {type(response)}")
         
@@ -432,14 +463,14 @@ def receive_image():
             error_msg = 'Failed to process image - API processing failed. Please check if the RunPod instance is running and the GeoPixel API is accessible.'
             if tile_info:
                 error_msg = f"Tile {tile_info['index']}: {error_msg}"
-            return jsonify({'error': error_msg}), 500
-            
+            return {'error': error_msg}, 500
+        
         # Unpack the response tuple
         result, contours, masks = response
         
         # Additional validation
         if result is None:
-            return jsonify({'error': 'No valid result received from API'}), 500
+            return {'error': 'No valid result received from API'}, 500
         print(f"Masks shape: {masks.shape if hasattr(masks, 'shape') else f'Length: {len(masks) if masks is not None else 0}'}")
         print(f"Number of contours: {len(contours) if contours else 0}")
         print(f"Image dimensions: {imageDims}")
@@ -501,7 +532,7 @@ def receive_image():
                             # Use original contour if perimeter is 0
                             simplified_contours.append(contour_np)
                             print(f"{tile_prefix}Contour {i}: {len(contour_np)} points (no simplification - zero perimeter)")
-                            
+                    
                     except Exception as e:
                         print(f"❌ Error processing contour {i} in views.py: {str(e)}")
                         # Try to add original contour as fallback
@@ -515,10 +546,11 @@ def receive_image():
                             print(f"❌ Failed to add fallback contour {i}")
                         continue
             
-            # Create overlay images using simplified contours (only for non-tile processing)
+            # Register overlay images using simplified contours (only for non-tile processing)
+            # They are rendered on the first GET to /overlay_images/<filename>
             overlay_paths = {}
             if not tile_info:
-                overlay_paths = create_overlay_images(img, simplified_contours, masks, IMAGE_FOLDER, mapBounds, imageDims)
+                overlay_paths = register_lazy_overlays(encoded_image, simplified_contours, masks, request_folder, mapBounds, imageDims)
             else:
                 print(f"Skipping overlay creation for tile {tile_info['index']}")
             
@@ -528,17 +560,10 @@ def receive_image():
             if simplified_contours and mapBounds and imageDims:
                 tile_prefix = f"Tile {tile_info['index']}: " if tile_info else ""
                 print(f"{tile_prefix}Transforming simplified contours to geographic coordinates for frontend display...")
-                for i, simplified_contour in enumerate(simplified_contours):
-                    # Extract simplified contour points
-                    contour_points = [[point[0][0], point[0][1]] for point in simplified_contour]
-                    
-                    # Transform to geographic coordinates using the same logic as the overlay creation
-                    geo_coords = image_coords_to_map_coords(mapBounds, contour_points, imageDims)
-                    
-                    # Convert to the format expected by the frontend
-                    serializable_contours.append(geo_coords)
-                    
-                    print(f"{tile_prefix}Simplified contour {i}: {len(simplified_contour)} points -> {len(geo_coords)} geo points")
+                # Transform all contours of this tile in one batch using the same logic as the overlay creation
+                serializable_contours = contours_to_map_coords(mapBounds, simplified_contours, imageDims)
+                total_points = sum(len(geo_coords) for geo_coords in serializable_contours)
+                print(f"{tile_prefix}Transformed {len(serializable_contours)} simplified contours ({total_points} geo points)")
             elif simplified_contours:
                 # Fallback to original pixel coordinates if no geographic data
                 tile_prefix = f"Tile {tile_info['index']}: " if tile_info else ""
@@ -555,11 +580,11 @@ def receive_image():
         for key, path in overlay_paths.items():
             if key != 'error' and path:
                 filename = os.path.basename(path)
-                overlay_urls[key] = urljoin(request.url_root, f'overlay_images/{filename}')
+                overlay_urls[key] = urljoin(url_root, f'overlay_images/{request_id}/{filename}')
         
         # Special handling for tile0: create mask overlay before cleanup
         if tile_info and tile_info['index'] == 0:
-            tile_filepath = os.path.join(IMAGE_FOLDER, f'tile_{tile_info["index"]}.jpg')
+            tile_filepath = image_filepath
             
             if os.path.exists(tile_filepath):
                 print(f"Creating mask overlay for tile0...")
@@ -573,20 +598,20 @@ def receive_image():
                         tile_info,
                         mapBounds,  # Use mapBounds for tile bounds
                         imageDims,  # Use imageDims for tile dimensions
-                        IMAGE_FOLDER
+                        request_folder
                     )
                     
                     if overlay_result:
                         print(f"✅ Successfully created tile0 mask overlay: {overlay_result}")
                     else:
                         print(f"⚠️ Failed to create tile0 mask overlay")
-                        
+                
                 except Exception as overlay_error:
                     print(f"Error creating tile0 mask overlay: {str(overlay_error)}")
         
         # Delete tile file from hard storage after processing (cleanup)
         if tile_info:
-            tile_filepath = os.path.join(IMAGE_FOLDER, f'tile_{tile_info["index"]}.jpg')
+            tile_filepath = image_filepath
             try:
                 if os.path.exists(tile_filepath):
                     os.remove(tile_filepath)
@@ -597,6 +622,7 @@ def receive_image():
         # Build response with raw mask data if available
         response_data = {
             'message': 'Successfully retrieved outline',
+            'requestId': request_id,
             'outline': serializable_contours,
             'imageDims': list(imageDims),
             'overlay_images': overlay_urls,
@@ -604,30 +630,212 @@ def receive_image():
         }
         
         # Add raw mask data for multi-scale processing
+        # Old clients get the plain JSON list, new clients can request a compact encoding
         if is_multi_scale_data and isinstance(masks, np.ndarray):
-            response_data['rawMask'] = masks.tolist()
+            if mask_encoding == 'list':
+                response_data['rawMask'] = encode_mask(masks, 'list')
+            else:
+                response_data['rawMaskEncoded'] = encode_mask(masks, mask_encoding)
             tile_prefix = f"Tile {tile_info['index']}: " if tile_info else ""
-            print(f"{tile_prefix}Added raw mask data to response (length: {len(masks)})")
-        
-        # Add chat query information if this is a chat query
-        if is_chat_query and original_query:
-            target_layer = determine_target_layer_from_chat_query(original_query)
-            response_data['isChatQuery'] = True
-            response_data['originalQuery'] = original_query
-            response_data['targetLayer'] = target_layer
-            print(f"Chat query processed - target layer: {target_layer}")
+            print(f"{tile_prefix}Added raw mask data to response (length: {len(masks)}, encoding: {mask_encoding})")
         
         # Add alert if no valid geometries found
         if not serializable_contours or len(serializable_contours) == 0:
             response_data['alert'] = 'No valid geometries found.'
             print("No valid geometries found in response")
         
-        return jsonify(response_data), 200
+        return response_data, 200
     except Exception as e:
-        print(f"❌ Exception in /receive endpoint: {str(e)}")
+        print(f"❌ Exception in segmentation processing: {str(e)}")
         import traceback
         traceback.print_exc()
+        return {'error': f'Error processing file: {str(e)}'}, 500
+
+def format_stream_event(event, payload, use_sse):
+    """
+    Format a streaming event either as a Server-Sent Event or as a single NDJSON line.
+    """
+    if use_sse:
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({'event': event, **payload}) + "\n"
+
+@bp.route('/receive', methods=['POST', 'OPTIONS'])
+def receive_image():
+    print(f"🔍 /receive endpoint called with method: {request.method}")
+    print(f"🔍 Request form keys: {list(request.form.keys())}")
+    print(f"🔍 Request files keys: {list(request.files.keys())}")
+    
+    # Handle preflight OPTIONS request for CORS
+    if request.method == 'OPTIONS':
+        response = jsonify({})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        return response
+    if 'mapExtent' not in request.form:
+        print(f"❌ No mapExtent in request form")
+        return jsonify({'error': 'No map bounds'}), 400
+    
+    mapBounds = json.loads(request.form['mapExtent'])
+    selection = json.loads(request.form['selection'])
+    
+    # Check if this is a chat query
+    is_chat_query = request.form.get('isChat', 'false').lower() == 'true'
+    original_query = request.form.get('originalQuery', '') if is_chat_query else None
+    
+    if is_chat_query:
+        print(f"Processing chat query: {original_query}")
+        print(f"Chat selection: {selection}")
+    
+    # Get RunPod API key from the request if provided (from frontend interface)
+    if 'runpodApiKey' in request.form and request.form['runpodApiKey'].strip():
+        frontend_api_key = request.form['runpodApiKey'].strip()
+        set_runpod_api_key(frontend_api_key)
+        print(f"Using API key from frontend interface (length: {len(frontend_api_key)})")
+    
+    # Check if this is a tile processing request
+    tile_info = None
+    if 'tileInfo' in request.form:
+        tile_info = json.loads(request.form['tileInfo'])
+        print(f"Processing tile {tile_info['index']} with dimensions {tile_info['tileDims']}")
+    
+    # Get upscaling configuration from request
+    upscaling_config = None
+    if 'upscalingConfig' in request.form:
+        upscaling_config = json.loads(request.form['upscalingConfig'])
+        if 'scaleIndex' in upscaling_config:
+            # Multi-scale processing
+            print(f"Multi-scale processing - Scale: {upscaling_config['label']}, Index: {upscaling_config['scaleIndex']}/{upscaling_config.get('totalScales', 'unknown')}")
+        else:
+            # Traditional single-scale processing
+            print(f"Traditional upscaling configuration: {upscaling_config['label']}")
+    else:
+        # Default to x1 (no upscaling)
+        upscaling_config = {'scale': 1, 'label': 'x1'}
+    
+    # Get requested raw mask encoding (plain JSON list for old clients)
+    mask_encoding = request.form.get('maskEncoding', 'list')
+    if mask_encoding not in MASK_ENCODINGS:
+        return jsonify({'error': f'Unsupported maskEncoding: {mask_encoding}'}), 400
+    
+    # Check if imageData is in the request
+    img = None
+    try:
+        # Decode the upload (PNG, JPEG or WebP) straight into OpenCV format
+        image_data = request.files['imageData']
+        img, encoded_image, image_ext = decode_image_upload(image_data.stream)
+    except Exception as e:
+        print(f"Error processing image data: {str(e)}")
+        raise
+    
+    try:
+        api_url = resolve_geopixel_api_url()
+    except Exception as e:
+        print(f"❌ Exception in /receive endpoint: {str(e)}")
         return jsonify({'error': f'Error processing file: {str(e)}'}), 500
+    
+    response_data, status_code = process_segmentation_request(
+        img, selection, mapBounds, api_url, request.url_root,
+        tile_info=tile_info, upscaling_config=upscaling_config,
+        mask_encoding=mask_encoding, encoded_image=encoded_image, image_ext=image_ext
+    )
+    
+    # Add chat query information if this is a chat query
+    if status_code == 200 and is_chat_query and original_query:
+        target_layer = determine_target_layer_from_chat_query(original_query)
+        response_data['isChatQuery'] = True
+        response_data['originalQuery'] = original_query
+        response_data['targetLayer'] = target_layer
+        print(f"Chat query processed - target layer: {target_layer}")
+    
+    return jsonify(response_data), status_code
+
+@bp.route('/receive_stream', methods=['POST'])
+def receive_stream():
+    """
+    Process a whole tile grid over one connection and stream each tile's result
+    (plus MSFF stage progress) as soon as it is ready.
+    
+    Expects form fields 'selection', 'tiles' (JSON list of tile info objects with
+    'index', 'bounds' and 'tileDims'), optional 'upscalingConfig', 'maskEncoding'
+    and 'runpodApiKey', and one file field 'tile_<index>' per tile. Responds with
+    Server-Sent Events when the client sends 'Accept: text/event-stream' or
+    'format=sse', NDJSON otherwise.
+    """
+    if 'tiles' not in request.form or 'selection' not in request.form:
+        return jsonify({'error': 'Missing required fields: tiles and selection'}), 400
+    
+    tiles = json.loads(request.form['tiles'])
+    selection = json.loads(request.form['selection'])
+    upscaling_config = json.loads(request.form['upscalingConfig']) if 'upscalingConfig' in request.form else None
+    use_sse = (request.form.get('format') == 'sse' or
+               'text/event-stream' in request.headers.get('Accept', ''))
+    mask_encoding = request.form.get('maskEncoding', 'list')
+    if mask_encoding not in MASK_ENCODINGS:
+        return jsonify({'error': f'Unsupported maskEncoding: {mask_encoding}'}), 400
+    
+    print(f"🔍 /receive_stream called for {len(tiles)} tiles ({'SSE' if use_sse else 'NDJSON'})")
+    
+    if 'runpodApiKey' in request.form and request.form['runpodApiKey'].strip():
+        set_runpod_api_key(request.form['runpodApiKey'].strip())
+    
+    # Decode all tile uploads up front - the request body is not available once streaming starts
+    tile_jobs = []
+    for tile_info in tiles:
+        file_key = f'tile_{tile_info["index"]}'
+        if file_key not in request.files:
+            return jsonify({'error': f'Missing image for tile {tile_info["index"]}'}), 400
+        tile_jobs.append((tile_info, decode_image_upload(request.files[file_key].stream)))
+    
+    api_url = resolve_geopixel_api_url()
+    url_root = request.url_root
+    max_workers = max(1, min(len(tile_jobs), BATCH_PROCESSING_CONFIG['max_parallel_workers']))
+    
+    def generate():
+        events = queue.Queue()
+        
+        def run_tile(tile_info, upload):
+            def on_progress(stage, details):
+                events.put(('progress', {'tileIndex': tile_info['index'], 'stage': stage, **details}))
+            
+            img, encoded_image, image_ext = upload
+            try:
+                response_data, status_code = process_segmentation_request(
+                    img, selection, tile_info.get('bounds'), api_url, url_root,
+                    tile_info=tile_info, upscaling_config=upscaling_config,
+                    progress_callback=on_progress, mask_encoding=mask_encoding,
+                    encoded_image=encoded_image, image_ext=image_ext
+                )
+            except Exception as e:
+                response_data, status_code = {'error': f'Error processing tile: {str(e)}'}, 500
+            events.put(('tile', {'tileIndex': tile_info['index'], 'status': status_code, 'data': response_data}))
+        
+        yield format_stream_event('start', {'totalTiles': len(tile_jobs)}, use_sse)
+        
+        # No context manager: on a client disconnect GeneratorExit would make it wait for
+        # every submitted tile, queued inferences are cancelled instead
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            for tile_info, upload in tile_jobs:
+                executor.submit(run_tile, tile_info, upload)
+            
+            completed = 0
+            while completed < len(tile_jobs):
+                event, payload = events.get()
+                if event == 'tile':
+                    completed += 1
+                    payload['completed'] = completed
+                yield format_stream_event(event, payload, use_sse)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        yield format_stream_event('done', {'totalTiles': len(tile_jobs)}, use_sse)
+    
+    mimetype = 'text/event-stream' if use_sse else 'application/x-ndjson'
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @bp.route('/health', methods=['GET'])
 def health_check():
@@ -638,6 +846,49 @@ def health_check():
         'timestamp': str(os.path.getmtime(__file__) if os.path.exists(__file__) else 'unknown')
     }), 200
 
+# Default share of the smaller geometry that must overlap for merge/replace inserts
+DEFAULT_MERGE_MIN_OVERLAP = 0.5
+
+def parse_insert_mode(data):
+    """
+    Parse the de-duplication options (mode, min_overlap) of an insert request.
+    
+    Returns:
+        tuple: (mode, min_overlap, error message or None)
+    """
+    from ..database import INSERT_MODES
+    mode = data.get('mode', 'append')
+    if mode not in INSERT_MODES:
+        return None, None, f'Invalid mode: expected one of {", ".join(INSERT_MODES)}'
+    # Merge and replace are irreversible, by default only substantial overlaps count so
+    # detections that merely touch or slightly overlap stay separate
+    default_min_overlap = 0.0 if mode == 'append' else DEFAULT_MERGE_MIN_OVERLAP
+    try:
+        min_overlap = float(data.get('min_overlap', default_min_overlap))
+    except (TypeError, ValueError):
+        min_overlap = -1.0
+    if not 0.0 <= min_overlap <= 1.0:
+        return None, None, 'Invalid min_overlap: expected a number between 0 and 1'
+    return mode, min_overlap, None
+
+def queue_insert(db, object_name, rows, mode, min_overlap):
+    """Hand an insert to the write-behind queue and acknowledge it with a receipt"""
+    from ..insert_queue import get_insert_queue
+    
+    table_name = db.object_name_to_table_name(object_name)
+    if table_name not in db.get_all_object_tables():
+        return jsonify({'error': f'Unknown layer: {object_name}'}), 400
+    
+    receipt_id = get_insert_queue().submit(object_name, rows, mode=mode, min_overlap=min_overlap)
+    return jsonify({
+        'success': True,
+        'message': f'{len(rows)} geometries queued for insertion',
+        'receipt_id': receipt_id,
+        'status': 'queued',
+        'table_name': table_name,
+        'object_name': object_name
+    }), 202
+
 @bp.route('/insert_geometry', methods=['POST'])
 def insert_geometry():
     """Insert geometry into PostGIS database"""
@@ -648,18 +899,34 @@ def insert_geometry():
             return jsonify({'error': 'No JSON data provided'}), 400
         
         object_name = data.get('object')
-        geometry_wkt = data.get('geometry_wkt')
         attributes = data.get('attributes', {})
         
-        if not object_name or not geometry_wkt:
-            return jsonify({'error': 'Missing required fields: object and geometry_wkt'}), 400
-        
         # Import database module
-        from ..database import get_database
+        from ..database import get_database, geometry_input_params, GEOMETRY_INPUT_FIELDS
         db = get_database()
         
+        # Geometry may be sent as WKT, hex/base64 WKB or GeoJSON
+        geometry = {field: data.get(field) for field in GEOMETRY_INPUT_FIELDS if data.get(field)}
+        
+        if not object_name or not geometry:
+            return jsonify({'error': f'Missing required fields: object and one of {", ".join(GEOMETRY_INPUT_FIELDS)}'}), 400
+        
+        try:
+            geometry_input_params(geometry)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid geometry: {str(e)}'}), 400
+        
+        # Optional merge/replace of overlapping detections of the same class
+        mode, min_overlap, error = parse_insert_mode(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Write-behind: acknowledge immediately, the status is available via the receipt
+        if data.get('async'):
+            return queue_insert(db, object_name, [{**geometry, 'attributes': attributes}], mode, min_overlap)
+        
         # Insert geometry
-        geometry_id = db.insert_geometry(object_name, geometry_wkt, attributes)
+        geometry_id = db.insert_geometry(object_name, geometry, attributes, mode=mode, min_overlap=min_overlap)
         
         # Immediately get updated count for this table
         updated_count = db.get_geometries_count(object_name)
@@ -677,6 +944,84 @@ def insert_geometry():
     except Exception as e:
         return jsonify({'error': f'Failed to insert geometry: {str(e)}'}), 500
 
+@bp.route('/insert_geometries', methods=['POST'])
+def insert_geometries():
+    """Insert many geometries of one layer into PostGIS database in a single transaction"""
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+        
+        object_name = data.get('object')
+        geometries = data.get('geometries')
+        default_attributes = data.get('attributes', {})
+        
+        if not object_name or not isinstance(geometries, list) or not geometries:
+            return jsonify({'error': 'Missing required fields: object and geometries (non-empty array)'}), 400
+        
+        # Import database module
+        from ..database import get_database, geometry_input_params, GEOMETRY_INPUT_FIELDS
+        db = get_database()
+        
+        # Accept plain WKT strings or objects with geometry_wkt, geometry_wkb or
+        # geometry_geojson and optional attributes
+        rows = []
+        for index, geometry in enumerate(geometries):
+            if isinstance(geometry, str):
+                geometry = {'geometry_wkt': geometry}
+            try:
+                geometry_input_params(geometry)
+            except ValueError as e:
+                return jsonify({'error': f'Invalid geometry at index {index}: {str(e)}'}), 400
+            row = {field: geometry[field] for field in GEOMETRY_INPUT_FIELDS if geometry.get(field)}
+            row['attributes'] = geometry.get('attributes', default_attributes)
+            rows.append(row)
+        
+        # Optional merge/replace of overlapping detections of the same class
+        mode, min_overlap, error = parse_insert_mode(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Write-behind: acknowledge immediately, the status is available via the receipt
+        if data.get('async'):
+            return queue_insert(db, object_name, rows, mode, min_overlap)
+        
+        # Insert all geometries and get the updated count in one transaction
+        result = db.insert_geometries(object_name, rows, mode=mode, min_overlap=min_overlap)
+        
+        return jsonify({
+            'success': True,
+            'message': f'{len(result["geometry_ids"])} geometries inserted successfully',
+            'geometry_ids': result['geometry_ids'],
+            'removed_ids': result['removed_ids'],
+            'mode': mode,
+            'table_name': result['table_name'],
+            'updated_count': result['updated_count'],
+            'object_name': object_name
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to insert geometries: {str(e)}'}), 500
+
+@bp.route('/insert_status/<receipt_id>', methods=['GET'])
+def get_insert_status(receipt_id):
+    """Get the status of a queued insert (queued, spilled, committed or failed)"""
+    try:
+        from ..insert_queue import get_insert_queue
+        
+        receipt = get_insert_queue().get_receipt(receipt_id)
+        if receipt is None:
+            return jsonify({'error': f'Unknown receipt: {receipt_id}'}), 404
+        
+        return jsonify({
+            'success': True,
+            **receipt
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to get insert status: {str(e)}'}), 500
+
 @bp.route('/fetch_area_intersection', methods=['POST'])
 def fetch_area_intersection():
     """Calculate area intersection between two object layers"""
@@ -696,22 +1041,195 @@ def fetch_area_intersection():
             return jsonify({'error': 'Cannot calculate intersection of layer with itself'}), 400
         
         # Import database module
-        from ..database import get_database
+        from ..database import get_database, geometry_input_params
         db = get_database()
         
+        # Optional area filter: polygon (WKT string or GeoJSON), bbox [minx, miny, maxx, maxy]
+        # or mapExtent in the [[minX, maxY], [maxX, minY]] form sent by receive_image clients
+        bbox = None
+        polygon = data.get('polygon')
+        if polygon is not None:
+            if isinstance(polygon, dict) and 'type' in polygon:
+                polygon = {'geometry_geojson': polygon}
+            try:
+                geometry_input_params(polygon)
+            except ValueError as e:
+                return jsonify({'error': f'Invalid polygon filter: {str(e)}'}), 400
+        elif data.get('bbox') is not None or data.get('mapExtent') is not None:
+            try:
+                if data.get('bbox') is not None:
+                    bbox = [float(value) for value in data['bbox']]
+                    if len(bbox) != 4:
+                        raise ValueError
+                else:
+                    xs = [float(point[0]) for point in data['mapExtent']]
+                    ys = [float(point[1]) for point in data['mapExtent']]
+                    bbox = [min(xs), min(ys), max(xs), max(ys)]
+            except (TypeError, ValueError, IndexError):
+                return jsonify({'error': 'Invalid bbox filter: expected [minx, miny, maxx, maxy] or mapExtent [[minX, maxY], [maxX, minY]]'}), 400
+            if bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+                return jsonify({'error': 'Invalid bbox filter: empty extent'}), 400
+        
         # Calculate intersection
-        intersection_data = db.calculate_area_intersection(layer1_name, layer2_name)
+        intersection_data = db.calculate_area_intersection(layer1_name, layer2_name, bbox=bbox, polygon=polygon)
         
         return jsonify({
             'success': True,
             'intersection_data': intersection_data,
             'layer1_name': layer1_name,
-            'layer2_name': layer2_name
+            'layer2_name': layer2_name,
+            'area_filter': 'polygon' if polygon is not None else ('bbox' if bbox else None)
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'Failed to calculate intersection: {str(e)}'}), 500
 
+@bp.route('/fetch_overlap_matrix', methods=['GET', 'POST'])
+def fetch_overlap_matrix():
+    """Calculate pairwise overlaps of several layers (default: all non-empty layers)"""
+    try:
+        # Layers from a JSON body ({"layers": [...]}) or a comma separated query parameter
+        data = request.get_json(silent=True) or {}
+        layer_names = data.get('layers')
+        if layer_names is None and request.args.get('layers'):
+            layer_names = [name.strip() for name in request.args['layers'].split(',') if name.strip()]
+        
+        if layer_names is not None and not isinstance(layer_names, list):
+            return jsonify({'error': 'Invalid layers: expected an array of layer names'}), 400
+        
+        from ..database import get_database
+        db = get_database()
+        
+        known_tables = set(db.get_all_object_tables())
+        unknown = [name for name in layer_names or [] if db.object_name_to_table_name(name) not in known_tables]
+        if unknown:
+            return jsonify({'error': f'Unknown layers: {", ".join(unknown)}'}), 400
+        
+        result = db.calculate_overlap_matrix(layer_names)
+        
+        # Key results by object name as in /get_layer_stats
+        def to_object_name(table_name):
+            return table_name.replace('_', ' ').title()
+        
+        return jsonify({
+            'success': True,
+            'layers': [to_object_name(name) for name in result['layers']],
+            'areas': {to_object_name(name): area for name, area in result['areas'].items()},
+            'polygon_counts': {to_object_name(name): count for name, count in result['polygonCounts'].items()},
+            'matrix': {
+                to_object_name(row): {to_object_name(column): cell for column, cell in cells.items()}
+                for row, cells in result['matrix'].items()
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to calculate overlap matrix: {str(e)}'}), 500
+
+@bp.route('/tiles/<layer>/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def get_layer_tile_mvt(layer, z, x, y):
+    """Serve a Mapbox Vector Tile of a detection layer"""
+    try:
+        from ..database import get_database
+        from ..vector_tiles import get_layer_tile, TILE_CACHE_CONFIG
+        db = get_database()
+        
+        table_name = db.object_name_to_table_name(layer)
+        if table_name not in db.get_all_object_tables():
+            return jsonify({'error': f'Unknown layer: {layer}'}), 404
+        if not 0 <= z <= TILE_CACHE_CONFIG['max_zoom'] or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            return jsonify({'error': f'Invalid tile coordinates: {z}/{x}/{y}'}), 400
+        
+        etag, data = get_layer_tile(table_name, z, x, y)
+        
+        # Tiles change whenever geometries are inserted, so clients revalidate via ETag
+        response = Response(data, mimetype='application/vnd.mapbox-vector-tile')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to render tile: {str(e)}'}), 500
+
+# Streamed exports are flushed to the client in chunks of about this size (bytes)
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+def chunk_export_stream(items, use_gzip):
+    """Group small export items into chunks, optionally gzip-compressed on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if use_gzip else None
+    buffer = []
+    buffered = 0
+    for item in items:
+        buffer.append(item)
+        buffered += len(item)
+        if buffered >= EXPORT_CHUNK_SIZE:
+            chunk = b''.join(buffer)
+            buffer, buffered = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b''.join(buffer)
+    yield compressor.compress(chunk) + compressor.flush() if compressor else chunk
+
+@bp.route('/export/<layer>', methods=['GET'])
+def export_layer(layer):
+    """
+    Stream all detections of a layer as NDJSON GeoJSON (format=geojson, default) or
+    FlatGeobuf (format=fgb). Optional query parameters: bbox=minx,miny,maxx,maxy
+    (EPSG:3857) and since/until (ISO 8601 creation time range).
+    """
+    try:
+        from ..database import get_database, EXPORT_FORMATS
+        db = get_database()
+        
+        export_format = request.args.get('format', 'geojson')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': f'Unsupported export format: {export_format}'}), 400
+        
+        table_name = db.object_name_to_table_name(layer)
+        if table_name not in db.get_all_object_tables():
+            return jsonify({'error': f'Unknown layer: {layer}'}), 404
+        
+        bbox = None
+        if request.args.get('bbox'):
+            try:
+                bbox = [float(value) for value in request.args['bbox'].split(',')]
+            except ValueError:
+                bbox = []
+            if len(bbox) != 4 or bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+                return jsonify({'error': 'Invalid bbox filter: expected minx,miny,maxx,maxy'}), 400
+        
+        time_range = {}
+        for name in ('since', 'until'):
+            if request.args.get(name):
+                try:
+                    time_range[name] = datetime.fromisoformat(request.args[name])
+                except ValueError:
+                    return jsonify({'error': f'Invalid {name}: expected an ISO 8601 timestamp'}), 400
+        
+        items = db.iter_layer_export(table_name, export_format, bbox=bbox, **time_range)
+        
+        # Pull the first item now so connection and query errors still produce an error response
+        first = next(items, b'')
+        
+        def generate():
+            yield first
+            yield from items
+        
+        use_gzip = request.accept_encodings['gzip'] > 0
+        extension, mimetype = ('ndjson', 'application/x-ndjson') if export_format == 'geojson' else ('fgb', 'application/octet-stream')
+        print(f"📤 Exporting layer {table_name} as {export_format}{' (gzip)' if use_gzip else ''}")
+        
+        response = Response(chunk_export_stream(generate(), use_gzip), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename="{table_name}.{extension}"'
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['X-Accel-Buffering'] = 'no'
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to export layer: {str(e)}'}), 500
+
 @bp.route('/get_layer_stats', methods=['GET'])
 def get_layer_stats():
     """Get statistics for all layers in the database"""
@@ -719,17 +1237,19 @@ def get_layer_stats():
         from ..database import get_database
         db = get_database()
         
-        # Get all table names
-        table_names = db.get_all_object_tables()
+        # Optionally use pg_class estimates for very large tables
+        estimate = request.args.get('estimate', 'false').lower() in ('1', 'true', 'yes')
+        
+        # Get counts of all tables with a single (cached) query
+        table_counts = db.get_layer_counts(estimate=estimate)
         
-        # Get count for each table
         layer_stats = {}
         total_count = 0
         
-        for table_name in table_names:
+        for table_name in db.get_all_object_tables():
             # Convert table name back to object name
             object_name = table_name.replace('_', ' ').title()
-            count = db.get_geometries_count(object_name)
+            count = table_counts.get(table_name, 0)
             if count > 0:  # Only include tables with data
                 layer_stats[object_name] = count
                 total_count += count
@@ -738,12 +1258,28 @@ def get_layer_stats():
             'success': True,
             'layer_stats': layer_stats,
             'total_count': total_count,
-            'layer_count': len(layer_stats)
+            'layer_count': len(layer_stats),
+            'estimated': estimate
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'Failed to get layer stats: {str(e)}'}), 500
 
+@bp.route('/db_pool_stats', methods=['GET'])
+def get_db_pool_stats():
+    """Get connection pool metrics of the worker serving this request"""
+    try:
+        from ..database import get_database
+        db = get_database()
+        
+        return jsonify({
+            'success': True,
+            'pool': db.get_pool_metrics()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to get pool stats: {str(e)}'}), 500
+
 @bp.route('/cadenza-config', methods=['GET'])
 def get_cadenza_config():
     """Get Cadenza configuration from environment variables"""
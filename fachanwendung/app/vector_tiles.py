@@ -0,0 +1,250 @@
+"""
+Mapbox Vector Tile module for GeoPixel Flask application.
+
+This module handles serving stored detections as vector tiles including:
+- Tile rendering with ST_AsMVT and zoom-dependent simplification
+- Disk tile cache shared by all workers, fronted by a per-worker in-memory LRU
+- Invalidation of the cached tiles covered by newly inserted geometries
+"""
+
+import os
+import math
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Vector tile configuration (overridable via environment variables)
+TILE_CACHE_CONFIG = {
+    # Root directory of the disk tile cache, shared by all gunicorn workers
+    'root': os.environ.get('GEOPIXEL_TILE_CACHE_DIR', 'fachanwendung/app/static/images/tile_cache'),
+
+    # Number of tiles kept in memory per worker
+    'memory_entries': int(os.environ.get('GEOPIXEL_TILE_CACHE_ENTRIES', 512)),
+
+    # MVT tile extent and buffer in tile coordinates
+    'extent': 4096,
+    'buffer': 64,
+
+    # Highest zoom level served
+    'max_zoom': 22,
+
+    # Geometries are simplified to about this many tile pixels up to simplify_max_zoom
+    'simplify_pixels': 1.0,
+    'simplify_max_zoom': 16,
+}
+
+# Half the side length of the EPSG:3857 world square
+WEB_MERCATOR_EXTENT = 20037508.342789244
+
+def tile_span(z):
+    """Side length of a tile at zoom z in EPSG:3857 meters"""
+    return 2 * WEB_MERCATOR_EXTENT / (2 ** z)
+
+def simplify_tolerance(z):
+    """Zoom-dependent simplification tolerance in EPSG:3857 meters, 0 disables simplification"""
+    if z > TILE_CACHE_CONFIG['simplify_max_zoom']:
+        return 0.0
+    return tile_span(z) / TILE_CACHE_CONFIG['extent'] * TILE_CACHE_CONFIG['simplify_pixels']
+
+def tile_range(bbox, z):
+    """
+    Tile index ranges covering a bbox at zoom z, widened by one tile for the render buffer.
+
+    Returns:
+        tuple: (min x, max x, min y, max y)
+    """
+    minx, miny, maxx, maxy = bbox
+    n = 2 ** z
+    span = tile_span(z)
+
+    def clamp(value):
+        return min(max(value, 0), n - 1)
+
+    x0 = clamp(math.floor((minx + WEB_MERCATOR_EXTENT) / span) - 1)
+    x1 = clamp(math.floor((maxx + WEB_MERCATOR_EXTENT) / span) + 1)
+    y0 = clamp(math.floor((WEB_MERCATOR_EXTENT - maxy) / span) - 1)
+    y1 = clamp(math.floor((WEB_MERCATOR_EXTENT - miny) / span) + 1)
+    return x0, x1, y0, y1
+
+
+class TileCache:
+    """Disk tile cache with a per-process LRU, validated against the disk file on every hit"""
+
+    INVALIDATION_MARKER = '.invalidated'
+
+    def __init__(self, root, memory_entries):
+        self.root = root
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  # (layer, z, x, y) -> (mtime_ns, etag, data)
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _tile_path(self, layer, z, x, y):
+        return os.path.join(self.root, layer, str(z), str(x), f"{y}.mvt")
+
+    def get(self, layer, z, x, y):
+        """
+        Look up a cached tile.
+
+        Returns:
+            tuple: (etag, tile bytes), or None if the tile is not cached or was invalidated
+        """
+        key = (layer, z, x, y)
+        path = self._tile_path(layer, z, x, y)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            with self._lock:
+                self._memory.pop(key, None)
+            return None
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] == mtime_ns:
+                self._memory.move_to_end(key)
+                return entry[1], entry[2]
+
+        # Written by another worker (or evicted from memory), load it from disk
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        etag = hashlib.sha1(data).hexdigest()
+        self._remember(key, mtime_ns, etag, data)
+        return etag, data
+
+    def _remember(self, key, mtime_ns, etag, data):
+        with self._lock:
+            self._memory[key] = (mtime_ns, etag, data)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def put(self, layer, z, x, y, data, rendered_at):
+        """
+        Store a rendered tile unless its layer was invalidated while it was rendering.
+
+        Returns:
+            tuple: (etag, tile bytes)
+        """
+        etag = hashlib.sha1(data).hexdigest()
+        try:
+            marker_mtime = os.stat(os.path.join(self.root, layer, self.INVALIDATION_MARKER)).st_mtime
+        except FileNotFoundError:
+            marker_mtime = 0
+        if marker_mtime >= rendered_at:
+            return etag, data
+
+        path = self._tile_path(layer, z, x, y)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._remember((layer, z, x, y), os.stat(path).st_mtime_ns, etag, data)
+        except OSError as e:
+            logger.warning(f"Failed to cache tile {layer}/{z}/{x}/{y}: {e}")
+        return etag, data
+
+    def invalidate(self, layer, bbox=None):
+        """
+        Remove cached tiles of a layer covered by bbox (all tiles of the layer if bbox is None).
+
+        Returns:
+            int: Number of removed tiles
+        """
+        layer_dir = os.path.join(self.root, layer)
+        os.makedirs(layer_dir, exist_ok=True)
+
+        # Touch the marker first so renders racing this invalidation are not cached
+        marker = os.path.join(layer_dir, self.INVALIDATION_MARKER)
+        with open(marker, 'a'):
+            os.utime(marker, None)
+
+        with self._lock:
+            for key in [key for key in self._memory if key[0] == layer]:
+                del self._memory[key]
+
+        if bbox is None:
+            removed = 0
+            for z_name in os.listdir(layer_dir):
+                if z_name.isdigit():
+                    shutil.rmtree(os.path.join(layer_dir, z_name), ignore_errors=True)
+                    removed += 1
+            logger.info(f"Invalidated all cached tiles of layer {layer}")
+            return removed
+
+        # Only walk tiles that exist in the cache, the bbox may span millions of tiles at high zoom
+        removed = 0
+        for z_name in os.listdir(layer_dir):
+            if not z_name.isdigit():
+                continue
+            x0, x1, y0, y1 = tile_range(bbox, int(z_name))
+            z_dir = os.path.join(layer_dir, z_name)
+            for x_name in os.listdir(z_dir):
+                if not x_name.isdigit() or not x0 <= int(x_name) <= x1:
+                    continue
+                x_dir = os.path.join(z_dir, x_name)
+                for tile_name in os.listdir(x_dir):
+                    y_name = tile_name[:-len('.mvt')]
+                    if tile_name.endswith('.mvt') and y_name.isdigit() and y0 <= int(y_name) <= y1:
+                        try:
+                            os.remove(os.path.join(x_dir, tile_name))
+                            removed += 1
+                        except FileNotFoundError:
+                            continue
+        if removed:
+            logger.info(f"Invalidated {removed} cached tiles of layer {layer}")
+        return removed
+
+    def clear(self):
+        """Remove all cached tiles of all layers"""
+        with self._lock:
+            self._memory.clear()
+        for layer in os.listdir(self.root):
+            if os.path.isdir(os.path.join(self.root, layer)):
+                self.invalidate(layer)
+
+# Global tile cache instance - will be initialized later
+tile_cache = None
+
+def get_tile_cache() -> TileCache:
+    """Get the global tile cache instance"""
+    global tile_cache
+    if tile_cache is None:
+        tile_cache = TileCache(
+            root=TILE_CACHE_CONFIG['root'],
+            memory_entries=TILE_CACHE_CONFIG['memory_entries']
+        )
+        logger.info(f"Tile cache initialized at {tile_cache.root}")
+    return tile_cache
+
+def get_layer_tile(table_name, z, x, y):
+    """
+    Get a vector tile of a detection layer, rendering and caching it on a miss.
+
+    Returns:
+        tuple: (etag, tile bytes)
+    """
+    from .database import get_database
+
+    cache = get_tile_cache()
+    cached = cache.get(table_name, z, x, y)
+    if cached:
+        return cached
+
+    rendered_at = time.time()
+    data = get_database().get_layer_mvt(
+        table_name, z, x, y,
+        extent=TILE_CACHE_CONFIG['extent'],
+        buffer=TILE_CACHE_CONFIG['buffer'],
+        tolerance=simplify_tolerance(z)
+    )
+    return cache.put(table_name, z, x, y, data, rendered_at)
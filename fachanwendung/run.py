@@ -3,11 +3,9 @@ import os
 
 from app import create_app # type: ignore
 
-# Configuration for database persistence
-# Set to True to keep existing data on startup, False to clear all tables
-persistData = False
-
-app = create_app(persistent_data=persistData)
+# Stored data persists across restarts, clear it explicitly with:
+#   flask --app run clear-db
+app = create_app()
 
 if __name__ == '__main__':
     # Use environment variables for Docker compatibility
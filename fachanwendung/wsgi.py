@@ -8,12 +8,10 @@ import os
 import sys
 from fachanwendung.app import create_app
 
-# Configuration for database persistence
-# Set to True to keep existing data on startup, False to clear all tables
-persistData = False
-
 # Create the Flask application instance
-application = create_app(persistent_data=persistData)
+# Stored data persists across restarts, clear it explicitly with:
+#   flask --app fachanwendung.wsgi:application clear-db
+application = create_app()
 
 # For debugging in production (remove in final deployment)
 if __name__ == "__main__":